@@ -0,0 +1,135 @@
+'''
+Replays camera onboarding spikes against the autoscaler (stream_processor/container/autoscaler.py)
+through a simulated ECS service, and reports scale-up time, over-provisioning and the
+number of scaling actions, for the default settings and for a naive configuration
+without hysteresis or cooldowns.
+
+The simulated service:
+- starts tasks --startup seconds after desired_count goes up, stops them at once when it goes down
+- spreads streams evenly over running tasks, up to 50 per task
+- gives every stream --cpu-per-stream of a vCPU, with +/-15% noise per measurement; a task
+  over 100% CPU falls behind and its frame lag grows, and recovers when it has headroom
+
+Timeline (--scale multiplies camera counts): 100 cameras, +400 at 0:30, +300 at 1:30,
+-450 at 2:30, 4 hours in 10 s steps; the autoscaler runs every 30 s.
+
+Run from the repo root:
+    python benchmarks/bench_autoscaler.py [--startup 90] [--cpu-per-stream 0.016] [--scale 1]
+'''
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stream_processor', 'container'))
+
+from autoscaler import Autoscaler, LoadSignals, TaskLoad
+
+STEP = 10
+CAPACITY = 50
+
+
+class SimulatedService:
+    '''
+    Autoscaler backend standing in for ECS plus the scheduler's heartbeats
+    '''
+
+    def __init__(self, startup, cpu_per_stream, seed=1):
+        self.now = 0.0
+        self.startup = startup
+        self.cpu_per_stream = cpu_per_stream
+        self.random = random.Random(seed)
+        self.total_streams = 0
+        self.desired = 1
+        self.tasks = [{'ready_at': 0.0, 'streams': 0, 'lag': 0.0}]
+
+    def running(self):
+        return [task for task in self.tasks if task['ready_at'] <= self.now]
+
+    # --- backend interface
+    def signals(self):
+        loads = [TaskLoad(task['streams'], CAPACITY, task['cpu'], task['lag']) for task in self.running()]
+        return LoadSignals(self.total_streams, loads)
+
+    def current(self):
+        return self.desired, len(self.running())
+
+    def set_desired(self, count):
+        while len(self.tasks) < count:
+            self.tasks.append({'ready_at': self.now + self.startup, 'streams': 0, 'lag': 0.0, 'cpu': 0.0})
+        del self.tasks[count:] # newest first
+        self.desired = count
+
+    # --- simulation
+    def advance(self):
+        self.now += STEP
+        running = self.running()
+        remaining = self.total_streams
+        for index, task in enumerate(running):
+            share = min(CAPACITY, math.ceil(remaining / (len(running) - index)))
+            task['streams'] = share
+            remaining -= share
+            demand = share * self.cpu_per_stream
+            task['cpu'] = min(demand, 1.0) * self.random.uniform(0.85, 1.15)
+            # Work beyond one vCPU piles up as lag; headroom drains it
+            task['lag'] = max(0.0, task['lag'] + STEP * (demand - 1.0) / max(demand, 1e-9))
+        return remaining # unassigned
+
+
+def timeline(scale):
+    return [(0, 100 * scale), (1800, 500 * scale), (5400, 800 * scale), (9000, 350 * scale)]
+
+
+def simulate(settings, args):
+    service = SimulatedService(args.startup, args.cpu_per_stream)
+    autoscaler = Autoscaler(service, clock=lambda: service.now, max_tasks=200, **settings)
+    events = timeline(args.scale)
+    spikes = [] # [start, recovered at]
+    task_seconds = ideal_seconds = 0.0
+    effective = min(CAPACITY, autoscaler.target_cpu / args.cpu_per_stream)
+
+    for _ in range(int(4 * 3600 / STEP)):
+        for at, cameras in events:
+            if at == service.now:
+                if cameras > service.total_streams:
+                    spikes.append([at, None])
+                service.total_streams = cameras
+        unassigned = service.advance()
+        if service.now % 30 == 0:
+            autoscaler.step()
+        healthy = unassigned == 0 and all(task['lag'] <= autoscaler.max_lag_seconds for task in service.running())
+        if spikes and spikes[-1][1] is None and healthy:
+            spikes[-1][1] = service.now
+        task_seconds += len(service.tasks) * STEP # pending tasks are billed too
+        ideal_seconds += math.ceil(service.total_streams / effective) * STEP
+
+    recovery = [end - start for start, end in spikes if end is not None]
+    return recovery, task_seconds / ideal_seconds - 1, len(autoscaler.history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--startup', type=float, default=90.0, help="Seconds for a new task to start")
+    parser.add_argument('--cpu-per-stream', type=float, default=0.016, help="vCPU fraction one stream costs")
+    parser.add_argument('--scale', type=int, default=1, help="Multiply the camera counts")
+    args = parser.parse_args()
+
+    configurations = {
+        'default': {},
+        'no hysteresis': {'scale_up_cooldown': 0, 'scale_down_cooldown': 0, 'scale_down_margin': 0.0,
+                          'max_scale_down_step': 1000},
+    }
+    print(f"{'settings':<15} {'scale-up time per spike':<26} {'over-provisioned':>17} {'scaling actions':>16}")
+    for name, settings in configurations.items():
+        with contextlib.redirect_stdout(io.StringIO()): # one log line per scaling action
+            recovery, over, actions = simulate(settings, args)
+        times = ', '.join(f"{seconds:.0f} s" for seconds in recovery)
+        print(f"{name:<15} {times:<26} {over:>+17.1%} {actions:>16}")
+
+
+if __name__ == '__main__':
+    main()
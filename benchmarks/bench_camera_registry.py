@@ -0,0 +1,150 @@
+'''
+The Pi CLI's camera registry (raspberrypi-cli/camera_control/camera_registry.py) with
+--cameras cameras over --rooms rooms:
+
+- whole file: what cam_info_management did before, re-read (and for writes re-write,
+  indent=4) all of cameras.json on every operation, without a lock
+- json: JsonRegistry, mtime-checked in-process cache, locked atomic-rename writes
+- sqlite: SqliteRegistry, one row per camera, indexed on room and stream_name
+
+Per backend: time per lookup by name, per room query, per single-camera update, and an
+import of every camera in one batch. Then --writers processes each update --updates
+different cameras at the same time; reported: updates that survived and reads that hit a
+half-written file.
+
+Run from the repo root:
+    python benchmarks/bench_camera_registry.py [--cameras 500] [--writers 4] [--updates 50]
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'raspberrypi-cli'))
+
+from camera_control.camera_registry import JsonRegistry, SqliteRegistry
+
+
+class WholeFile:
+    # _load_configs / _save_configs as they were
+    def __init__(self, path):
+        self.path = path
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def _save(self, data):
+        with open(self.path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+    def get(self, cam_name):
+        return self._load().get(cam_name)
+
+    def find(self, room=None, stream_name=None):
+        return {name: camera for name, camera in self._load().items() if camera.get('room') == room}
+
+    def put(self, cam_name, camera):
+        configs = self._load()
+        configs[cam_name] = camera
+        self._save(configs)
+
+    def put_many(self, cameras, replace=False):
+        configs = {} if replace else self._load()
+        configs.update(cameras)
+        self._save(configs)
+
+
+def cameras(count, rooms):
+    return {
+        f"cam-{index:04d}": {
+            'stream_name': f"site-a-cam-{index:04d}", 'room': f"room-{index % rooms}",
+            'rekognition_tags': ['hardhat', 'safety-vest'], 'aws_region': 'us-east-1',
+            'connection_type': 'v4l2', 'device': f"/dev/video{index}", 'profile': 'auto', 'preset': 'default'
+        }
+        for index in range(count)
+    }
+
+
+def make(backend, directory):
+    if backend == 'whole file':
+        return WholeFile(os.path.join(directory, 'whole.json'))
+    if backend == 'json':
+        return JsonRegistry(os.path.join(directory, 'registry.json'))
+    return SqliteRegistry(os.path.join(directory, 'registry.db'))
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for index in range(repeat):
+        function(index)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def writer(backend, directory, worker, updates, count, errors):
+    registry = make(backend, directory)
+    for update in range(updates):
+        name = f"cam-{(worker * updates + update) % count:04d}"
+        try:
+            camera = registry.get(name)
+            camera['updated_by'] = worker
+            registry.put(name, camera)
+        except ValueError: # json.JSONDecodeError: read the file half-written
+            errors.value += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=500)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--updates', type=int, default=50, help="Updates per writer process")
+    args = parser.parse_args()
+
+    fleet = cameras(args.cameras, args.rooms)
+    names = list(fleet)
+    print(f"{args.cameras} cameras in {args.rooms} rooms; ms per operation")
+    print(f"  {'backend':<11} {'import':>8} {'get':>8} {'room':>8} {'update':>8}")
+    backends = ('whole file', 'json', 'sqlite')
+    for backend in backends:
+        directory = tempfile.mkdtemp(prefix='bench-registry-')
+        registry = make(backend, directory)
+        imported = timed(lambda index: registry.put_many(fleet, replace=True), 1)
+        get = timed(lambda index: registry.get(names[index * 7 % len(names)]), 500)
+        room = timed(lambda index: registry.find(room=f"room-{index % args.rooms}"), 200)
+        update = timed(lambda index: registry.put(names[index], dict(fleet[names[index]], preset='hd')), 50)
+        print(f"  {backend:<11} {imported:>8.2f} {get:>8.3f} {room:>8.3f} {update:>8.2f}")
+
+    total = args.writers * args.updates
+    print(f"concurrent: {args.writers} processes x {args.updates} updates of different cameras")
+    context = multiprocessing.get_context('fork')
+    for backend in backends:
+        directory = tempfile.mkdtemp(prefix='bench-registry-')
+        make(backend, directory).put_many(fleet, replace=True)
+        errors = context.Value('i', 0)
+        workers = [context.Process(target=writer, args=(backend, directory, worker, args.updates, args.cameras, errors))
+                   for worker in range(args.writers)]
+        started = time.perf_counter()
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+        try:
+            saved = make(backend, directory)
+            kept = sum(1 for camera in (saved.get(name) for name in names) if camera and 'updated_by' in camera)
+            state = f"{kept}/{total} updates saved"
+        except ValueError:
+            state = "file left corrupt"
+        print(f"  {backend:<11} {elapsed:>6.2f} s, {state}, {errors.value} reads of a half-written file")
+
+
+if __name__ == '__main__':
+    main()
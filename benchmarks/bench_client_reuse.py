@@ -0,0 +1,79 @@
+'''
+Cold-start vs warm-start client cost: building boto3 Rekognition and S3 clients on every
+invocation (the old connectClientToRekognition_TF) against the shared aws_clients registry.
+
+Calls are answered by botocore's Stubber, so nothing leaves the machine. That means the
+numbers cover client construction (credential resolution, endpoint and model loading) but
+not the TLS handshakes that keep-alive pooling also saves against the real endpoints.
+
+Needs boto3 installed.
+
+Run from the repo root:
+    python benchmarks/bench_client_reuse.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+# Static credentials so client creation never reaches for IMDS or a profile
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import boto3
+from botocore.stub import Stubber
+
+import aws_clients
+
+INVOCATIONS = 200
+REK_RESPONSE = {'ProtectiveEquipmentModelVersion': '1.0', 'Persons': []}
+
+
+def invoke(rekognition, s3):
+    # The two calls one connectClientToRekognition_TF invocation makes
+    with Stubber(rekognition) as rek_stub, Stubber(s3) as s3_stub:
+        rek_stub.add_response('detect_protective_equipment', REK_RESPONSE)
+        s3_stub.add_response('put_object', {'ETag': '"bench"'})
+        rekognition.detect_protective_equipment(Image={'Bytes': b'\xff\xd8bench'})
+        s3.put_object(Bucket='bench-bucket', Key='rekognition_results/bench.json', Body=b'{}')
+
+
+def per_invocation_clients():
+    rekognition = boto3.client('rekognition', region_name='us-east-1')
+    s3 = boto3.client('s3')
+    invoke(rekognition, s3)
+
+
+def registry_clients():
+    invoke(aws_clients.get_client('rekognition', 'us-east-1'), aws_clients.get_client('s3'))
+
+
+def time_invocations(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    per_invocation_clients() # warm up imports and the botocore model cache for a fair comparison
+
+    legacy = time_invocations(per_invocation_clients, INVOCATIONS)
+
+    aws_clients.reset_clients()
+    cold = time_invocations(registry_clients, 1)[0]
+    warm = time_invocations(registry_clients, INVOCATIONS)
+
+    print(f"{INVOCATIONS} stubbed invocations")
+    print(f"  new clients every invocation   mean {sum(legacy) / len(legacy):7.2f} ms")
+    print(f"  registry, first (cold) call         {cold:7.2f} ms")
+    print(f"  registry, warm invocations     mean {sum(warm) / len(warm):7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
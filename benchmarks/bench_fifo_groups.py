@@ -0,0 +1,103 @@
+'''
+Shows how FIFO consumer parallelism scales with camera count for the MessageGroupId
+strategies in frameEnqueue_TF: the old single "frame-events" group, one group per
+camera, and cameras hashed into a fixed number of groups.
+
+Frames are enqueued through the real handler into a local FIFO SQS stand-in, then a
+pool of consumer threads drains the queue, each holding one message while it "processes".
+
+Needs botocore installed (imported by lambdas/aws_clients.py).
+
+Run from the repo root:
+    python benchmarks/bench_fifo_groups.py
+'''
+
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['FRAME_QUEUE_URL'] = 'https://sqs.local/NewFrames.fifo'
+
+from stubs import LocalSQS
+from aws_clients import set_client
+import frameEnqueue_TF as enqueue
+
+QUEUE_URL = os.environ['FRAME_QUEUE_URL']
+CONSUMERS = 16
+FRAMES_PER_CAMERA = 40
+PROCESSING_TIME = 0.005 # seconds of "work" per frame
+
+
+def enqueue_frames(sqs, cameras):
+    records = [
+        {'s3': {'object': {'key': f"cameras/cam-{c}/frames/2025-07-23T22:00:{i:02d}.jpg"}}}
+        for i in range(FRAMES_PER_CAMERA) for c in range(cameras)
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        enqueue.lambda_handler({'Records': records}, None)
+
+
+def drain(sqs):
+    # Returns (elapsed seconds, peak number of messages processed at once)
+    active = [0, 0]
+    lock = threading.Lock()
+
+    def consumer():
+        while True:
+            response = sqs.receive_message(QueueUrl=QUEUE_URL, MaxNumberOfMessages=1, VisibilityTimeout=30)
+            messages = response.get('Messages', [])
+            if not messages:
+                with lock:
+                    if not sqs.messages and not sqs._in_flight:
+                        return
+                time.sleep(0.001)
+                continue
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(PROCESSING_TIME)
+            with lock:
+                active[0] -= 1
+            sqs.delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=messages[0]['ReceiptHandle'])
+
+    threads = [threading.Thread(target=consumer) for _ in range(CONSUMERS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, active[1]
+
+
+def single_group(camera_id):
+    return "frame-events"
+
+
+def main():
+    strategies = (
+        ('single group', single_group, 0),
+        ('per camera', None, 0),
+        ('8 hash buckets', None, 8)
+    )
+    original = enqueue._message_group_id
+    print(f"{CONSUMERS} consumers, {FRAMES_PER_CAMERA} frames per camera, {PROCESSING_TIME * 1000:.0f} ms per frame")
+    print(f"{'cameras':>8} {'strategy':<15} {'frames/s':>9} {'peak parallel':>14}")
+    for cameras in (1, 4, 16, 64):
+        for name, group_fn, buckets in strategies:
+            enqueue._message_group_id = group_fn or original
+            enqueue.GROUP_BUCKETS = buckets
+            sqs = LocalSQS()
+            set_client('sqs', sqs)
+            enqueue_frames(sqs, cameras)
+            elapsed, peak = drain(sqs)
+            print(f"{cameras:>8} {name:<15} {cameras * FRAMES_PER_CAMERA / elapsed:9.0f} {peak:>14}")
+    enqueue._message_group_id = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Offline replay of a directory of frames through the perceptual-hash dedup cache
+(lambdas/frame_cache.py): hit rate, Rekognition calls saved and hashing cost per frame
+at several Hamming-distance thresholds.
+
+Frames are replayed in file-name order. Sub-directories are treated as separate cameras.
+Without --frames, a synthetic mostly-static scene is generated.
+
+Needs numpy and Pillow installed.
+
+Run from the repo root:
+    python benchmarks/bench_frame_dedup.py [--frames DIR] [--fps 1] [--ttl 30]
+'''
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+import numpy as np
+from PIL import Image
+
+from frame_cache import FrameCache, dhash
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_frames(directory):
+    # Returns {camera: [image bytes, ...]}; files directly in DIR belong to camera "default"
+    cameras = {}
+    for root, _, files in os.walk(directory):
+        camera = os.path.relpath(root, directory)
+        camera = 'default' if camera == '.' else camera
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(root, name), 'rb') as f:
+                    cameras.setdefault(camera, []).append(f.read())
+    return cameras
+
+
+def synthetic_frames(count=300, width=800, height=600, seed=3):
+    # A static background with sensor noise; every ~40 frames a "person" walks through for 10 frames
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height // 8, width // 8), dtype=np.uint8)
+    background = np.kron(background, np.ones((8, 8), dtype=np.uint8))
+    frames = []
+    for i in range(count):
+        frame = background.astype(np.int16) + rng.integers(-6, 7, background.shape)
+        if i % 40 < 10:
+            x = 50 + (i % 40) * 60
+            frame[200:550, x:x + 120] = 30
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=85)
+        frames.append(buffer.getvalue())
+    return {'synthetic': frames}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', help="Directory of .jpg/.jpeg/.png frames (sub-directories = cameras)")
+    parser.add_argument('--fps', type=float, default=1.0, help="Replay rate used for the TTL clock")
+    parser.add_argument('--ttl', type=float, default=30.0, help="Cache TTL in seconds")
+    args = parser.parse_args()
+
+    cameras = load_frames(args.frames) if args.frames else synthetic_frames()
+    total = sum(len(frames) for frames in cameras.values())
+
+    # Hash every frame once and time it; the cache replays below only compare hashes
+    start = time.perf_counter()
+    hashes = {camera: [dhash(frame) for frame in frames] for camera, frames in cameras.items()}
+    hash_ms = (time.perf_counter() - start) / total * 1000
+
+    print(f"{total} frames from {len(cameras)} camera(s), replayed at {args.fps} fps, TTL {args.ttl:.0f} s")
+    print(f"dHash cost: {hash_ms:.2f} ms per frame")
+    print(f"{'distance':>9} {'hit rate':>9} {'rekognition calls':>18}")
+    for max_distance in (0, 2, 4, 8, 12):
+        clock = [0.0]
+        cache = FrameCache(max_distance=max_distance, ttl_seconds=args.ttl, clock=lambda: clock[0])
+        calls = 0
+        for camera, camera_hashes in hashes.items():
+            for index, frame_hash in enumerate(camera_hashes):
+                clock[0] = index / args.fps
+                cached, _ = cache.lookup(camera, frame_hash)
+                if cached is None:
+                    calls += 1
+                    cache.store(camera, frame_hash, {'frame': index})
+        print(f"{max_distance:>9} {cache.hit_rate():>9.1%} {calls:>10} / {total}")
+
+
+if __name__ == '__main__':
+    main()
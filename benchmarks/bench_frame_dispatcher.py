@@ -0,0 +1,163 @@
+'''
+Frames per second and cost per frame of the NewFrames.fifo consumer
+(stream_processor/container/frame_dispatcher.py) against local stand-ins: frames are
+enqueued through frameEnqueue_TF into LocalSQS, LocalRekognition answers in
+--latency s (+ up to --jitter s) and throttles above --tps calls per second, and LocalS3
+holds the frames (1 in 100 is missing) and the results.
+
+- per frame: one message per receive, one Rekognition call at a time, two pointer PUTs and
+  a DeleteMessage per frame (what a straightforward consumer of the queue does)
+- dispatcher without a rate limit: --tps x 2 workers firing as fast as they can
+- dispatcher with the token bucket at the quota
+- visibility: 1 s visibility timeout and 1.2-1.5 s Rekognition calls, with and without
+  the visibility extension; billed calls for frames SQS handed out twice
+
+Cost uses us-east-1 list prices (PRICES below; check current pricing): Rekognition bills
+successful calls only, SQS FIFO bills every request, S3 every PUT.
+
+Needs botocore installed (imported by lambdas/aws_clients.py).
+
+Run from the repo root:
+    python benchmarks/bench_frame_dispatcher.py [--frames 200] [--cameras 50] [--tps 20]
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'stream_processor', 'container'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas')) # ppe_summary, results_index, metrics, copied into the image
+sys.path.insert(0, HERE)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['FRAME_QUEUE_URL'] = 'https://sqs.local/NewFrames.fifo'
+
+import frameEnqueue_TF as enqueue
+from aws_clients import set_client
+from frame_dispatcher import FrameDispatcher
+from ppe_summary import dumps_compact, summarize
+from results_index import RESULTS_PREFIX, write_latest_pointer
+from stubs import LocalRekognition, LocalS3, LocalSQS
+
+QUEUE_URL = os.environ['FRAME_QUEUE_URL']
+BUCKET = 'bench'
+PRICES = {
+    'rekognition': 0.00015, # DetectProtectiveEquipment, per image
+    'sqs': 0.50 / 1e6, # FIFO, per request
+    's3_put': 0.005 / 1000 # per PUT
+}
+
+
+def setup(frames, cameras, tps, latency, jitter):
+    s3 = LocalS3(latency=0.02, jitter=0.01)
+    sqs = LocalSQS(latency=0.01)
+    rekognition = LocalRekognition(latency=latency, jitter=jitter, tps=tps, s3=s3)
+    records = []
+    for index in range(frames):
+        key = f"cameras/cam-{index % cameras}/frames/2025-07-23T22:{index // 60 % 60:02d}:{index % 60:02d}.{index:03d}.jpg"
+        if index % 100 != 99:
+            s3.objects[(BUCKET, key)] = {'Body': b'jpeg', 'LastModified': None, 'ContentType': 'image/jpeg', 'Metadata': {}}
+        records.append({'s3': {'object': {'key': key}}})
+    set_client('sqs', sqs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for start in range(0, len(records), 100):
+            enqueue.lambda_handler({'Records': records[start:start + 100]}, None)
+    sqs.calls.clear()
+    return s3, sqs, rekognition
+
+
+def per_frame(s3, sqs, rekognition, frames, visibility_seconds=60):
+    # One message at a time, start to finish
+    done = 0
+    while done < frames:
+        messages = sqs.receive_message(QueueUrl=QUEUE_URL, MaxNumberOfMessages=1, WaitTimeSeconds=1,
+                                       VisibilityTimeout=visibility_seconds).get('Messages', [])
+        for message in messages:
+            body = json.loads(message['Body'])
+            try:
+                response = rekognition.detect_protective_equipment(
+                    Image={'S3Object': {'Bucket': BUCKET, 'Name': body['s3Key']}},
+                    SummarizationAttributes={'MinConfidence': 80, 'RequiredEquipmentTypes': ['HEAD_COVER']}
+                )
+            except rekognition.exceptions.ThrottlingException:
+                continue # comes back after its visibility timeout
+            except rekognition.exceptions.InvalidS3ObjectException:
+                pass
+            else:
+                key = f"{RESULTS_PREFIX}{message['MessageId']}.json"
+                s3.put_object(Bucket=BUCKET, Key=key, Body=dumps_compact(summarize(response, body['cameraId'], ['HEAD_COVER'])))
+                write_latest_pointer(s3, BUCKET, key, body['cameraId'])
+            sqs.delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=message['ReceiptHandle'])
+            done += 1
+
+
+class NoExtension(FrameDispatcher):
+    def extend_visibility(self):
+        pass
+
+
+def dispatch(s3, sqs, rekognition, frames, dispatcher_class=FrameDispatcher, **kwargs):
+    dispatcher = dispatcher_class(QUEUE_URL, BUCKET, sqs, s3, rekognition, wait_seconds=1,
+                                  equipment_types=['HEAD_COVER'], **kwargs)
+    stop = threading.Event()
+    thread = threading.Thread(target=dispatcher.run, args=(stop,))
+    thread.start()
+    while dispatcher.stats['stored'] + dispatcher.stats['rejected'] < frames:
+        time.sleep(0.01)
+    stop.set()
+    thread.join()
+    return dispatcher
+
+
+def report(name, frames, elapsed, s3, sqs, rekognition):
+    billed = rekognition.calls['detect_protective_equipment']
+    sqs_requests = sum(sqs.calls.values())
+    puts = s3.calls['put_object']
+    cost = billed * PRICES['rekognition'] + sqs_requests * PRICES['sqs'] + puts * PRICES['s3_put']
+    print(f"  {name:<24} {frames / elapsed:>8.1f} {rekognition.calls['throttled']:>10} "
+          f"{sqs_requests / frames:>9.2f} {puts / frames:>8.2f} {cost / frames * 1e6:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--cameras', type=int, default=50)
+    parser.add_argument('--tps', type=float, default=20.0, help="Rekognition TPS quota")
+    parser.add_argument('--latency', type=float, default=0.15, help="Rekognition call latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{args.frames} frames from {args.cameras} cameras, {args.tps:.0f} TPS quota, "
+          f"{args.latency * 1000:.0f}-{(args.latency + args.jitter) * 1000:.0f} ms per call")
+    print(f"  {'mode':<24} {'frames/s':>8} {'throttled':>10} {'SQS/frame':>9} {'PUT/frame':>8} {'cost/frame µ$':>13}")
+    modes = (
+        ('per frame', per_frame, {}),
+        ('dispatcher, no limit', dispatch, {'rate': 1e6, 'workers': int(args.tps * 2)}),
+        ('dispatcher, token bucket', dispatch, {'rate': args.tps})
+    )
+    for name, run, kwargs in modes:
+        s3, sqs, rekognition = setup(args.frames, args.cameras, args.tps, args.latency, args.jitter)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # missing-frame / retry logs
+            run(s3, sqs, rekognition, args.frames, **kwargs)
+        report(name, args.frames, time.perf_counter() - started, s3, sqs, rekognition)
+
+    frames = 40
+    print(f"visibility: {frames} frames, 1 s visibility timeout, 1.2-1.5 s per Rekognition call")
+    for name, dispatcher_class in (('extended', FrameDispatcher), ('not extended', NoExtension)):
+        s3, sqs, rekognition = setup(frames, args.cameras, 100, 1.2, 0.3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            dispatcher = dispatch(s3, sqs, rekognition, frames, dispatcher_class, rate=100, workers=20,
+                                  visibility_seconds=1)
+        twice = sum(1 for count in rekognition.images.values() if count > 1)
+        print(f"  {name:<14} {rekognition.calls['detect_protective_equipment']:>4} billed calls, "
+              f"{twice} frames analysed more than once, {dispatcher.stats['visibility_batches']} extension batches")
+
+
+if __name__ == '__main__':
+    main()
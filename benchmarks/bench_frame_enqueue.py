@@ -0,0 +1,78 @@
+'''
+Compares one send_message per S3 record with the batched SendMessageBatch path in
+frameEnqueue_TF, against a local SQS stand-in with per-request latency and injected
+per-entry failures. An invocation that raises is run again like Lambda's async retry
+(up to 2 retries); the queue's deduplication drops the frames the failed attempt did send.
+
+Needs botocore installed (imported by lambdas/aws_clients.py).
+
+Run from the repo root:
+    python benchmarks/bench_frame_enqueue.py
+'''
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['FRAME_QUEUE_URL'] = 'https://sqs.local/NewFrames.fifo'
+
+from stubs import LocalSQS
+from aws_clients import set_client
+import frameEnqueue_TF as enqueue
+
+
+def make_event(record_count, cameras=4):
+    records = []
+    for i in range(record_count):
+        key = f"cameras/cam-{i % cameras}/frames/2025-07-23T22:{i // 60 % 60:02d}:{i % 60:02d}.jpg"
+        records.append({'s3': {'bucket': {'name': 'bench-bucket'}, 'object': {'key': key}}})
+    return {'Records': records}
+
+
+def legacy_handler(sqs, event):
+    # What the handler used to do: one send_message round trip per record
+    for record in event['Records']:
+        s3_key = record['s3']['object']['key']
+        message = enqueue._build_message(s3_key)
+        sqs.send_message(
+            QueueUrl=os.environ['FRAME_QUEUE_URL'],
+            MessageBody=json.dumps(message),
+            MessageGroupId="frame-events",
+            MessageDeduplicationId=s3_key
+        )
+
+
+def main(record_count=300, latency=0.01, failure_rate=0.05):
+    event = make_event(record_count)
+    print(f"{record_count} records, {latency * 1000:.0f} ms per SQS request, {failure_rate:.0%} injected entry failures")
+
+    sqs = LocalSQS(latency=latency)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy_handler(sqs, event)
+    print(f"  send_message       {time.perf_counter() - start:6.2f} s  calls={sum(sqs.calls.values()):4d}"
+          f"  enqueued={len(sqs.messages)}")
+
+    sqs = LocalSQS(latency=latency, failure_rate=failure_rate)
+    set_client('sqs', sqs)
+    start = time.perf_counter()
+    invocations = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for invocations in range(1, 4): # first attempt + Lambda's 2 async retries
+            try:
+                enqueue.lambda_handler(event, None)
+                break
+            except RuntimeError:
+                pass
+    keys = [json.loads(message['Body'])['s3Key'] for message in sqs.messages]
+    print(f"  send_message_batch {time.perf_counter() - start:6.2f} s  calls={sum(sqs.calls.values()):4d}"
+          f"  enqueued={len(sqs.messages)}  invocations={invocations}  duplicates={len(keys) - len(set(keys))}")
+
+
+if __name__ == '__main__':
+    main()
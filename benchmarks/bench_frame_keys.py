@@ -0,0 +1,56 @@
+'''
+Micro-benchmark: the old split/replace/strptime/strftime parsing in frameEnqueue_TF
+against lambdas/frame_keys.parse_frame_key.
+
+Run from the repo root:
+    python benchmarks/bench_frame_keys.py
+'''
+
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from frame_keys import parse_frame_key
+
+KEYS = [f"cameras/cam-{i % 32}/frames/2025-07-23T{i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}.jpg" for i in range(1000)]
+ENCODED_KEYS = [key.replace(':', '%3A') for key in KEYS] # how S3 events deliver them
+MILLIS_KEYS = [f"cameras/cam-{i % 32}/frames/{1753308000123 + i * 66}.jpg" for i in range(1000)]
+
+
+def legacy_parse(s3_key):
+    path_parts = s3_key.split('/')
+    if len(path_parts) < 4:
+        raise Exception("Invalid key format")
+    camera_id = path_parts[1]
+    timestamp_raw = path_parts[-1].replace('.jpg', '')
+    timestamp_obj = datetime.strptime(timestamp_raw, "%Y-%m-%dT%H:%M:%S")
+    return camera_id, timestamp_obj.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def bench(label, fn, keys, repeat=5, number=20):
+    best = min(timeit.repeat(lambda: [fn(key) for key in keys], repeat=repeat, number=number))
+    per_key = best / (number * len(keys)) * 1e6
+    print(f"  {label:<34} {per_key:6.2f} us/key")
+    return per_key
+
+
+def main():
+    # Both parsers must agree on the original format
+    for key in KEYS:
+        legacy = legacy_parse(key)
+        parsed = parse_frame_key(key)
+        assert legacy == (parsed.camera_id, parsed.timestamp), (key, legacy, parsed)
+
+    print(f"{len(KEYS)} keys per run")
+    legacy = bench('legacy strptime/strftime', legacy_parse, KEYS)
+    fast = bench('parse_frame_key (ISO)', parse_frame_key, KEYS)
+    bench('parse_frame_key (URL-encoded ISO)', parse_frame_key, ENCODED_KEYS)
+    bench('parse_frame_key (epoch millis)', parse_frame_key, MILLIS_KEYS)
+    print(f"  speedup on the original format: {legacy / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
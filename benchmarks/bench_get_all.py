@@ -0,0 +1,80 @@
+'''
+Compares the old sequential, single-dict getAllRekognitionResult_TF with the paginated,
+thread-pooled fetch (JSON and NDJSON) of the flat rekognition_results/{uuid}.json layout,
+against a local S3 stand-in with per-request latency. bench_result_layout.py covers the
+partitioned layout and rollups.
+
+Needs botocore installed (imported by lambdas/aws_clients.py).
+
+Run from the repo root:
+    python benchmarks/bench_get_all.py
+'''
+
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['BUCKET_NAME'] = 'bench-bucket'
+
+from stubs import LocalS3
+from aws_clients import set_client
+import getAllRekognitionResult_TF as get_all
+
+BUCKET = 'bench-bucket'
+
+
+def legacy_handler(s3):
+    # What the handler used to do: first page, one get_object at a time, one big dict
+    response = s3.list_objects_v2(Bucket=BUCKET, Prefix='rekognition_results/')
+    all_files_data = {}
+    for obj in response['Contents']:
+        file_obj = s3.get_object(Bucket=BUCKET, Key=obj['Key'])
+        all_files_data[obj['Key']] = json.loads(file_obj['Body'].read().decode('utf-8'))
+    return json.dumps(all_files_data)
+
+
+def page_through(params):
+    # Follows X-Continuation-Token until the listing is exhausted, returns (pages, results)
+    pages = results = 0
+    params = dict(params)
+    while True:
+        response = get_all.lambda_handler({'queryStringParameters': params}, None)
+        pages += 1
+        body = response['body']
+        results += body.count('\n') if params.get('format') == 'ndjson' else len(json.loads(body))
+        token = response['headers'].get('X-Continuation-Token')
+        if not token:
+            return pages, results
+        params['continuation_token'] = token
+
+
+def main(result_count=2000, latency=0.01):
+    s3 = LocalS3()
+    payload = json.dumps({'cameraId': 'cam-1', 'HeadCoverings': [], 'FullResponse': {'Persons': []}})
+    for _ in range(result_count):
+        s3.put_object(Bucket=BUCKET, Key=f"rekognition_results/{uuid.uuid4()}.json", Body=payload)
+    s3.latency = latency
+    set_client('s3', s3)
+
+    print(f"{result_count} results, {latency * 1000:.0f} ms per S3 request, {get_all.MAX_WORKERS} fetch workers")
+
+    s3.calls.clear()
+    start = time.perf_counter()
+    legacy_handler(s3)
+    print(f"  legacy (first page only)   {time.perf_counter() - start:7.2f} s  requests={sum(s3.calls.values())}")
+
+    for fmt in ('json', 'ndjson'):
+        s3.calls.clear()
+        start = time.perf_counter()
+        pages, results = page_through({'limit': '500', 'format': fmt, 'layout': 'flat'})
+        elapsed = time.perf_counter() - start
+        print(f"  paginated {fmt:<6} (all)      {elapsed:7.2f} s  requests={sum(s3.calls.values())}"
+              f"  pages={pages} results={results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Drives the asyncio KVS ingest engine (stream_processor/container/kvs_client.py) against the
+fake GetMedia endpoint in stubs.py and reports how many streams one vCPU can ingest.
+
+Each stream replays N one-second MKV fragments (synthetic 15 fps H.264-sized frames, or
+--fixtures, a directory of .mkv fragments) as fast as the engine takes them. Responses end
+every 20 fragments and --drop-rate of fragments are cut off mid-way, so resume is exercised:
+the run checks every fragment arrived and every keyframe was queued exactly once. The
+ingest CPU (reading + MKV parsing, no decoding) per media-second gives the
+streams-per-vCPU estimate. A second run with a slow consumer shows that backpressure keeps
+memory bounded.
+
+Run from the repo root:
+    python benchmarks/bench_kvs_ingest.py [--streams 1 8 32 128] [--fragments 30] [--fixtures DIR]
+'''
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'stream_processor', 'container'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas')) # metrics, copied into the image by the Dockerfile
+sys.path.insert(0, HERE)
+
+from kvs_client import KVSClient
+from stubs import FakeMediaSource
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.mkv', '.webm', '.jpg', '.jpeg')):
+            with open(os.path.join(directory, name), 'rb') as f:
+                fixtures.append(f.read())
+    return fixtures
+
+
+async def ingest(streams, fragments, drop_rate, fixtures, handler_delay=0.0, max_buffered=32):
+    source = FakeMediaSource(fixtures=fixtures, fragments_per_stream=fragments, drop_rate=drop_rate, seed=streams)
+    received = {'bytes': 0, 'frames': 0, 'max_queued': 0}
+
+    async def handler(frame):
+        received['frames'] += 1
+        received['bytes'] += len(frame.data)
+        if handler_delay:
+            await asyncio.sleep(handler_delay)
+
+    client = KVSClient(source, handler, max_buffered=max_buffered)
+    names = [f"camera-{i:04d}" for i in range(streams)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    await client.set_streams(names)
+    while any(len(set(source.delivered.get(name, []))) < fragments for name in names):
+        await asyncio.sleep(0.01)
+        received['max_queued'] = max(received['max_queued'], max(s.queue.qsize() for s in client.sessions.values()))
+    for session in client.sessions.values():
+        await session.queue.join()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    reconnects = sum(session.stats['reconnects'] for session in client.sessions.values())
+    media_bytes = sum(session.stats['bytes'] for session in client.sessions.values())
+    # One keyframe per synthetic one-second fragment, so exactly-once means frames == fragments
+    complete = (fixtures is not None or received['frames'] == streams * fragments) and all(
+        sorted(set(source.delivered[name])) == list(range(source.FIRST_FRAGMENT, source.FIRST_FRAGMENT + fragments))
+        for name in names
+    )
+    await client.close()
+    return wall, cpu, media_bytes, received, reconnects, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--fragments', type=int, default=30, help="One-second fragments per stream")
+    parser.add_argument('--drop-rate', type=float, default=0.05, help="Fraction of fragments cut off mid-way")
+    parser.add_argument('--fixtures', help="Directory of .mkv fragments to replay instead of synthetic ones")
+    args = parser.parse_args()
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+
+    print(f"{'streams':>8} {'wall s':>7} {'cpu s':>7} {'MB/s':>7} {'reconnects':>11} {'complete':>9} {'streams/vCPU':>13}")
+    for streams in args.streams:
+        with contextlib.redirect_stdout(io.StringIO()): # the engine logs every injected disconnect
+            wall, cpu, media_bytes, _, reconnects, complete = asyncio.run(
+                ingest(streams, args.fragments, args.drop_rate, fixtures)
+            )
+        media_seconds = streams * args.fragments
+        print(f"{streams:>8} {wall:>7.2f} {cpu:>7.2f} {media_bytes / wall / 1e6:>7.1f} {reconnects:>11} "
+              f"{str(complete):>9} {media_seconds / cpu:>13.0f}")
+
+    # Backpressure: a consumer that needs 100 ms per frame can't keep up with an unpaced source
+    _, _, _, received, _, _ = asyncio.run(ingest(8, 20, 0.0, fixtures, handler_delay=0.1, max_buffered=4))
+    print(f"slow consumer: max {received['max_queued']} frames queued per stream (limit 4)")
+
+
+if __name__ == '__main__':
+    main()
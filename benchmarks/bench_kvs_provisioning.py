@@ -0,0 +1,101 @@
+'''
+Fleet boot time of the Pi CLI's KVS stream provisioning
+(raspberrypi-cli/camera_control/stream_provisioning.py) against LocalKinesisVideo:
+--latency s per request, a new stream takes --activation s (+ up to --jitter s) to go
+from CREATING to ACTIVE.
+
+- serial: what start_cam_stream did per camera before, one camera after the other:
+  DescribeStream, CreateStream if missing, then DescribeStream every 2 s until ACTIVE
+- provisioned: provision_streams for every camera at once (parallel describe/create,
+  one shared jittered-backoff waiter), cold and with the ARN cache warm
+
+Boot scenarios for --cameras cameras: first boot (no stream exists yet) and a reboot
+(every stream exists). Reported: wall time and kinesisvideo requests.
+
+Needs boto3 installed (imported by camera_control).
+
+Run from the repo root:
+    python benchmarks/bench_kvs_provisioning.py [--cameras 8] [--activation 4]
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'raspberrypi-cli'))
+sys.path.insert(0, HERE)
+
+from botocore.exceptions import ClientError
+
+from camera_control.stream_provisioning import StreamCache, provision_streams
+from stubs import LocalKinesisVideo
+
+
+def cameras(count):
+    return {f"cam-{index}": {'stream_name': f"site-a-cam-{index}", 'aws_region': 'us-east-1',
+                             'connection_type': 'v4l2', 'device': f"/dev/video{index}"}
+            for index in range(count)}
+
+
+def serial(kvs, cams):
+    # The describe / create / sleep(2) loop start_cam_stream ran for each camera
+    for camera in cams.values():
+        stream_name = camera['stream_name']
+        try:
+            kvs.describe_stream(StreamName=stream_name)
+            continue
+        except ClientError:
+            pass
+        kvs.create_stream(StreamName=stream_name, DataRetentionInHours=24)
+        for _ in range(30):
+            time.sleep(2)
+            if kvs.describe_stream(StreamName=stream_name)['StreamInfo']['Status'] == 'ACTIVE':
+                break
+
+
+def provisioned(kvs, cams, cache):
+    arns, errors = provision_streams(cams, client_factory=lambda region: kvs, cache=cache)
+    assert len(arns) == len(cams) and not errors, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.15, help="Seconds per kinesisvideo request")
+    parser.add_argument('--activation', type=float, default=4.0, help="Seconds a new stream stays CREATING")
+    parser.add_argument('--jitter', type=float, default=2.0)
+    args = parser.parse_args()
+
+    cams = cameras(args.cameras)
+    names = [camera['stream_name'] for camera in cams.values()]
+    cache_dir = tempfile.mkdtemp(prefix='bench-kvs-')
+    print(f"{args.cameras} cameras, {args.latency * 1000:.0f} ms per request, "
+          f"new streams ACTIVE after {args.activation:.0f}-{args.activation + args.jitter:.0f} s")
+    print(f"  {'boot':<12} {'mode':<22} {'seconds':>8} {'describe':>9} {'create':>7}")
+    for boot, existing in (('first boot', ()), ('reboot', names)):
+        warm = StreamCache(path=os.path.join(cache_dir, f"{len(existing)}-warm.json"))
+        runs = (
+            ('serial', lambda kvs: serial(kvs, cams)),
+            ('provisioned, cold', lambda kvs: provisioned(kvs, cams, StreamCache(path=os.path.join(cache_dir, 'cold.json'), ttl=0))),
+            ('provisioned, warm', lambda kvs: provisioned(kvs, cams, warm))
+        )
+        for mode, run in runs:
+            if mode == 'provisioned, warm':
+                # The cache a previous start left behind
+                with contextlib.redirect_stdout(io.StringIO()):
+                    provisioned(LocalKinesisVideo(latency=0, activation=0, jitter=0, streams=names), cams, warm)
+            kvs = LocalKinesisVideo(latency=args.latency, activation=args.activation, jitter=args.jitter, streams=existing)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(kvs)
+            elapsed = time.perf_counter() - started
+            print(f"  {boot:<12} {mode:<22} {elapsed:>8.2f} {kvs.calls['describe_stream']:>9} {kvs.calls['create_stream']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Compares the old list-and-max lookup in getLatestRekognitionResult_TF with the
+latest-result index pointer, against a local S3 stand-in.
+
+Run from the repo root:
+    python benchmarks/bench_latest_result.py
+'''
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from stubs import LocalS3
+from results_index import RESULTS_PREFIX, read_latest_pointer, scan_latest_result_key, write_latest_pointer
+
+BUCKET = 'bench-bucket'
+
+
+def legacy_lookup(s3):
+    # What the handler used to do: first page only, max() over LastModified
+    response = s3.list_objects_v2(Bucket=BUCKET, Prefix=RESULTS_PREFIX)
+    latest = max(response['Contents'], key=lambda obj: obj['LastModified'])
+    return latest['Key']
+
+
+def full_scan_lookup(s3):
+    # Correct but O(n / 1000) requests; only used to seed the index for old buckets
+    return scan_latest_result_key(s3, BUCKET)
+
+
+def indexed_lookup(s3):
+    return read_latest_pointer(s3, BUCKET)['key']
+
+
+def run(result_count, latency):
+    s3 = LocalS3()
+    newest = None
+    for _ in range(result_count):
+        newest = f"{RESULTS_PREFIX}{uuid.uuid4()}.json"
+        s3.put_object(Bucket=BUCKET, Key=newest, Body='{}')
+        write_latest_pointer(s3, BUCKET, newest)
+
+    s3.latency = latency
+    print(f"\n{result_count} stored results")
+    lookups = (('list+max', legacy_lookup), ('full scan', full_scan_lookup), ('index', indexed_lookup))
+    for name, lookup in lookups:
+        s3.calls.clear()
+        start = time.perf_counter()
+        key = lookup(s3)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"  {name:<10} {elapsed:8.2f} ms  requests={sum(s3.calls.values())}  correct={key == newest}")
+
+
+if __name__ == '__main__':
+    for count in (100, 1000, 5000, 20000):
+        run(count, latency=0.005)
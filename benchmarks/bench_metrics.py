@@ -0,0 +1,100 @@
+'''
+Overhead of the shared metrics module (lambdas/metrics.py): the cost of recording a
+sample on the hot path, of a Prometheus scrape of the stream processor's metric set at
+50 / 200 / 1000 cameras, and of the EMF flush at the end of a Lambda invocation.
+
+Run from the repo root:
+    python benchmarks/bench_metrics.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from metrics import Registry
+
+N = 200000
+
+
+def per_call(fn, n=N):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+def container_registry(cameras):
+    # The metric set main.py registers, with every camera active
+    registry = Registry()
+    stages = registry.histogram('pipeline_stage_seconds', "stage latency", ('stage',))
+    lag = registry.gauge('camera_frame_lag_seconds', "lag", ('camera',))
+    frames = registry.counter('pipeline_frames_total', "frames", ('outcome',))
+    names = [f"cam-{index}" for index in range(cameras)]
+    registry.gauge('kvs_buffered_frames', "buffered", ('camera',)).set_function(lambda: dict.fromkeys(names, 3))
+    registry.counter('kvs_bytes_total', "bytes", ('camera',)).set_function(lambda: dict.fromkeys(names, 1e9))
+    requests = registry.counter('aws_requests_total', "calls", ('service', 'operation', 'outcome'))
+    latency = registry.histogram('aws_request_seconds', "call latency", ('service', 'operation'))
+    for name in names:
+        lag.labels(name).set(0.4)
+    for stage in ('ingest', 'decode', 'encode', 'total'):
+        for value in range(1000):
+            stages.labels(stage).observe(value / 1000)
+    for outcome in ('read', 'forwarded', 'skipped'):
+        frames.labels(outcome).inc(1000)
+    for service, operation in (('s3', 'PutObject'), ('dynamodb', 'UpdateItem'), ('dynamodb', 'BatchGetItem'),
+                               ('kinesis-video-media', 'GetMedia'), ('kinesisvideo', 'GetDataEndpoint')):
+        requests.labels(service, operation, 'ok').inc(100)
+        latency.labels(service, operation).observe(0.02)
+    return registry
+
+
+def main():
+    registry = Registry()
+    counter = registry.counter('c_total', "counter", ('outcome',))
+    child = counter.labels('ok')
+    histogram = registry.histogram('h_seconds', "histogram", ('stage',))
+    series = histogram.labels('decode')
+
+    def timed():
+        with series.time():
+            pass
+
+    print("recording one sample:")
+    print(f"  {'counter, series kept':<32} {per_call(child.inc):>6.0f} ns")
+    print(f"  {'counter, labels() per call':<32} {per_call(lambda: counter.labels('ok').inc()):>6.0f} ns")
+    print(f"  {'histogram observe':<32} {per_call(lambda: series.observe(0.042)):>6.0f} ns")
+    print(f"  {'histogram time() block':<32} {per_call(timed):>6.0f} ns")
+
+    print("Prometheus scrape of the stream processor metrics:")
+    for cameras in (50, 200, 1000):
+        registry = container_registry(cameras)
+        started = time.perf_counter()
+        for _ in range(20):
+            body = registry.render_prometheus()
+        print(f"  {cameras:>5} cameras: {(time.perf_counter() - started) / 20 * 1000:>6.2f} ms, "
+              f"{len(body) / 1024:>6.1f} KiB, {body.count(chr(10))} lines")
+
+    # One connectClientToRekognition_TF invocation: a Rekognition call, two S3 PUTs, a cache lookup
+    registry = Registry()
+    lines = []
+    requests = registry.counter('aws_requests_total', "calls", ('service', 'operation', 'outcome'))
+    latency = registry.histogram('aws_request_seconds', "call latency", ('service', 'operation'))
+    lookups = registry.counter('dedup_cache_lookups_total', "lookups", ('result',))
+    started = time.perf_counter()
+    for _ in range(1000):
+        lines.clear()
+        requests.labels('rekognition', 'DetectProtectiveEquipment', 'ok').inc()
+        latency.labels('rekognition', 'DetectProtectiveEquipment').observe(0.35)
+        requests.labels('s3', 'PutObject', 'ok').inc(2)
+        latency.labels('s3', 'PutObject').observe(0.03)
+        lookups.labels('miss').inc()
+        registry.flush_emf(dimensions={'FunctionName': 'connectClientToRekognition_TF'}, emit=lines.append)
+    elapsed = (time.perf_counter() - started) / 1000
+    print(f"EMF flush per Lambda invocation: {elapsed * 1e6:.0f} us, {len(lines)} log lines, "
+          f"{sum(len(line) for line in lines)} bytes")
+
+
+if __name__ == '__main__':
+    main()
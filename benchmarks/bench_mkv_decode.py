@@ -0,0 +1,106 @@
+'''
+CPU per stream for turning GetMedia MKV into frames (stream_processor/container/mkv_parser.py):
+full decoding of every frame vs keyframes only vs every Nth keyframe.
+
+Replays recorded .mkv fixtures (--fixtures DIR, e.g. saved GetMedia responses) or, without
+them, encodes a synthetic 15 fps H.264 clip first. Each file is fed to the parser in 64 KiB
+chunks, like kvs_client does, and the selected frames are decoded with PyAV. CPU per
+second of video gives the number of streams one vCPU can keep up with.
+
+Needs PyAV (pip install av) and numpy.
+
+Run from the repo root:
+    python benchmarks/bench_mkv_decode.py [--fixtures DIR] [--size 1280x720] [--gop 30]
+'''
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stream_processor', 'container'))
+
+import av
+import numpy as np
+
+from mkv_parser import FrameDecoder, MKVParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_clip(seconds=20, fps=15, width=1280, height=720, gop=30, seed=9):
+    # A textured scene with noise and a moving block, encoded like a Pi camera (no B-frames)
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    background = np.kron(background, np.ones((16, 16, 1), dtype=np.uint8))
+    buffer = io.BytesIO()
+    container = av.open(buffer, 'w', format='matroska')
+    stream = container.add_stream('h264', rate=fps)
+    stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+    stream.options = {'g': str(gop), 'bf': '0', 'preset': 'veryfast'}
+    for i in range(seconds * fps):
+        frame = background + rng.integers(0, 6, background.shape, dtype=np.uint8)
+        x = (i * 12) % (width - 200)
+        frame[200:500, x:x + 200] = 30
+        for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format='rgb24')):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+    return buffer.getvalue(), seconds
+
+
+def clip_seconds(data):
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        return float(stream.duration * stream.time_base) if stream.duration else float(container.duration / 1e6)
+
+
+def run(data, keyframes_only, every_nth):
+    # Returns (CPU seconds, frames parsed, frames decoded)
+    started = time.process_time()
+    parser = MKVParser(keyframes_only=keyframes_only, every_nth=every_nth)
+    decoder = None
+    decoded = 0
+    view = memoryview(data)
+    for offset in range(0, len(data), CHUNK_SIZE):
+        for frame in parser.feed(bytes(view[offset:offset + CHUNK_SIZE])):
+            if decoder is None:
+                decoder = FrameDecoder(parser.codec_id, parser.codec_private, keyframes_only=keyframes_only)
+            if decoder.decode(frame) is not None:
+                decoded += 1
+    return time.process_time() - started, parser.stats['frames'], decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', help="Directory of recorded .mkv files")
+    parser.add_argument('--size', default='1280x720', help="Synthetic clip resolution")
+    parser.add_argument('--gop', type=int, default=30, help="Synthetic clip keyframe interval in frames")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        clips = []
+        for name in sorted(os.listdir(args.fixtures)):
+            if name.lower().endswith('.mkv'):
+                with open(os.path.join(args.fixtures, name), 'rb') as f:
+                    data = f.read()
+                clips.append((name, data, clip_seconds(data)))
+    else:
+        width, height = (int(v) for v in args.size.split('x'))
+        data, seconds = synthetic_clip(width=width, height=height, gop=args.gop)
+        clips = [(f"synthetic {args.size} gop {args.gop}", data, seconds)]
+
+    modes = [('full decode', False, 1), ('keyframes', True, 1), ('every 2nd keyframe', True, 2)]
+    for name, data, seconds in clips:
+        print(f"{name}: {len(data) / 1e6:.1f} MB, {seconds:.0f} s")
+        print(f"  {'mode':<20} {'frames':>7} {'decoded':>8} {'cpu ms per s':>13} {'streams/vCPU':>13}")
+        for mode, keyframes_only, every_nth in modes:
+            cpu, frames, decoded = run(data, keyframes_only, every_nth)
+            per_second = cpu / seconds
+            print(f"  {mode:<20} {frames:>7} {decoded:>8} {per_second * 1000:>13.1f} {1 / per_second:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+'''
+End-to-end throughput and per-stage latency of the stream processor pipeline
+(stream_processor/container/main.py) on local fixtures. FakeMediaSource replays GetMedia
+fragments carrying real H.264 (a synthetic 1280x720 15 fps clip with one keyframe per
+second, encoded with PyAV) and LocalS3 (10-20 ms per PUT) stores the JPEGs.
+
+- throughput: --streams streams x --fragments fragments, fed as fast as the pipeline
+  takes them; decode/encode inline on the event loop vs in 1 .. --workers worker
+  processes. Frames per second, and how late a 10 ms timer on the event loop fires
+  (p99), i.e. how long network I/O would have been stalled
+- realtime: --streams streams at one fragment per second for --seconds; per-stage p50 / p99
+- drain: stop the realtime run half-way, as on SIGTERM; every frame read must reach S3
+
+Needs PyAV, numpy and Pillow.
+
+Run from the repo root:
+    python benchmarks/bench_pipeline.py [--streams 16] [--fragments 10] [--workers N] [--seconds 20]
+'''
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import Executor, Future
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'stream_processor', 'container'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas')) # frame_keys and metrics, copied into the image by the Dockerfile
+sys.path.insert(0, HERE)
+
+import av
+
+import main as runtime
+from bench_mkv_decode import synthetic_clip
+from frame_sampler import MotionSampler
+from s3_uploader import S3Uploader
+from stubs import FakeMediaSource, LocalS3, mkv_fragment
+
+FPS = 15
+
+
+def fixtures(seconds=10):
+    # One fragment per second of the clip, each opening with its keyframe
+    data, _ = synthetic_clip(seconds=seconds, fps=FPS, gop=FPS)
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        codec_private = stream.codec_context.extradata
+        packets = [(packet.is_keyframe, bytes(packet)) for packet in container.demux(stream) if packet.size]
+    return [
+        mkv_fragment(FakeMediaSource.FIRST_FRAGMENT + index, timecode_ms=index * 1000, fps=FPS,
+                     payloads=packets[offset:offset + FPS], codec_private=codec_private)
+        for index, offset in enumerate(range(0, len(packets), FPS))
+    ]
+
+
+class InlineExecutor(Executor):
+    '''
+    Runs every call on the calling (event loop) thread: the pipeline without worker processes
+    '''
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class InlinePipeline(runtime.Pipeline):
+    async def start(self, stream_names=()):
+        runtime._sampler = MotionSampler(**self.sampler_settings)
+        await super().start(stream_names)
+        for shard in self._shards:
+            shard.shutdown()
+        self._shards[:] = [InlineExecutor()] * len(self._shards)
+
+
+async def loop_lag(lags, interval=0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0.0
+
+
+async def run(fragments, streams, fragments_per_stream, workers=1, inline=False, realtime=False, stop_after=None):
+    source = FakeMediaSource(fixtures=fragments, fragments_per_stream=fragments_per_stream, realtime=realtime)
+    s3 = LocalS3(latency=0.01, jitter=0.01)
+    uploader = S3Uploader('bench', s3=s3, workers=8, max_queued_per_camera=fragments_per_stream)
+    pipeline = (InlinePipeline if inline else runtime.Pipeline)(source, uploader, workers=workers)
+    lags = []
+    with contextlib.redirect_stdout(io.StringIO()): # stream disconnect / drain logs
+        await pipeline.start()
+        ticker = asyncio.ensure_future(loop_lag(lags))
+        started = time.perf_counter()
+        await pipeline.set_streams([f"cam{index}" for index in range(streams)])
+        expected = streams * fragments_per_stream # one keyframe per fragment
+        counts = pipeline.counts
+        while counts['forwarded'] + counts['skipped'] + counts['errors'] < expected:
+            if stop_after is not None and time.perf_counter() - started >= stop_after:
+                break
+            await asyncio.sleep(0.02)
+        await pipeline.drain(timeout=60)
+        elapsed = time.perf_counter() - started
+        ticker.cancel()
+    return pipeline, s3, elapsed, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=16)
+    parser.add_argument('--fragments', type=int, default=10, help="Fragments (seconds of video) per stream")
+    parser.add_argument('--workers', type=int, default=len(os.sched_getaffinity(0)), help="Most worker processes to try")
+    parser.add_argument('--seconds', type=float, default=20.0, help="Length of the realtime run")
+    args = parser.parse_args()
+
+    fragments = fixtures()
+    print(f"{os.cpu_count()} CPUs, {args.streams} streams x {args.fragments} keyframes")
+    print(f"  {'mode':<14} {'frames/s':>9} {'loop lag p99 ms':>16} {'stored':>7}")
+    modes = [('inline', 1, True)] + [(f"{n} workers", n, False) for n in sorted({1, 2, args.workers}) if n <= args.workers]
+    for name, workers, inline in modes:
+        pipeline, s3, elapsed, lags = asyncio.run(run(fragments, args.streams, args.fragments, workers, inline))
+        print(f"  {name:<14} {len(s3.objects) / elapsed:>9.1f} {percentile(lags, 99) * 1000:>16.1f} {len(s3.objects):>7}")
+
+    seconds = int(args.seconds)
+    pipeline, s3, elapsed, lags = asyncio.run(run(fragments, args.streams, seconds, args.workers, realtime=True))
+    print(f"realtime, {args.streams} streams at 1 keyframe/s for {seconds} s, {args.workers} workers:")
+    print(f"  {'stage':<8} {'frames':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for name, stage in pipeline.stats()['stages'].items():
+        p50, p99 = (f"{value * 1000:.0f}" if value is not None else '-' for value in (stage['p50'], stage['p99']))
+        print(f"  {name:<8} {stage['count']:>7} {p50:>7} {p99:>7}")
+
+    pipeline, s3, _, _ = asyncio.run(run(fragments, args.streams, seconds, args.workers, realtime=True,
+                                         stop_after=seconds / 2))
+    counts = pipeline.counts
+    print(f"drain half-way through a realtime run: {counts['frames']} frames read, "
+          f"{counts['forwarded'] + counts['skipped']} decoded, {counts['forwarded']} forwarded, "
+          f"{len(s3.objects)} stored, {counts['errors']} errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Bytes per stored result and reader parse time: the old {'HeadCoverings', 'FullResponse'}
+object against the compact ppe_summary format (plus its optional gzip sidecar).
+
+Uses synthetic Rekognition responses shaped like detect_protective_equipment output.
+
+Run from the repo root:
+    python benchmarks/bench_result_format.py
+'''
+
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from ppe_summary import summarize, dumps_compact, compress_full_response, extract_equipment
+
+BODY_PARTS = (('FACE', 'FACE_COVER'), ('LEFT_HAND', 'HAND_COVER'), ('RIGHT_HAND', 'HAND_COVER'), ('HEAD', 'HEAD_COVER'))
+
+
+def _box(rng):
+    return {'Width': rng.random() / 4, 'Height': rng.random() / 4, 'Left': rng.random() / 2, 'Top': rng.random() / 2}
+
+
+def synthetic_response(person_count, rng):
+    persons = []
+    for person_id in range(person_count):
+        body_parts = []
+        for name, equipment_type in BODY_PARTS:
+            detections = []
+            if rng.random() < 0.7:
+                detections.append({
+                    'BoundingBox': _box(rng),
+                    'Confidence': 90 + rng.random() * 10,
+                    'Type': equipment_type,
+                    'CoversBodyPart': {'Confidence': 90 + rng.random() * 10, 'Value': rng.random() < 0.9}
+                })
+            body_parts.append({'Name': name, 'Confidence': 90 + rng.random() * 10, 'EquipmentDetections': detections})
+        persons.append({'BodyParts': body_parts, 'BoundingBox': _box(rng), 'Confidence': 90 + rng.random() * 10, 'Id': person_id})
+    return {
+        'ProtectiveEquipmentModelVersion': '1.0',
+        'Persons': persons,
+        'Summary': {'PersonsWithRequiredEquipment': [0], 'PersonsWithoutRequiredEquipment': [], 'PersonsIndeterminate': []},
+        'ResponseMetadata': {'RequestId': 'bench', 'HTTPStatusCode': 200, 'HTTPHeaders': {'content-type': 'application/x-amz-json-1.1'}, 'RetryAttempts': 0}
+    }
+
+
+def legacy_result(rek_response):
+    head_coverings = [
+        {'Type': item['Type'], 'Confidence': item['Confidence'], 'BoundingBox': item['BoundingBox']}
+        for item in extract_equipment(rek_response, ('HEAD_COVER',))
+    ]
+    return json.dumps({'HeadCoverings': head_coverings, 'FullResponse': rek_response})
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'persons':>8} {'legacy B':>9} {'compact B':>10} {'sidecar gz B':>13} {'legacy parse':>13} {'compact parse':>14}")
+    for person_count in (1, 5, 20):
+        rek_response = synthetic_response(person_count, rng)
+        legacy = legacy_result(rek_response)
+        compact = dumps_compact(summarize(rek_response, 'cam-1'))
+        sidecar = compress_full_response(rek_response)
+        legacy_parse = min(timeit.repeat(lambda: json.loads(legacy), number=2000, repeat=5)) / 2000 * 1e6
+        compact_parse = min(timeit.repeat(lambda: json.loads(compact), number=2000, repeat=5)) / 2000 * 1e6
+        print(f"{person_count:>8} {len(legacy):>9} {len(compact):>10} {len(sidecar):>13}"
+              f" {legacy_parse:>10.1f} us {compact_parse:>11.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+'''
+History queries through getAllRekognitionResult_TF against three layouts of the same
+results in LocalS3 (--cameras cameras x --hours hours x --per-hour results):
+
+- flat: rekognition_results/{uuid}.json, read with ?layout=flat (list the whole prefix,
+  filter on LastModified, GET every result in the window, camera filter on the body)
+- partitioned: camera=/date=/hour= keys (result_layout.py), nothing compacted yet
+- compacted: the same after compactRekognitionResults_TF rolled every hour up
+
+Queries, paged with limit=1000 until the cursor runs out:
+- one camera, 6 hours
+- every camera, 1 hour
+- one camera, 15 minutes inside one hour (rollups over 32 KiB are read through their
+  footer index: tail + matching blocks; e.g. --per-hour 3600 for 1 result per second)
+
+Reported per query: LIST and GET requests, bytes returned by GETs, results, and the time at
+--latency seconds per request. The compaction run itself is reported too.
+
+Needs botocore installed (imported by lambdas/aws_clients.py).
+
+Run from the repo root:
+    python benchmarks/bench_result_layout.py [--cameras 10] [--hours 24] [--per-hour 120]
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas'))
+sys.path.insert(0, HERE)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['BUCKET_NAME'] = 'bench-bucket'
+
+import compactRekognitionResults_TF as compaction
+import getAllRekognitionResult_TF as get_all
+from aws_clients import set_client
+from ppe_summary import dumps_compact, summarize
+from result_layout import result_key
+from results_index import RESULTS_PREFIX
+from stubs import LocalRekognition, LocalS3
+
+BUCKET = 'bench-bucket'
+START = datetime(2025, 8, 11, tzinfo=timezone.utc).timestamp()
+
+
+def populate(s3, cameras, hours, per_hour, flat):
+    response = LocalRekognition(latency=0, jitter=0, tps=1e9).detect_protective_equipment(Image={'Bytes': b''})
+    for camera in range(cameras):
+        camera_id = f"cam-{camera:03d}"
+        body = dumps_compact(summarize(response, camera_id, ['HEAD_COVER']))
+        for index in range(hours * per_hour):
+            when = START + index * 3600 / per_hour + camera # cameras slightly out of step
+            key = f"{RESULTS_PREFIX}{uuid.uuid4()}.json" if flat else result_key(camera_id, when)
+            s3.put_object(Bucket=BUCKET, Key=key, Body=body, ContentType='application/json')
+            s3.objects[(BUCKET, key)]['LastModified'] = datetime.fromtimestamp(when, tz=timezone.utc)
+
+
+def iso(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def query(s3, params):
+    # Follows X-Continuation-Token to the end; returns the number of results
+    s3.calls.clear()
+    s3.bytes_out = 0
+    params = dict(params, limit='1000')
+    results = 0
+    while True:
+        response = get_all.lambda_handler({'queryStringParameters': params}, None)
+        if response['statusCode'] != 200:
+            return results
+        results += len(json.loads(response['body']))
+        token = response['headers'].get('X-Continuation-Token')
+        if not token:
+            return results
+        params['continuation_token'] = token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=10)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--per-hour', type=int, default=120, help="Results per camera per hour")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds per S3 request, for the time column")
+    args = parser.parse_args()
+
+    queries = (
+        ('1 camera, 6 h', {'cameraId': 'cam-001', 'since': iso(START + 6 * 3600), 'until': iso(START + 12 * 3600 - 1)}),
+        ('all cameras, 1 h', {'since': iso(START + 3 * 3600), 'until': iso(START + 4 * 3600 - 1)}),
+        ('1 camera, 15 min', {'cameraId': 'cam-001', 'since': iso(START + 7 * 3600 + 1200),
+                              'until': iso(START + 7 * 3600 + 2100)})
+    )
+    total = args.cameras * args.hours * args.per_hour
+    print(f"{total} results: {args.cameras} cameras x {args.hours} h x {args.per_hour}/h, "
+          f"time at {args.latency * 1000:.0f} ms per S3 request (GETs {get_all.MAX_WORKERS} at a time)")
+
+    stores = {}
+    for layout in ('flat', 'partitioned'):
+        s3 = LocalS3()
+        populate(s3, args.cameras, args.hours, args.per_hour, flat=layout == 'flat')
+        stores[layout] = s3
+
+    s3 = LocalS3()
+    s3.objects = dict(stores['partitioned'].objects)
+    size_before = sum(len(obj['Body']) for obj in s3.objects.values())
+    count_before = len(s3.objects)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # One scheduled run is capped at MAX_OBJECTS_PER_RUN; keep going like later runs would
+        runs = compacted = partitions = 0
+        while True:
+            stats = compaction.compact(s3, BUCKET, now=START + (args.hours + 1) * 3600)
+            runs, compacted, partitions = runs + 1, compacted + stats['compacted'], partitions + stats['partitions']
+            if not stats['compacted']:
+                break
+    elapsed = time.perf_counter() - started
+    print(f"compaction: {compacted} results into {partitions} rollups, {runs} runs, {elapsed:.1f} s "
+          f"(CPU, no latency); {dict(s3.calls)}")
+    print(f"  objects {count_before} -> {len(s3.objects)}, "
+          f"stored bytes {size_before / 1e6:.2f} MB -> {sum(len(obj['Body']) for obj in s3.objects.values()) / 1e6:.2f} MB")
+    stores['compacted'] = s3
+
+    print(f"  {'query':<18} {'layout':<12} {'LIST':>5} {'GET':>7} {'GET bytes':>10} {'results':>8} {'est. s':>7}")
+    for name, params in queries:
+        for layout, s3 in stores.items():
+            set_client('s3', s3)
+            with contextlib.redirect_stdout(io.StringIO()): # EMF lines
+                results = query(s3, dict(params, layout='flat') if layout == 'flat' else params)
+            lists, gets = s3.calls['list_objects_v2'], s3.calls['get_object']
+            estimate = (lists + gets / get_all.MAX_WORKERS) * args.latency
+            print(f"  {name:<18} {layout:<12} {lists:>5} {gets:>7} {s3.bytes_out:>10} {results:>8} {estimate:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''
+Upload throughput and latency of the stream processor's S3 uploader
+(stream_processor/container/s3_uploader.py) against the LocalS3 stand-in with a 10-30 ms
+PUT round trip and 2% injected SlowDown errors.
+
+- throughput: 50 cameras x 20 frames (80 KB) submitted at once; sequential put_object
+  vs the uploader with 1 / 8 / 32 workers; frames per second and p50 / p99 latency
+- paced: 50 cameras at 4 fps for 10 s through 8 workers; p99 latency and drops
+- brown-out: 50% of PUTs fail; S3 calls with the retry budget vs with unlimited retries
+
+Run from the repo root:
+    python benchmarks/bench_s3_uploader.py
+'''
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'stream_processor', 'container'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas')) # frame_keys and metrics, copied into the image by the Dockerfile
+sys.path.insert(0, HERE)
+
+from s3_uploader import RetryBudget, S3Uploader
+from frame_keys import build_frame_key
+from stubs import LocalS3
+
+CAMERAS = 50
+FRAMES_PER_CAMERA = 20
+FRAME = b'\xff\xd8' + os.urandom(80 * 1024) + b'\xff\xd9'
+START = 1700000000.0
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def local_s3(failure_rate=0.02):
+    return LocalS3(latency=0.01, jitter=0.02, failure_rate=failure_rate, seed=7)
+
+
+def sequential(frames_per_camera):
+    s3 = local_s3()
+    latencies = []
+    started = time.perf_counter()
+    for index in range(frames_per_camera):
+        for camera in range(CAMERAS):
+            try:
+                s3.put_object(Bucket='bench', Key=build_frame_key(f"cam{camera}", START + index), Body=FRAME)
+            except ConnectionError:
+                pass # the old code path simply lost the frame
+            latencies.append(time.perf_counter() - started) # every frame was queued at t=0
+    elapsed = time.perf_counter() - started
+    return CAMERAS * frames_per_camera / elapsed, percentile(latencies, 50), percentile(latencies, 99), s3
+
+
+def at_once(workers, frames_per_camera, failure_rate=0.02, budget=None):
+    s3 = local_s3(failure_rate)
+    uploader = S3Uploader('bench', s3=s3, workers=workers, max_queued_per_camera=frames_per_camera,
+                          retry_budget=budget)
+    started = time.perf_counter()
+    for index in range(frames_per_camera):
+        for camera in range(CAMERAS):
+            uploader.submit(f"cam{camera}", FRAME, START + index / 4)
+    uploader.close()
+    elapsed = time.perf_counter() - started
+    return uploader, s3, uploader.stats['uploaded'] / elapsed
+
+
+def paced(workers, fps, seconds):
+    uploader = S3Uploader('bench', s3=local_s3(), workers=workers, max_queued_per_camera=8)
+    started = time.perf_counter()
+    for tick in range(int(fps * seconds)):
+        for camera in range(CAMERAS):
+            uploader.submit(f"cam{camera}", FRAME, START + tick / fps)
+        time.sleep(max(0.0, started + (tick + 1) / fps - time.perf_counter()))
+    uploader.close()
+    return uploader
+
+
+def main():
+    print("throughput (1000 frames queued at once):")
+    print(f"  {'uploader':<20} {'frames/s':>9} {'p50 s':>7} {'p99 s':>7} {'failed':>7}")
+    rate, p50, p99, s3 = sequential(FRAMES_PER_CAMERA)
+    print(f"  {'sequential put':<20} {rate:>9.0f} {p50:>7.2f} {p99:>7.2f} {s3.calls['put_object'] - len(s3.objects):>7}")
+    for workers in (1, 8, 32):
+        with contextlib.redirect_stdout(io.StringIO()): # the uploader logs every give-up
+            uploader, _, rate = at_once(workers, FRAMES_PER_CAMERA)
+        print(f"  {f'{workers} workers':<20} {rate:>9.0f} {uploader.latency_percentile(50):>7.2f} "
+              f"{uploader.latency_percentile(99):>7.2f} {uploader.stats['failed']:>7}")
+
+    uploader = paced(8, fps=4, seconds=10)
+    print(f"paced 50 cameras x 4 fps, 8 workers: p50 {uploader.latency_percentile(50) * 1000:.0f} ms, "
+          f"p99 {uploader.latency_percentile(99) * 1000:.0f} ms, dropped {uploader.stats['dropped']}")
+
+    print("brown-out (50% of PUTs fail), 8 workers, 1000 frames:")
+    for name, budget in (('retry budget', None), ('unlimited retries', RetryBudget(ratio=1e9, max_tokens=1e9))):
+        with contextlib.redirect_stdout(io.StringIO()):
+            uploader, s3, _ = at_once(8, FRAMES_PER_CAMERA, failure_rate=0.5, budget=budget)
+        print(f"  {name:<18} {s3.calls['put_object']:>5} PUT calls, {uploader.stats['retries']:>5} retries, "
+              f"{uploader.stats['uploaded']:>5} stored, {uploader.stats['budget_exhausted']:>5} dropped by budget")
+
+
+if __name__ == '__main__':
+    main()
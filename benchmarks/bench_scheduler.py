@@ -0,0 +1,140 @@
+'''
+Simulates the lease scheduler (stream_processor/container/scheduler.py) on the local DynamoDB
+stand-in at 100, 1,000 and 10,000 streams, with enough 50-stream tasks for 80% utilisation.
+
+Time is simulated: every task ticks once per --interval seconds. For each size it reports
+- cold start: seconds until every stream is leased, DynamoDB calls and CPU per task tick
+- onboarding: seconds until 1% newly created streams are claimed
+- steady state: DynamoDB calls and CPU per task tick once nothing changes
+- scale out (one task joins) and task loss (one task stops without releasing): streams
+  that changed owner vs the new task's fair share / the lost task's streams, compared
+  with modulo hashing, and seconds to converge
+and checks after every round that no stream is held by two tasks.
+
+Run from the repo root:
+    python benchmarks/bench_scheduler.py [--streams 100 1000 10000] [--interval 5] [--ttl 15]
+'''
+
+import argparse
+import math
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'stream_processor', 'container'))
+sys.path.insert(0, HERE)
+
+import scheduler as scheduler_module
+from scheduler import Scheduler, _hash
+from stubs import LocalDynamoDB
+
+CAPACITY = 50
+
+
+class Simulation:
+    def __init__(self, streams, tasks, interval, ttl):
+        self.now = 0.0
+        self.interval = interval
+        self.ttl = ttl
+        self.streams = [f"camera-{i:05d}" for i in range(streams)]
+        self.dynamodb = LocalDynamoDB({
+            scheduler_module.LEASES_TABLE: ['streamName'],
+            scheduler_module.CAMERA_STREAMS_TABLE: ['instanceId', 'streamName'],
+            scheduler_module.FREE_STREAMS_TABLE: ['instanceId', 'freeStreams'],
+        })
+        self.tasks = {}
+        self.ticks = 0
+        self.cpu = 0.0
+        for _ in range(tasks):
+            self.add_task()
+
+    def add_task(self):
+        name = f"task-{len(self.tasks) + 1:04d}-{int(self.now)}"
+        self.tasks[name] = Scheduler(name, self.dynamodb, lambda: self.streams, capacity=CAPACITY,
+                                     lease_ttl=self.ttl, clock=lambda: self.now)
+        return name
+
+    def owners(self):
+        owners = {}
+        for name, task in self.tasks.items():
+            for stream in task.held:
+                assert stream not in owners, f"{stream} held by {owners[stream]} and {name}"
+                owners[stream] = name
+        return owners
+
+    def round(self):
+        started = time.process_time()
+        for task in self.tasks.values():
+            task.tick()
+            self.ticks += 1
+        self.cpu += time.process_time() - started
+        self.now += self.interval
+        return self.owners()
+
+    def until(self, done, limit=100):
+        # Runs rounds until done(owners) holds; returns simulated seconds taken
+        started = self.now
+        for _ in range(limit):
+            if done(self.round()):
+                return self.now - started
+        raise RuntimeError("did not converge")
+
+
+def modulo_churn(streams, before, after):
+    return sum(_hash(s) % before != _hash(s) % after for s in streams) / len(streams)
+
+
+def run(streams, interval, ttl):
+    tasks = math.ceil(streams / (CAPACITY * 0.8))
+    sim = Simulation(streams, tasks, interval, ttl)
+    everything = lambda owners: len(owners) == len(sim.streams)
+
+    cold = sim.until(everything)
+    calls = sum(sim.dynamodb.calls.values())
+    print(f"{streams} streams, {tasks} tasks x {CAPACITY}")
+    print(f"  cold start:  all leased after {cold:.0f} s, {calls / sim.ticks:.1f} DynamoDB calls "
+          f"and {sim.cpu / sim.ticks * 1000:.2f} ms CPU per task tick")
+    calls, ticks, cpu = sum(sim.dynamodb.calls.values()), sim.ticks, sim.cpu
+    for _ in range(3):
+        sim.round()
+    print(f"  steady:      {(sum(sim.dynamodb.calls.values()) - calls) / (sim.ticks - ticks):.1f} DynamoDB calls "
+          f"and {(sim.cpu - cpu) / (sim.ticks - ticks) * 1000:.2f} ms CPU per task tick")
+
+    new = [f"new-{i:05d}" for i in range(max(1, streams // 100))]
+    sim.streams.extend(new)
+    onboarding = sim.until(everything)
+    print(f"  onboarding:  {len(new)} new streams claimed after {onboarding:.0f} s")
+
+    before = sim.owners()
+    sim.add_task()
+    rebalance = sim.until(lambda owners: everything(owners) and all(
+        len(task.held) == len(task._desired) for task in sim.tasks.values()
+    ))
+    moved = sum(before[s] != owner for s, owner in sim.owners().items())
+    fair_share = len(sim.streams) / len(sim.tasks)
+    print(f"  scale out:   {moved} streams moved ({moved / len(sim.streams):.1%}; fair share {fair_share:.0f}, "
+          f"modulo hashing {modulo_churn(sim.streams, tasks, tasks + 1):.0%}), converged after {rebalance:.0f} s")
+
+    before = sim.owners()
+    victim = next(iter(sim.tasks))
+    lost = sum(owner == victim for owner in before.values())
+    del sim.tasks[victim] # stops ticking without releasing anything
+    recovery = sim.until(everything)
+    moved = sum(before[s] != owner for s, owner in sim.owners().items())
+    print(f"  task loss:   {moved} streams moved (lost task held {lost}, modulo hashing "
+          f"{modulo_churn(sim.streams, tasks + 1, tasks):.0%}), all re-leased after {recovery:.0f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between scheduler ticks")
+    parser.add_argument('--ttl', type=float, default=15.0, help="Lease TTL in seconds")
+    args = parser.parse_args()
+    for streams in args.streams:
+        run(streams, args.interval, args.ttl)
+
+
+if __name__ == '__main__':
+    main()
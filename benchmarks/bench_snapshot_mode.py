@@ -0,0 +1,218 @@
+'''
+Upload bandwidth and CPU per camera of the Pi CLI's snapshot mode
+(raspberrypi-cli/camera_control/snapshot_uploader.py, snapshot_mode in pipeline_builder)
+against full streaming, on a synthetic --width x --height @ --fps scene (PyAV + Pillow
+stand in for the GStreamer elements the pipelines use):
+
+- stream, x264: jpegdec + x264enc superfast zerolatency at --bitrate (the x264 profile)
+- stream, passthrough: the camera's own H.264 goes up as-is (nothing to encode)
+- snapshots, MJPEG camera: one of the camera's JPEGs every --interval s, through the
+  spool and SnapshotUploader to LocalS3 (no decode, no encode)
+- snapshots, H.264 camera: every frame decoded, one JPEG encoded every --interval s
+'tee' costs what its stream row plus its snapshot row cost.
+
+CPU is measured on this machine, not on a Pi, so compare rows rather than reading the
+numbers as Pi load. Then a network drop: --outage s without S3 at 1 snapshot/s with a
+--max-files queue; every uploaded key is checked with lambdas/frame_keys.parse_frame_key.
+
+Needs PyAV, numpy, Pillow and boto3 (imported by camera_control).
+
+Run from the repo root:
+    python benchmarks/bench_snapshot_mode.py [--seconds 20] [--interval 5] [--outage 300]
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from fractions import Fraction
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'raspberrypi-cli'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas'))
+sys.path.insert(0, HERE)
+
+import av
+import numpy as np
+from PIL import Image
+
+from camera_control.snapshot_uploader import SnapshotUploader
+from frame_keys import parse_frame_key
+from stubs import LocalS3
+
+BUCKET = 'bench-bucket'
+
+
+def scene(seconds, fps, width, height, seed=3):
+    # Textured background, sensor noise and a moving block, as RGB frames
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    background = np.kron(background, np.ones((16, 16, 1), dtype=np.uint8))
+    for index in range(int(seconds * fps)):
+        frame = background + rng.integers(0, 6, background.shape, dtype=np.uint8)
+        x = (index * 12) % (width - 200)
+        frame[height // 4:height // 4 + 200, x:x + 200] = 30
+        yield frame
+
+
+def camera_jpegs(frames):
+    # What an MJPEG USB camera hands to v4l2src
+    jpegs = []
+    for frame in frames:
+        buffer = io.BytesIO()
+        Image.fromarray(frame).save(buffer, format='JPEG', quality=85)
+        jpegs.append(buffer.getvalue())
+    return jpegs
+
+
+def h264_encoder(args, preset, bitrate):
+    buffer = io.BytesIO()
+    container = av.open(buffer, 'w', format='h264')
+    stream = container.add_stream('libx264', rate=args.fps)
+    stream.width, stream.height, stream.pix_fmt = args.width, args.height, 'yuv420p'
+    stream.bit_rate = bitrate * 1000
+    stream.options = {'preset': preset, 'tune': 'zerolatency', 'g': str(args.fps * 2), 'bf': '0'}
+    return buffer, container, stream
+
+
+def stream_x264(args, jpegs):
+    # jpegdec ! videoconvert ! x264enc: CPU seconds, bytes sent
+    buffer, container, stream = h264_encoder(args, 'superfast', args.bitrate)
+    started = time.process_time()
+    for jpeg in jpegs:
+        frame = av.VideoFrame.from_image(Image.open(io.BytesIO(jpeg)))
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    cpu = time.process_time() - started
+    container.close()
+    return cpu, len(buffer.getvalue())
+
+
+def camera_h264(args, frames):
+    # What an H.264 camera sends (encoded outside the timing: the camera does it)
+    buffer, container, stream = h264_encoder(args, 'veryfast', args.bitrate)
+    for frame in frames:
+        for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format='rgb24')):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+    return buffer.getvalue()
+
+
+def snapshots_through_spool(jpegs_to_write, args, spool):
+    # multifilesink writes, SnapshotUploader ingests and uploads: CPU seconds, bytes, keys
+    s3 = LocalS3()
+    uploader = SnapshotUploader('site-a-cam-0', spool, bucket=BUCKET, s3=s3)
+    started = time.process_time()
+    now = time.time()
+    for index, jpeg in enumerate(jpegs_to_write):
+        path = os.path.join(uploader.incoming, f"snapshot-{index:06d}.jpg")
+        with open(path, 'wb') as f:
+            f.write(jpeg)
+        taken = now - 10 + index * args.interval / 1000 # settled, distinct
+        os.utime(path, (taken, taken))
+    with contextlib.redirect_stdout(io.StringIO()):
+        uploader.run_once()
+    return time.process_time() - started, uploader.stats['bytes'], [key for _, key in s3.objects]
+
+
+def every(items, fps, interval):
+    # videorate drop-only to 1/interval
+    step = max(1, int(Fraction(fps) * Fraction(interval).limit_denominator(1000)))
+    return items[::step]
+
+
+def outage(args, spool):
+    class FlakyS3(LocalS3):
+        down = False
+
+        def put_object(self, **kwargs):
+            if self.down:
+                self.calls['failed'] += 1
+                raise ConnectionError("Could not connect to the endpoint URL")
+            return super().put_object(**kwargs)
+
+    s3 = FlakyS3()
+    uploader = SnapshotUploader('site-a-cam-0', spool, bucket=BUCKET, s3=s3, max_files=args.max_files,
+                                poll_seconds=0.001, backoff_max=0.001)
+    total = args.outage * 3
+    start = time.time() - total - 10
+    jpeg = b'\xff\xd8' + b'\x00' * 40000 + b'\xff\xd9'
+    with contextlib.redirect_stdout(io.StringIO()):
+        for second in range(total):
+            s3.down = args.outage <= second < 2 * args.outage
+            path = os.path.join(uploader.incoming, f"snapshot-{second:06d}.jpg")
+            with open(path, 'wb') as f:
+                f.write(jpeg)
+            os.utime(path, (start + second, start + second))
+            time.sleep(0.002) # let the backoff run out, as a second of real time would
+            uploader.run_once()
+    keys = sorted(key for _, key in s3.objects)
+    for key in keys:
+        parse_frame_key(key)
+    in_order = keys == [key for _, key in s3.objects] # uploaded oldest first
+    print(f"outage: {total} snapshots at 1/s, S3 down for {args.outage} s, queue bound {args.max_files} files")
+    print(f"  uploaded {uploader.stats['uploaded']}, dropped (oldest) {uploader.stats['dropped']}, "
+          f"failed attempts {uploader.stats['failures']}, left queued {len(uploader.queued())}, "
+          f"keys valid for frameEnqueue_TF and in capture order: {in_order}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--bitrate', type=int, default=1000, help="kbit/s, the 'default' preset")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between snapshots")
+    parser.add_argument('--outage', type=int, default=300, help="Seconds S3 is unreachable")
+    parser.add_argument('--max-files', type=int, default=200, help="Snapshot queue bound for the outage run")
+    args = parser.parse_args()
+
+    frames = list(scene(args.seconds, args.fps, args.width, args.height))
+    jpegs = camera_jpegs(frames)
+    h264 = camera_h264(args, frames)
+    spool = tempfile.mkdtemp(prefix='bench-snapshots-')
+
+    rows = []
+    cpu, sent = stream_x264(args, jpegs)
+    rows.append(('stream, x264', cpu, sent))
+    rows.append(('stream, passthrough', 0.0, len(h264))) # h264parse ! kvssink: no transcoding
+
+    cpu, sent, keys = snapshots_through_spool(every(jpegs, args.fps, args.interval), args, os.path.join(spool, 'mjpeg'))
+    rows.append(('snapshots, MJPEG cam', cpu, sent))
+
+    started = time.process_time()
+    picked = []
+    with av.open(io.BytesIO(h264), format='h264') as container:
+        for index, frame in enumerate(container.decode(video=0)): # avdec_h264 decodes every frame
+            if index % max(1, int(args.fps * args.interval)) == 0:
+                buffer = io.BytesIO()
+                frame.to_image().save(buffer, format='JPEG', quality=85) # jpegenc
+                picked.append(buffer.getvalue())
+    decode_cpu = time.process_time() - started
+    cpu, sent, _ = snapshots_through_spool(picked, args, os.path.join(spool, 'h264'))
+    rows.append(('snapshots, H.264 cam', decode_cpu + cpu, sent))
+
+    print(f"{args.seconds:.0f} s of {args.width}x{args.height}@{args.fps}, stream at {args.bitrate} kbit/s, "
+          f"one snapshot every {args.interval:g} s")
+    print(f"  {'mode':<22} {'upload kbit/s':>13} {'MB/day':>8} {'cpu % of a core':>16}")
+    for name, cpu, sent in rows:
+        rate = sent * 8 / args.seconds / 1000
+        print(f"  {name:<22} {rate:>13.1f} {sent / args.seconds * 86400 / 1e6:>8.0f} {cpu / args.seconds * 100:>16.2f}")
+    for key in keys:
+        parse_frame_key(key)
+
+    outage(args, os.path.join(spool, 'outage'))
+    shutil.rmtree(spool, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
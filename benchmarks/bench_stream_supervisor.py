@@ -0,0 +1,136 @@
+'''
+The Pi CLI's multi-camera supervisor (raspberrypi-cli/camera_control/stream_supervisor.py,
+raspi_cli.py start_all) running fake_gst_launch.py pipelines instead of gst-launch-1.0.
+
+- fleet: --cameras pipelines for --seconds, each keeping --load of a core busy; every third
+  one crashes --crash-after seconds into each run. Supervised (restart with backoff) vs
+  unsupervised (start_stream today: the pipeline runs once and nobody restarts it).
+  Per pipeline: restarts, availability (share of the run it was streaming), the CPU the
+  supervisor reports against the load the fake was told to burn, and the core it is
+  pinned to, read back from /proc/<pid>/status
+- backoff: a pipeline that dies right away; delays between its restarts
+- stop: SIGINT to every pipeline, one of them ignoring it; time until all are gone
+
+Needs boto3 installed (imported by camera_control). Linux only (/proc, sched_setaffinity).
+
+Run from the repo root:
+    python benchmarks/bench_stream_supervisor.py [--cameras 6] [--seconds 15] [--load 0.1]
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = tempfile.mkdtemp(prefix='bench-supervisor-') # the fake pipelines' output
+sys.path.insert(0, os.path.join(HERE, '..', 'raspberrypi-cli'))
+os.environ['GST_LAUNCH'] = os.path.join(HERE, 'fake_gst_launch.py') # read when start_cam_stream is imported
+
+from camera_control.start_cam_stream import build_command
+from camera_control.stream_supervisor import StreamSupervisor, available_cores
+
+
+def commands(cameras):
+    return {
+        f"cam-{index}": build_command({'stream_name': f"stream-{index}", 'aws_region': 'us-east-1',
+                                       'connection_type': 'v4l2', 'device': f"/dev/video{index}"})
+        for index in range(cameras)
+    }
+
+
+def pinned_cores(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('Cpus_allowed_list:'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return '-'
+
+
+def supervise(supervisor, seconds, poll=0.05):
+    # run() without the signal handling; returns {name: [(re)start times]} and the final stats
+    starts = {pipeline.name: [] for pipeline in supervisor.pipelines}
+    began = time.monotonic()
+    supervisor.start()
+    affinity = {pipeline.name: pinned_cores(pipeline.process.pid) for pipeline in supervisor.pipelines if pipeline.running()}
+    seen = {}
+    supervisor.stats() # first CPU sample
+    while time.monotonic() - began < seconds:
+        supervisor.check()
+        for pipeline in supervisor.pipelines:
+            if pipeline.started_at is not None and seen.get(pipeline.name) != pipeline.started_at:
+                seen[pipeline.name] = pipeline.started_at
+                starts[pipeline.name].append(pipeline.started_at - began)
+        time.sleep(poll)
+    return starts, affinity, supervisor.stats()
+
+
+def fleet(args):
+    os.environ['FAKE_GST_LOAD'] = str(args.load)
+    os.environ['FAKE_GST_CRASH'] = ','.join(f"stream-{index}:{args.crash_after}" for index in range(0, args.cameras, 3))
+    print(f"fleet: {args.cameras} pipelines, {args.seconds:.0f} s, {args.load * 100:.0f}% of a core each, "
+          f"every third crashing after {args.crash_after:.0f} s; cores {available_cores()}")
+    print(f"  {'mode':<13} {'camera':<7} {'core':>4} {'pinned':>7} {'restarts':>8} {'avail %':>8} {'cpu %':>6} {'cpu s':>6}")
+    for mode, backoff in (('unsupervised', 1e9), ('supervised', 0.5)):
+        supervisor = StreamSupervisor(commands(args.cameras), backoff_initial=backoff, backoff_max=max(backoff, 4.0),
+                                      stable_seconds=5.0, report_seconds=0, stop_timeout=2.0, log_dir=LOG_DIR)
+        with contextlib.redirect_stdout(io.StringIO()):
+            launched = time.perf_counter()
+            _, affinity, rows = supervise(supervisor, args.seconds)
+            supervisor.stop()
+        for row in rows:
+            # One stats() sample at the start and one at the end: cpu % is over the whole run
+            print(f"  {mode:<13} {row['name']:<7} {row['core']:>4} {affinity.get(row['name'], '-'):>7} "
+                  f"{row['restarts']:>8} {row['uptime_total'] / args.seconds * 100:>8.0f} "
+                  f"{row['cpu_percent']:>6.1f} {row['cpu_seconds']:>6.2f}")
+        print(f"  {mode}: {time.perf_counter() - launched:.1f} s including stop")
+
+
+def backoff():
+    os.environ['FAKE_GST_CRASH'] = '*:0'
+    supervisor = StreamSupervisor(commands(1), backoff_initial=0.5, backoff_max=4.0, stable_seconds=5.0,
+                                  report_seconds=0, stop_timeout=2.0, log_dir=LOG_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        starts, _, _ = supervise(supervisor, 12)
+        supervisor.stop()
+    times = starts['cam-0']
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    print(f"backoff: pipeline crashing on start, 0.5 s initial, 4 s cap: {len(times) - 1} restarts in 12 s, "
+          f"gaps {' '.join(f'{gap:.1f}' for gap in gaps)} s")
+
+
+def stop(cameras):
+    os.environ['FAKE_GST_CRASH'] = ''
+    os.environ['FAKE_GST_IGNORE_SIGINT'] = 'stream-0'
+    supervisor = StreamSupervisor(commands(cameras), report_seconds=0, stop_timeout=2.0, log_dir=LOG_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        supervise(supervisor, 1)
+        started = time.perf_counter()
+        supervisor.stop()
+    left = sum(1 for pipeline in supervisor.pipelines if pipeline.running())
+    print(f"stop: {cameras} pipelines, 1 ignoring SIGINT, 2 s stop timeout: all stopped in "
+          f"{time.perf_counter() - started:.1f} s, {left} left running")
+    del os.environ['FAKE_GST_IGNORE_SIGINT']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=6)
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--load', type=float, default=0.1, help="Share of a core each fake pipeline burns")
+    parser.add_argument('--crash-after', type=float, default=3.0, help="Seconds before a crashing pipeline dies")
+    args = parser.parse_args()
+
+    fleet(args)
+    backoff()
+    stop(args.cameras)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+'''
+Stand-in for gst-launch-1.0, so the Pi CLI's pipeline supervisor
+(raspberrypi-cli/camera_control/stream_supervisor.py) can be run without GStreamer or
+cameras:
+    GST_LAUNCH=benchmarks/fake_gst_launch.py python raspberrypi-cli/raspi_cli.py start_all --no_provision
+
+Takes the same arguments as gst-launch-1.0 and finds the stream-name=... element property;
+how the "pipeline" behaves is set through the environment:
+- FAKE_GST_LOAD: fraction of one core to keep busy (default 0.1), like an encoder would
+- FAKE_GST_CRASH: comma separated stream:seconds; that stream's pipeline exits with code 1
+  after that many seconds (* matches every stream)
+- FAKE_GST_IGNORE_SIGINT: stream names (comma separated, or *) that ignore SIGINT, like a
+  wedged pipeline
+
+SIGINT / SIGTERM otherwise stop it with exit code 0, as gst-launch does.
+'''
+
+import os
+import signal
+import sys
+import time
+
+TICK = 0.05 # seconds per busy/idle cycle
+
+
+def _matches(setting, stream_name):
+    names = [name.strip() for name in setting.split(',') if name.strip()]
+    return '*' in names or stream_name in names
+
+
+def crash_after(setting, stream_name):
+    for entry in setting.split(','):
+        name, _, seconds = entry.strip().rpartition(':')
+        if name in ('*', stream_name) and seconds:
+            return float(seconds)
+    return None
+
+
+def main(argv):
+    stream_name = next((arg.split('=', 1)[1] for arg in argv if arg.startswith('stream-name=')), 'unknown')
+    load = min(1.0, max(0.0, float(os.environ.get('FAKE_GST_LOAD', '0.1'))))
+    lifetime = crash_after(os.environ.get('FAKE_GST_CRASH', ''), stream_name)
+
+    stopping = []
+    if _matches(os.environ.get('FAKE_GST_IGNORE_SIGINT', ''), stream_name):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    else:
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    print(f"Setting pipeline to PLAYING ... (fake, stream {stream_name})", flush=True)
+    started = time.monotonic()
+    while not stopping:
+        if lifetime is not None and time.monotonic() - started >= lifetime:
+            print("ERROR: from element /GstPipeline:pipeline0/GstKvsSink:kvssink0: fake crash", flush=True)
+            return 1
+        # Burn `load` of each tick, sleep the rest
+        busy_until = time.monotonic() + TICK * load
+        while time.monotonic() < busy_until:
+            pass
+        time.sleep(TICK * (1 - load))
+    print("Interrupt: Stopping pipeline ...", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
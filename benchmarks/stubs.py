@@ -0,0 +1,827 @@
+'''
+Local, in-memory stand-ins for the AWS clients used by the lambdas and the stream processor.
+
+Each stand-in implements only the subset of the boto3 client API this repo calls,
+counts every request it serves, and can add a fixed per-request latency so benchmarks
+see something closer to a real round trip.
+'''
+
+import io
+import random
+import re
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+
+class _NoSuchKey(Exception):
+    pass
+
+
+class _Exceptions:
+    NoSuchKey = _NoSuchKey
+
+
+class _Body:
+    '''
+    Mimics botocore's StreamingBody closely enough for .read() callers
+    '''
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read() if amt is None else self._stream.read(amt)
+
+
+class LocalS3:
+    '''
+    Dict-backed S3 bucket store. Listing follows list_objects_v2's 1000-key page limit.
+    Writes can fail at `failure_rate` (503 SlowDown) and requests take `latency` seconds
+    plus up to `jitter` seconds more. put_object honours IfMatch / IfNoneMatch='*'
+    (412 PreconditionFailed, as a botocore ClientError)
+    '''
+    exceptions = _Exceptions
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.objects = {} # (bucket, key) -> {'Body', 'ETag', 'LastModified', 'ContentType', 'Metadata'}
+        self._etags = 0
+        self.calls = Counter()
+        self.bytes_out = 0
+        self._uploads = {} # upload id -> {part number: bytes}
+        self._lock = threading.Lock()
+
+    def _request(self, name, write=False):
+        with self._lock:
+            self.calls[name] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = write and self.failure_rate and self.random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError("SlowDown: Please reduce your request rate (injected)")
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, Metadata=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._request('put_object', write=True)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif not isinstance(Body, bytes):
+            Body = Body.read()
+        with self._lock:
+            current = self.objects.get((Bucket, Key))
+            if (IfNoneMatch == '*' and current) or (IfMatch and (not current or current['ETag'] != IfMatch)):
+                from botocore.exceptions import ClientError
+                raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'At least one of the pre-conditions you specified did not hold'}}, 'PutObject')
+            self._etags += 1 # unique per write, like S3's for a changed object
+            etag = f'"{hash(Body) & 0xffffffff:08x}{self._etags:08x}"'
+            self.objects[(Bucket, Key)] = {
+                'Body': Body,
+                'ETag': etag,
+                'LastModified': datetime.now(timezone.utc),
+                'ContentType': ContentType,
+                'Metadata': Metadata or {}
+            }
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._request('get_object')
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise _NoSuchKey(f"NoSuchKey: {Key}")
+        data = obj['Body']
+        if Range:
+            # Only the "bytes=start-end" and "bytes=-suffix" forms are needed here
+            spec = Range.split('=', 1)[1]
+            start, end = spec.split('-')
+            if start == '':
+                data = data[-int(end):]
+            else:
+                data = data[int(start):int(end) + 1 if end else None]
+        with self._lock:
+            self.bytes_out += len(data)
+        return {
+            'Body': _Body(data),
+            'ContentLength': len(data),
+            'ETag': obj.get('ETag'),
+            'LastModified': obj['LastModified'],
+            'Metadata': obj['Metadata']
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._request('head_object')
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise _NoSuchKey(f"NoSuchKey: {Key}")
+        return {
+            'ContentLength': len(obj['Body']),
+            'LastModified': obj['LastModified'],
+            'Metadata': obj['Metadata']
+        }
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._request('delete_object')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, StartAfter=None,
+                        Delimiter=None, **kwargs):
+        self._request('list_objects_v2')
+        MaxKeys = min(MaxKeys, 1000)
+        keys = sorted(k for (b, k) in self.objects if b == Bucket and k.startswith(Prefix))
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [k for k in keys if k > after and not (Delimiter and after.endswith(Delimiter) and k.startswith(after))]
+
+        # With a Delimiter, keys sharing the next path segment roll up into one CommonPrefix,
+        # which counts against MaxKeys like a key does
+        entries = []
+        for k in keys:
+            cut = k.find(Delimiter, len(Prefix)) if Delimiter else -1
+            entry = k[:cut + len(Delimiter)] if cut >= 0 else k
+            if not entries or entries[-1] != entry:
+                entries.append(entry)
+
+        page = entries[:MaxKeys]
+        response = {
+            'KeyCount': len(page),
+            'IsTruncated': len(entries) > MaxKeys
+        }
+        contents = [k for k in page if not (Delimiter and k.endswith(Delimiter) and (Bucket, k) not in self.objects)]
+        prefixes = [k for k in page if k not in contents]
+        if contents:
+            response['Contents'] = [
+                {
+                    'Key': k,
+                    'LastModified': self.objects[(Bucket, k)]['LastModified'],
+                    'Size': len(self.objects[(Bucket, k)]['Body'])
+                }
+                for k in contents
+            ]
+        if prefixes:
+            response['CommonPrefixes'] = [{'Prefix': k} for k in prefixes]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._request('delete_objects')
+        if len(Delete['Objects']) > 1000:
+            raise ValueError("MalformedXML: at most 1000 keys per DeleteObjects request")
+        with self._lock:
+            for obj in Delete['Objects']:
+                self.objects.pop((Bucket, obj['Key']), None)
+        return {'Deleted': [{'Key': obj['Key']} for obj in Delete['Objects']], 'Errors': []}
+
+    def get_paginator(self, operation_name):
+        return _Paginator(getattr(self, operation_name))
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, **kwargs):
+        self._request('create_multipart_upload')
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {'parts': {}, 'ContentType': ContentType}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._request('upload_part', write=True)
+        with self._lock:
+            self._uploads[UploadId]['parts'][PartNumber] = Body
+        return {'ETag': f'"{hash(Body) & 0xffffffff:08x}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._request('complete_multipart_upload')
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+            body = b''.join(upload['parts'][part['PartNumber']] for part in MultipartUpload['Parts'])
+            self.objects[(Bucket, Key)] = {
+                'Body': body,
+                'LastModified': datetime.now(timezone.utc),
+                'ContentType': upload['ContentType'],
+                'Metadata': {}
+            }
+        return {'ETag': f'"{hash(body) & 0xffffffff:08x}-{len(MultipartUpload["Parts"])}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._request('abort_multipart_upload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+
+class _Paginator:
+    def __init__(self, method):
+        self._method = method
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self._method(ContinuationToken=token, **kwargs) if token else self._method(**kwargs)
+            yield page
+            token = page.get('NextContinuationToken')
+            if not token:
+                return
+
+
+class LocalSQS:
+    '''
+    FIFO queue stand-in. Honours MessageDeduplicationId, can fail a fraction of
+    batch entries (failure_rate) to exercise partial-batch retries, and delivers like
+    a FIFO queue: while any message of a group is in flight, no other message from
+    that group is handed out
+    '''
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.messages = [] # list of dicts in send order
+        self.calls = Counter()
+        self._dedup_ids = set()
+        self._next_id = 0
+        self._in_flight = {} # receipt handle -> (message, visible again at)
+        self._lock = threading.Lock()
+
+    def _request(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _enqueue(self, body, group_id, dedup_id):
+        with self._lock:
+            self._next_id += 1
+            message_id = f"msg-{self._next_id}"
+            if dedup_id not in self._dedup_ids:
+                self._dedup_ids.add(dedup_id)
+                self.messages.append({
+                    'MessageId': message_id,
+                    'Body': body,
+                    'MessageGroupId': group_id
+                })
+        return message_id
+
+    def send_message(self, QueueUrl, MessageBody, MessageGroupId=None, MessageDeduplicationId=None, **kwargs):
+        self._request('send_message')
+        return {'MessageId': self._enqueue(MessageBody, MessageGroupId, MessageDeduplicationId)}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._request('send_message_batch')
+        if len(Entries) > 10:
+            raise ValueError("AWS.SimpleQueueService.TooManyEntriesInBatchRequest")
+        successful, failed = [], []
+        for entry in Entries:
+            if self.random.random() < self.failure_rate:
+                failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError', 'Message': 'injected'})
+                continue
+            message_id = self._enqueue(entry['MessageBody'], entry.get('MessageGroupId'), entry.get('MessageDeduplicationId'))
+            successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        return {'Successful': successful, 'Failed': failed}
+
+    def _expire_in_flight(self, now):
+        # Messages whose visibility timeout ran out go back to the front of their group
+        expired = [handle for handle, (_, deadline) in self._in_flight.items() if deadline <= now]
+        for handle in expired:
+            message, _ = self._in_flight.pop(handle)
+            message.pop('ReceiptHandle', None)
+            self.messages.append(message)
+        if expired:
+            self.messages.sort(key=lambda m: int(m['MessageId'].split('-')[1]))
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, VisibilityTimeout=30, WaitTimeSeconds=0, **kwargs):
+        self._request('receive_message')
+        deadline = time.monotonic() + WaitTimeSeconds
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire_in_flight(now)
+                busy_groups = {m['MessageGroupId'] for m, _ in self._in_flight.values()}
+                batch = []
+                for message in self.messages:
+                    if len(batch) >= MaxNumberOfMessages:
+                        break
+                    if message['MessageGroupId'] in busy_groups:
+                        continue
+                    batch.append(message)
+                # A receive may take several messages of one group, in order, but the group
+                # then stays locked until they are deleted or become visible again
+                received = []
+                for message in batch:
+                    self.messages.remove(message)
+                    message['ReceiptHandle'] = f"rh-{message['MessageId']}-{now}"
+                    self._in_flight[message['ReceiptHandle']] = (message, now + VisibilityTimeout)
+                    received.append(dict(message))
+            if received or time.monotonic() >= deadline:
+                return {'Messages': received} if received else {}
+            time.sleep(0.001)
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        self._request('delete_message')
+        with self._lock:
+            self._in_flight.pop(ReceiptHandle, None)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._request('delete_message_batch')
+        with self._lock:
+            for entry in Entries:
+                self._in_flight.pop(entry['ReceiptHandle'], None)
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **kwargs):
+        self._request('change_message_visibility')
+        with self._lock:
+            if ReceiptHandle in self._in_flight:
+                message, _ = self._in_flight[ReceiptHandle]
+                self._in_flight[ReceiptHandle] = (message, time.monotonic() + VisibilityTimeout)
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries, **kwargs):
+        for entry in Entries:
+            self.change_message_visibility(QueueUrl, entry['ReceiptHandle'], entry['VisibilityTimeout'])
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+# --- Kinesis Video Streams ---------------------------------------------------------------
+
+def _ebml_size(size):
+    # EBML variable-length size: the position of the first set bit gives the length
+    for length in range(1, 9):
+        if size < (1 << (7 * length)) - 1:
+            return ((1 << (7 * length)) | size).to_bytes(length, 'big')
+    raise ValueError("element too large")
+
+
+def _ebml(element_id, payload):
+    return element_id + _ebml_size(len(payload)) + payload
+
+
+def _ebml_uint(value):
+    return value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+
+
+def mkv_fragment(fragment_number, timecode_ms=0, frames=15, fps=15, gop=15,
+                 keyframe_bytes=24000, frame_bytes=3000, seed=None, payloads=None, codec_private=None):
+    '''
+    One GetMedia-style MKV fragment: EBML header, Segment with Info, Tracks, the KVS
+    fragment-number tags and a Cluster of H.264-sized SimpleBlocks (random payload).
+    A keyframe opens the cluster and then every `gop` frames.
+
+    `payloads` ([(keyframe, bytes)], e.g. packets demuxed from a real clip) replaces the
+    random blocks, with `codec_private` (the AVC decoder configuration) in the track entry
+    '''
+    rng = random.Random(fragment_number if seed is None else seed)
+    header = _ebml(b'\x1a\x45\xdf\xa3', _ebml(b'\x42\x82', b'matroska'))
+    info = _ebml(b'\x15\x49\xa9\x66', _ebml(b'\x2a\xd7\xb1', _ebml_uint(1000000)))
+    entry = _ebml(b'\xd7', b'\x01') + _ebml(b'\x86', b'V_MPEG4/ISO/AVC')
+    if codec_private:
+        entry += _ebml(b'\x63\xa2', codec_private)
+    tracks = _ebml(b'\x16\x54\xae\x6b', _ebml(b'\xae', entry))
+    tags = _ebml(b'\x12\x54\xc3\x67', _ebml(b'\x73\x73', b''.join(
+        _ebml(b'\x67\xc8', _ebml(b'\x45\xa3', name.encode()) + _ebml(b'\x44\x87', value.encode()))
+        for name, value in (
+            ('AWS_KINESISVIDEO_FRAGMENT_NUMBER', str(fragment_number)),
+            ('AWS_KINESISVIDEO_PRODUCER_TIMESTAMP', f"{timecode_ms / 1000:.3f}")
+        )
+    )))
+    if payloads is None:
+        payloads = [
+            (index % gop == 0, rng.randbytes(keyframe_bytes if index % gop == 0 else frame_bytes))
+            for index in range(frames)
+        ]
+    blocks = []
+    for index, (keyframe, payload) in enumerate(payloads):
+        block = b'\x81' + int(index * 1000 // fps).to_bytes(2, 'big') + (b'\x80' if keyframe else b'\x00')
+        blocks.append(_ebml(b'\xa3', block + payload))
+    cluster = _ebml(b'\x1f\x43\xb6\x75', _ebml(b'\xe7', _ebml_uint(timecode_ms)) + b''.join(blocks))
+    return header + _ebml(b'\x18\x53\x80\x67', info + tracks + tags + cluster)
+
+
+def mkv_continuation(token):
+    # GetMedia ends a response with a Tags element carrying the token to resume from
+    return _ebml(b'\x12\x54\xc3\x67', _ebml(b'\x73\x73', _ebml(b'\x67\xc8',
+        _ebml(b'\x45\xa3', b'AWS_KINESISVIDEO_CONTINUATION_TOKEN') + _ebml(b'\x44\x87', str(token).encode())
+    )))
+
+
+class FakeMediaSource:
+    '''
+    Stand-in for a GetMedia / GetImages endpoint, used through the same async
+    open(stream_name, start_selector) interface as the real sources in kvs_client.
+
+    Replays `fixtures` (a list of MKV fragments or JPEG images, cycled) or generates
+    synthetic fragments. Every response ends after `fragments_per_response` fragments,
+    cleanly with a continuation token, or mid-fragment with probability `drop_rate`, so
+    the resume logic gets exercised. With `realtime` each fragment takes
+    `fragment_seconds` to arrive
+    '''
+    FIRST_FRAGMENT = 91343852333181432392682062607743920146264426642
+    container = 'mkv'
+
+    def __init__(self, fixtures=None, fragments_per_stream=None, fragments_per_response=20,
+                 drop_rate=0.0, chunk_size=64 * 1024, realtime=False, fragment_seconds=1.0, seed=0, **fragment_args):
+        self.fixtures = fixtures
+        self.fragments_per_stream = fragments_per_stream
+        self.fragments_per_response = fragments_per_response
+        self.drop_rate = drop_rate
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        self.fragment_seconds = fragment_seconds
+        self.fragment_args = fragment_args
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.selectors = [] # (stream name, start selector) per open()
+        self.delivered = {} # stream name -> fragment numbers fully sent, in order
+        self._cache = {}
+
+    def _fragment(self, number):
+        if self.fixtures:
+            return self.fixtures[(number - self.FIRST_FRAGMENT) % len(self.fixtures)]
+        index = (number - self.FIRST_FRAGMENT) % 64 # payloads repeat so generation stays cheap
+        if index not in self._cache:
+            self._cache[index] = mkv_fragment(number, **self.fragment_args)
+        cached = self._cache[index]
+        # Swap in the real fragment number (same digit count, so sizes don't change)
+        return cached.replace(str(self.FIRST_FRAGMENT + index).encode(), str(number).encode(), 1)
+
+    def _start(self, stream_name, selector):
+        kind = selector['StartSelectorType']
+        if kind == 'CONTINUATION_TOKEN':
+            return int(selector['ContinuationToken'])
+        if kind == 'FRAGMENT_NUMBER':
+            return int(selector['AfterFragmentNumber']) # GetMedia starts at, not after, this fragment
+        return self.FIRST_FRAGMENT if kind == 'EARLIEST' or stream_name not in self.delivered else \
+            self.delivered[stream_name][-1] + 1
+
+    async def open(self, stream_name, selector):
+        import asyncio
+        self.calls['get_media'] += 1
+        self.selectors.append((stream_name, dict(selector)))
+        number = self._start(stream_name, selector)
+        delivered = self.delivered.setdefault(stream_name, [])
+        last = self.FIRST_FRAGMENT + self.fragments_per_stream - 1 if self.fragments_per_stream else None
+        for _ in range(self.fragments_per_response):
+            if last is not None and number > last:
+                while True: # the producer stopped; GetMedia idles
+                    await asyncio.sleep(3600)
+            data = memoryview(self._fragment(number))
+            drop_at = len(data) // 2 if self.random.random() < self.drop_rate else None
+            for offset in range(0, len(data), self.chunk_size):
+                if drop_at is not None and offset >= drop_at:
+                    raise ConnectionResetError("injected disconnect")
+                yield bytes(data[offset:offset + self.chunk_size])
+            delivered.append(number)
+            number += 1
+            await asyncio.sleep(self.fragment_seconds if self.realtime else 0)
+        yield mkv_continuation(number)
+
+
+# --- DynamoDB ----------------------------------------------------------------------------
+
+class _ConditionalCheckFailed(Exception):
+    pass
+
+
+class _DynamoDBExceptions:
+    ConditionalCheckFailedException = _ConditionalCheckFailed
+
+
+class _Expression:
+    '''
+    Evaluates the subset of DynamoDB expressions this repo writes: comparisons, AND/OR/NOT,
+    parentheses, attribute_exists / attribute_not_exists, nested map paths with #names,
+    and SET / REMOVE update expressions
+    '''
+    TOKEN = re.compile(r'\s*(attribute_not_exists|attribute_exists|AND|OR|NOT|SET|REMOVE|<>|<=|>=|[()=<>,]|:\w+|#?\w+(?:\.#?\w+)*)')
+
+    def __init__(self, text, names, values):
+        self.tokens = self.TOKEN.findall(text or '')
+        self.names = names or {}
+        self.values = values or {}
+        self.pos = 0
+
+    def _next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def path(self, token):
+        return [self.names.get(part, part) for part in token.split('.')]
+
+    @staticmethod
+    def lookup(item, path):
+        value = item.get(path[0])
+        for part in path[1:]:
+            if value is None or 'M' not in value:
+                return None
+            value = value['M'].get(part)
+        return value
+
+    @staticmethod
+    def plain(value):
+        if value is None:
+            return None
+        (kind, raw), = value.items()
+        return float(raw) if kind == 'N' else raw
+
+    # Conditions: or_expr := and_expr (OR and_expr)*; and_expr := not_expr (AND not_expr)*
+    def evaluate(self, item):
+        if not self.tokens:
+            return True
+        return self._or(item)
+
+    def _or(self, item):
+        result = self._and(item)
+        while self._peek() == 'OR':
+            self._next()
+            right = self._and(item)
+            result = result or right
+        return result
+
+    def _and(self, item):
+        result = self._not(item)
+        while self._peek() == 'AND':
+            self._next()
+            right = self._not(item)
+            result = result and right
+        return result
+
+    def _not(self, item):
+        if self._peek() == 'NOT':
+            self._next()
+            return not self._not(item)
+        return self._term(item)
+
+    def _term(self, item):
+        token = self._next()
+        if token == '(':
+            result = self._or(item)
+            self._next() # ')'
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists'):
+            self._next() # '('
+            exists = self.lookup(item, self.path(self._next())) is not None
+            self._next() # ')'
+            return exists if token == 'attribute_exists' else not exists
+        left = self.plain(self.lookup(item, self.path(token)))
+        operator = self._next()
+        right = self.plain(self.values[self._next()])
+        if left is None:
+            return operator == '<>'
+        return {'=': left == right, '<>': left != right, '<': left < right,
+                '<=': left <= right, '>': left > right, '>=': left >= right}[operator]
+
+    def update(self, item):
+        action = None
+        while self._peek():
+            token = self._next()
+            if token in ('SET', 'REMOVE'):
+                action = token
+                continue
+            if token == ',':
+                continue
+            path = self.path(token)
+            parent = item if len(path) == 1 else (self.lookup(item, path[:-1]) or {}).get('M')
+            if parent is None:
+                raise ValueError("ValidationException: The document path provided in the update expression is invalid")
+            if action == 'SET':
+                self._next() # '='
+                parent[path[-1]] = self.values[self._next()]
+            else:
+                parent.pop(path[-1], None)
+
+
+def _copy_item(value):
+    # Items are plain nested dicts/strings; a deep copy keeps callers from mutating the store
+    if isinstance(value, dict):
+        return {k: _copy_item(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_item(v) for v in value]
+    return value
+
+
+class LocalDynamoDB:
+    '''
+    Low-level DynamoDB client stand-in. `tables` maps table name -> key attribute names.
+    Conditional writes are evaluated atomically under one lock, like DynamoDB does per item
+    '''
+    exceptions = _DynamoDBExceptions
+
+    def __init__(self, tables, latency=0.0):
+        self.key_schema = dict(tables)
+        self.tables = {name: {} for name in tables}
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _request(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, table, item):
+        return tuple(_Expression.plain(item[name]) for name in self.key_schema[table])
+
+    def _check(self, current, kwargs):
+        condition = kwargs.get('ConditionExpression')
+        if condition and not _Expression(condition, kwargs.get('ExpressionAttributeNames'),
+                                         kwargs.get('ExpressionAttributeValues')).evaluate(current or {}):
+            raise _ConditionalCheckFailed("The conditional request failed")
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._request('get_item')
+        with self._lock:
+            item = self.tables[TableName].get(self._key(TableName, Key))
+            return {'Item': _copy_item(item)} if item else {}
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._request('put_item')
+        with self._lock:
+            key = self._key(TableName, Item)
+            self._check(self.tables[TableName].get(key), kwargs)
+            self.tables[TableName][key] = _copy_item(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, **kwargs):
+        self._request('update_item')
+        with self._lock:
+            key = self._key(TableName, Key)
+            current = self.tables[TableName].get(key)
+            self._check(current, kwargs)
+            item = _copy_item(current) if current else _copy_item(Key)
+            _Expression(UpdateExpression, kwargs.get('ExpressionAttributeNames'),
+                        kwargs.get('ExpressionAttributeValues')).update(item)
+            self.tables[TableName][key] = item
+        return {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._request('delete_item')
+        with self._lock:
+            key = self._key(TableName, Key)
+            self._check(self.tables[TableName].get(key), kwargs)
+            self.tables[TableName].pop(key, None)
+        return {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._request('batch_get_item')
+        responses = {}
+        with self._lock:
+            for table, request in RequestItems.items():
+                if len(request['Keys']) > 100:
+                    raise ValueError("ValidationException: Too many items requested for the BatchGetItem call")
+                items = (self.tables[table].get(self._key(table, key)) for key in request['Keys'])
+                responses[table] = [_copy_item(item) for item in items if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def scan(self, TableName, **kwargs):
+        self._request('scan')
+        with self._lock:
+            return {'Items': [_copy_item(item) for item in self.tables[TableName].values()]}
+
+
+
+# --- Rekognition -------------------------------------------------------------------------
+
+class _RekognitionError(Exception):
+    '''
+    Carries a botocore-style `response` so callers can read the error code
+    '''
+    code = None
+
+    def __init__(self, message):
+        super().__init__(f"{self.code}: {message}")
+        self.response = {'Error': {'Code': self.code, 'Message': message}}
+
+
+class _ThrottlingException(_RekognitionError):
+    code = 'ThrottlingException'
+
+
+class _InvalidS3ObjectException(_RekognitionError):
+    code = 'InvalidS3ObjectException'
+
+
+class _RekognitionExceptions:
+    ThrottlingException = _ThrottlingException
+    InvalidS3ObjectException = _InvalidS3ObjectException
+
+
+class LocalRekognition:
+    '''
+    detect_protective_equipment stand-in. Calls take `latency` seconds plus up to `jitter`
+    more; more than `tps` calls started within one second are throttled, like the account
+    quota. With `s3` (a LocalS3) S3Object images must exist, else InvalidS3ObjectException
+    '''
+    exceptions = _RekognitionExceptions
+
+    def __init__(self, latency=0.2, jitter=0.1, tps=5.0, s3=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tps = tps
+        self.s3 = s3
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.images = Counter() # S3 key -> successful (billed) calls
+        self._started = [] # monotonic start times of accepted calls in the last second
+        self._lock = threading.Lock()
+
+    def detect_protective_equipment(self, Image, SummarizationAttributes=None, **kwargs):
+        with self._lock:
+            now = time.monotonic()
+            self._started = [started for started in self._started if started > now - 1.0]
+            throttled = len(self._started) >= self.tps
+            if throttled:
+                self.calls['throttled'] += 1
+            else:
+                self._started.append(now)
+                self.calls['detect_protective_equipment'] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if throttled:
+            time.sleep(0.01)
+            raise _ThrottlingException("Rate exceeded")
+        time.sleep(delay)
+        source = Image.get('S3Object')
+        if source and self.s3 is not None and (source['Bucket'], source['Name']) not in self.s3.objects:
+            raise _InvalidS3ObjectException(f"Unable to get object metadata from S3: {source['Name']}")
+        if source:
+            with self._lock:
+                self.images[source['Name']] += 1
+        types = (SummarizationAttributes or {}).get('RequiredEquipmentTypes', ['HEAD_COVER'])
+        box = {'Width': 0.2, 'Height': 0.6, 'Left': 0.4, 'Top': 0.2}
+        return {
+            'ProtectiveEquipmentModelVersion': '1.0',
+            'Persons': [{
+                'Id': 0,
+                'Confidence': 99.5,
+                'BoundingBox': box,
+                'BodyParts': [{
+                    'Name': 'HEAD',
+                    'Confidence': 99.1,
+                    'EquipmentDetections': [{
+                        'Type': 'HEAD_COVER',
+                        'Confidence': 97.3,
+                        'BoundingBox': {'Width': 0.08, 'Height': 0.07, 'Left': 0.46, 'Top': 0.2},
+                        'CoversBodyPart': {'Confidence': 96.0, 'Value': True}
+                    }]
+                }]
+            }],
+            'Summary': {'PersonsWithRequiredEquipment': [0], 'PersonsWithoutRequiredEquipment': [],
+                        'PersonsIndeterminate': []} if types else {}
+        }
+
+
+# --- Kinesis Video Streams ------------------------------------------------------------------
+
+class LocalKinesisVideo:
+    '''
+    describe_stream / create_stream stand-in. Requests take `latency` seconds; a created
+    stream is CREATING for `activation` seconds plus up to `jitter` more, then ACTIVE.
+    `streams` names streams that already exist (ACTIVE). Errors are botocore ClientErrors
+    (ResourceNotFoundException, ResourceInUseException), as the Pi CLI catches those
+    '''
+    def __init__(self, latency=0.15, activation=4.0, jitter=2.0, streams=(), region='us-east-1', seed=0):
+        self.latency = latency
+        self.activation = activation
+        self.jitter = jitter
+        self.region = region
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.active_at = {name: 0.0 for name in streams} # stream -> monotonic time it is ACTIVE
+        self._lock = threading.Lock()
+
+    def _request(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _error(self, code, operation, message):
+        from botocore.exceptions import ClientError
+        return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+    def _arn(self, name):
+        return f"arn:aws:kinesisvideo:{self.region}:123456789012:stream/{name}/1700000000000"
+
+    def describe_stream(self, StreamName, **kwargs):
+        self._request('describe_stream')
+        with self._lock:
+            active_at = self.active_at.get(StreamName)
+        if active_at is None:
+            raise self._error('ResourceNotFoundException', 'DescribeStream', f"The requested stream {StreamName} is not found")
+        status = 'ACTIVE' if time.monotonic() >= active_at else 'CREATING'
+        return {'StreamInfo': {'StreamName': StreamName, 'StreamARN': self._arn(StreamName), 'Status': status}}
+
+    def create_stream(self, StreamName, DataRetentionInHours=0, **kwargs):
+        self._request('create_stream')
+        with self._lock:
+            if StreamName in self.active_at:
+                raise self._error('ResourceInUseException', 'CreateStream', f"The stream {StreamName} already exists")
+            self.active_at[StreamName] = time.monotonic() + self.activation + self.random.uniform(0, self.jitter)
+        return {'StreamARN': self._arn(StreamName)}
@@ -0,0 +1,71 @@
+'''
+Shared, lazily-initialised boto3 clients for the lambdas.
+
+Clients are created on first use and then live for the lifetime of the Lambda container,
+so warm invocations skip credential resolution, endpoint setup and new TLS handshakes.
+All clients share one botocore Config with a larger connection pool and TCP keep-alive,
+and every call they make is counted and timed (metrics.instrument_client).
+
+Benchmarks and local runs can swap in stand-ins with set_client().
+'''
+
+import os
+import threading
+
+from botocore.config import Config
+
+from metrics import instrument_client
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32')), # >= getAll's FETCH_WORKERS
+    tcp_keepalive=True, # keep pooled connections alive between warm invocations
+    connect_timeout=3,
+    read_timeout=15,
+    retries={'max_attempts': 3, 'mode': 'adaptive'}
+)
+
+_clients = {} # (service_name, region_name) -> client
+_lock = threading.Lock()
+_session = None
+
+
+def get_client(service_name, region_name=None):
+    '''
+    Returns the shared client for service_name/region_name, creating it on first use
+    '''
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock: # boto3 sessions are not thread-safe while creating clients
+            client = _clients.get(key)
+            if client is None:
+                client = _get_session().client(service_name, region_name=region_name, config=CLIENT_CONFIG)
+                instrument_client(client)
+                _clients[key] = client
+    return client
+
+
+def set_client(service_name, client, region_name=None):
+    '''
+    Registers an already-built client (e.g. a local stand-in) for service_name/region_name
+    '''
+    with _lock:
+        _clients[(service_name, region_name)] = client
+
+
+def reset_clients():
+    '''
+    Drops every cached client so the next get_client() builds a fresh one
+    '''
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.session.Session()
+    return _session
@@ -0,0 +1,182 @@
+'''
+Rolls per-frame Rekognition results up into hourly NDJSON.gz objects (layout and format in
+result_layout.py). Runs on an hourly EventBridge schedule, one invocation at a time.
+
+Each run:
+- lists rekognition_results/. Compaction keeps that prefix down to the last hour or two of
+  results, so the listing stays short
+- groups the keys by camera-hour. Flat rekognition_results/{uuid}.json keys from before the
+  partitioned layout are grouped by the cameraId in their body and their LastModified hour,
+  and get a partitioned key in the rollup (latest-result pointers naming them are repointed)
+- for every hour that ended at least COMPACT_AFTER_MINUTES ago, merges its results into the
+  hour's rollup (an existing rollup is read back first, so late results are not lost),
+  writes the rollup, and only then deletes the per-frame objects, 1000 per DeleteObjects call
+
+Readers look at both the rollup and any per-frame objects of an hour, so a run that stops
+half-way (timeout, error) never hides results. MAX_OBJECTS_PER_RUN caps one run; the rest
+is picked up by the next.
+'''
+
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import get_client
+from metrics import counter, emf_handler
+from result_layout import build_rollup, hour_bounds, parse_result_key, parse_rollup, partition, result_key, rollup_key
+from results_index import DEFAULT_CAMERA, RESULTS_PREFIX, pointer_key, result_time, update_pointer
+
+COMPACT_AFTER_MINUTES = int(os.environ.get('COMPACT_AFTER_MINUTES', '30'))
+MAX_OBJECTS_PER_RUN = int(os.environ.get('MAX_OBJECTS_PER_RUN', '50000'))
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', '16'))
+DELETE_BATCH = 1000 # DeleteObjects limit
+
+COMPACTED = counter('results_compacted_total', "Per-frame results rolled up and deleted")
+
+
+def _camera(partition_path):
+    return partition_path.split('/', 1)[0][len('camera='):]
+
+
+def _fetch(s3, bucket_name, key):
+    return json.loads(s3.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+
+
+def list_partitions(s3, bucket_name, limit=MAX_OBJECTS_PER_RUN):
+    '''
+    Returns ({partition: [(key, ts ms)]}, [(flat key, LastModified)]) for up to `limit` keys
+    '''
+    partitions = defaultdict(list)
+    flat = []
+    seen = 0
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=RESULTS_PREFIX):
+        for obj in page.get('Contents', []):
+            parsed = parse_result_key(obj['Key'])
+            if parsed:
+                partitions[parsed[1]].append((obj['Key'], parsed[2]))
+            elif obj['Key'].endswith('.json') and '/' not in obj['Key'][len(RESULTS_PREFIX):]:
+                flat.append((obj['Key'], obj['LastModified']))
+            seen += 1
+            if seen >= limit:
+                return partitions, flat
+    return partitions, flat
+
+
+def _read_existing(s3, bucket_name, key):
+    try:
+        return parse_rollup(s3.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return []
+
+
+def compact_partition(s3, bucket_name, partition_path, records, pool):
+    '''
+    Merges records ([(key in the rollup, ts ms, source object key)]) into the partition's
+    rollup, then deletes the source objects. Returns the number deleted
+    '''
+    key = rollup_key(partition_path)
+    merged = {record['key']: (record['key'], record['ts'], record['result']) for record in _read_existing(s3, bucket_name, key)}
+    sources = [source for _, _, source in records]
+    bodies = pool.map(lambda source: _fetch(s3, bucket_name, source), sources)
+    for (record_key, ts, _), body in zip(records, bodies):
+        merged[record_key] = (record_key, ts, body)
+
+    data, _ = build_rollup(merged.values(), _camera(partition_path))
+    s3.put_object(Bucket=bucket_name, Key=key, Body=data, ContentType='application/gzip')
+
+    for start in range(0, len(sources), DELETE_BATCH):
+        s3.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': source} for source in sources[start:start + DELETE_BATCH]], 'Quiet': True}
+        )
+    COMPACTED.inc(len(sources))
+    return len(sources)
+
+
+def _repoint(s3, bucket_name, renamed, cameras):
+    # Latest-result pointers that still name a migrated flat key. Conditional, so a result
+    # stored in the meantime is never pointed away from
+    def change(pointer):
+        if not pointer or pointer['key'] not in renamed:
+            return None
+        return dict(pointer, key=renamed[pointer['key']], resultAt=result_time(renamed[pointer['key']]))
+
+    for camera_id in list(cameras) + [None]:
+        update_pointer(s3, bucket_name, pointer_key(camera_id), change)
+
+
+def compact(s3, bucket_name, now=None):
+    '''
+    One compaction run. Returns counts for the log / response
+    '''
+    now = time.time() if now is None else now
+    cutoff_ms = int((now - COMPACT_AFTER_MINUTES * 60) * 1000)
+    partitions, flat = list_partitions(s3, bucket_name)
+    stats = {'listed': sum(len(keys) for keys in partitions.values()) + len(flat), 'partitions': 0,
+             'compacted': 0, 'migrated': 0, 'pending': 0}
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        work = defaultdict(list) # partition -> [(key in the rollup, ts, source key)]
+        for partition_path, keys in partitions.items():
+            for key, ts in keys:
+                work[partition_path].append((key, ts, key))
+
+        # Flat keys only say which camera they belong to in their body
+        flat_bodies = pool.map(lambda item: _fetch(s3, bucket_name, item[0]), flat)
+        for (key, modified), body in zip(flat, flat_bodies):
+            when = modified.timestamp()
+            camera_id = body.get('cameraId') or DEFAULT_CAMERA
+            new_key = result_key(camera_id, when, key[len(RESULTS_PREFIX):-len('.json')])
+            work[partition(camera_id, when)].append((new_key, int(when * 1000), key))
+
+        renamed = {} # migrated flat key -> its key in the rollup
+        cameras = set()
+        for partition_path in sorted(work):
+            if hour_bounds(partition_path)[1] > cutoff_ms:
+                stats['pending'] += len(work[partition_path]) # hour not over yet
+                continue
+            try:
+                stats['compacted'] += compact_partition(s3, bucket_name, partition_path, work[partition_path], pool)
+            except Exception as e:
+                # The per-frame objects are still there; the next run tries again
+                print(f"Error compacting {partition_path}: {str(e)}")
+                continue
+            stats['partitions'] += 1
+            for record_key, _, source in work[partition_path]:
+                if source != record_key:
+                    renamed[source] = record_key
+                    cameras.add(_camera(partition_path))
+
+    if renamed:
+        stats['migrated'] = len(renamed)
+        _repoint(s3, bucket_name, renamed, cameras)
+    return stats
+
+
+@emf_handler()
+def lambda_handler(event, context):
+    bucket_name = os.environ.get('BUCKET_NAME')
+    if not bucket_name:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'S3 bucket not configured in environment variables'})
+        }
+
+    try:
+        stats = compact(get_client('s3'), bucket_name)
+    except Exception as e:
+        error_msg = f"Compaction error: {str(e)}"
+        print(error_msg)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Compaction error', 'details': error_msg})
+        }
+
+    print(f"Compaction: {stats}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps(stats)
+    }
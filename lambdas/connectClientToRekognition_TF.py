@@ -1,16 +1,67 @@
 import json
-import boto3
 import base64
 import os
 import uuid
-from io import BytesIO
 
+from aws_clients import get_client
+from frame_cache import dhash, from_environment
+from frame_keys import parse_frame_key
+from metrics import counter, emf_handler
+from ppe_summary import summarize, dumps_compact, compress_full_response, equipment_types_for_tags
+from result_layout import check_camera_id, result_key
+from results_index import DEFAULT_CAMERA, write_latest_pointer
 
+FULL_RESPONSE_PREFIX = 'rekognition_full/' # gzip sidecars, kept out of rekognition_results/ listings
+FRAME_PREFIX = 'cameras/' # s3Key requests may only point at uploaded frames
+MIN_CONFIDENCE = float(os.environ.get('PPE_MIN_CONFIDENCE', '80'))
+
+# Perceptual-hash dedup cache shared by warm invocations (None when disabled or Pillow/NumPy are missing)
+frame_cache = from_environment()
+DEDUP_LOOKUPS = counter('dedup_cache_lookups_total', "Dedup cache lookups by result (hit/miss)", ('result',))
+
+
+def _parse_request(event):
+    '''
+    Accepts three kinds of request and returns (rekognition_image, request_fields):
+
+    - Content-Type image/jpeg (or image/png): the raw image is the body. API Gateway delivers
+      binary media types base64-encoded, so this is the only decode; cameraId/tags come from
+      the query string
+    - JSON {"s3Key": ..., "s3Bucket"?: ...}: Rekognition reads the frame straight from S3.
+      Only frames under cameras/ in BUCKET_NAME: Rekognition reads them with this Lambda's
+      role, so a caller must not be able to point it at anything else the role can read.
+      The cameraId is the one in the frame key, not a field of the body
+    - JSON {"image": <base64>}: the original payload
+    '''
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    content_type = headers.get('content-type', 'application/json').split(';')[0].strip().lower()
+
+    if content_type.startswith('image/'):
+        if not event.get('isBase64Encoded'):
+            raise ValueError(f"{content_type} body must arrive base64-encoded (add it to the API's binary media types)")
+        return {'Bytes': base64.b64decode(event['body'])}, event.get('queryStringParameters') or {}
+
+    body = json.loads(event.get('body') or '{}')
+    if body.get('s3Key'):
+        bucket = os.environ['BUCKET_NAME']
+        if body.get('s3Bucket') not in (None, '', bucket):
+            raise ValueError(f"s3Bucket must be {bucket}")
+        key = body['s3Key']
+        if not isinstance(key, str) or not key.startswith(FRAME_PREFIX) or '/../' in f"/{key}/":
+            raise ValueError(f"s3Key must be a frame under {FRAME_PREFIX}")
+        return {'S3Object': {'Bucket': bucket, 'Name': key}}, dict(body, cameraId=parse_frame_key(key).camera_id)
+    return {'Bytes': base64.b64decode(body['image'])}, body
+
+
+@emf_handler()
 def lambda_handler(event, context):
     try:
-        # Parse the incoming JSON payload
-        body = json.loads(event.get('body', '{}'))
-        image_data = base64.b64decode(body['image'])
+        # Parse the incoming payload (raw image, S3 reference or base64 JSON)
+        image, fields = _parse_request(event)
+        # cameraId becomes a path segment of the result key and the pointer name
+        camera_id = check_camera_id(fields.get('cameraId') or DEFAULT_CAMERA)
+        # The camera's rekognition_tags decide which equipment types are checked
+        equipment_types = equipment_types_for_tags(fields.get('tags') or os.environ.get('PPE_TAGS', ''))
     except Exception as e:
         error_msg = f"Error parsing payload: {str(e)}"
         print(error_msg)
@@ -19,42 +70,52 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Invalid payload', 'details': error_msg})
         }
    
-    # Initialize the Rekognition client
-    rekognition = boto3.client('rekognition', region_name='us-east-1')
+    # Shared Rekognition client, built once per Lambda container
+    rekognition = get_client('rekognition', 'us-east-1')
 
 
-    try:
-        # Call the detect_protective_equipment API with SummarizationAttributes
-        rek_response = rekognition.detect_protective_equipment(Image={'Bytes': image_data})
-    except Exception as e:
-        error_msg = f"Rekognition call error: {str(e)}"
-        print(error_msg)
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Rekognition error', 'details': error_msg})
-        }
-   
-    # Filter response for head covering PPE detections on the HEAD body part
-    head_coverings = []
-    for person in rek_response.get('Persons', []):
-        for body_part in person.get('BodyParts',[]):
-            if body_part.get('Name') == 'HEAD':
-                for equipment in body_part.get('EquipmentDetections', []):
-                    if equipment.get('Type') == 'HEAD_COVER':
-                        head_coverings.append({
-                            'Type': equipment.get('Type'),
-                            'Confidence': equipment.get('Confidence'),
-                            'BoundingBox': equipment.get('BoundingBox')
-                        })
-   
-    result = {
-        'HeadCoverings': head_coverings,            # All found head coverings
-        'FullResponse': rek_response,               # Full JSON output from Rekognition
-    }
+    # Near-identical frames from the same camera reuse the last Rekognition response
+    cache_key = (camera_id, tuple(equipment_types))
+    frame_hash = rek_response = None
+    if frame_cache and 'Bytes' in image:
+        try:
+            frame_hash = dhash(image['Bytes'])
+            rek_response, distance = frame_cache.lookup(cache_key, frame_hash)
+            DEDUP_LOOKUPS.labels('hit' if rek_response is not None else 'miss').inc()
+        except Exception as e:
+            # Unreadable image: skip the cache and let Rekognition report the problem
+            print(f"Frame hash error: {str(e)}")
+    cache_hit = rek_response is not None
+    if frame_cache:
+        print(f"Dedup cache {'hit' if cache_hit else 'miss'}, hit rate {frame_cache.hit_rate():.1%} {frame_cache.stats}")
+
+    if not cache_hit:
+        try:
+            # Call the detect_protective_equipment API with SummarizationAttributes
+            rek_response = rekognition.detect_protective_equipment(
+                Image=image,
+                SummarizationAttributes={'MinConfidence': MIN_CONFIDENCE, 'RequiredEquipmentTypes': equipment_types}
+            )
+        except Exception as e:
+            error_msg = f"Rekognition call error: {str(e)}"
+            print(error_msg)
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'error': 'Rekognition error', 'details': error_msg})
+            }
+        if frame_hash is not None:
+            frame_cache.store(cache_key, frame_hash, rek_response)
+
+    # Compact summary of every checked equipment type (HeadCoverings is kept for existing clients)
+    result = summarize(rek_response, camera_id, equipment_types)
+    if cache_hit:
+        result['dedup'] = {'hit': True, 'distance': distance} # reused a near-identical frame's response
+    if 'S3Object' in image:
+        result['frameKey'] = image['S3Object']['Name'] # lets readers find the analysed frame
 
 
     # Save the result to s3
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     bucket_name = os.environ['BUCKET_NAME']
     if not bucket_name:
         error_msg = "BUCKET_NAME environment variable not set"
@@ -65,16 +126,28 @@ def lambda_handler(event, context):
         }
 
 
-    # Generate a unique key for the S3 object
-    file_key = f"rekognition_results/{uuid.uuid4()}.json"
+    # Generate a unique key for the S3 object, partitioned by camera and hour (result_layout.py)
+    result_id = uuid.uuid4()
+    file_key = result_key(camera_id, result_id=result_id)
 
 
-    # Attempt to put the object in S3
+    # Attempt to put the object(s) in S3
     try:
+        # Optional gzip sidecar with the full Rekognition response; readers never load it
+        if os.environ.get('STORE_FULL_RESPONSE', 'false').lower() == 'true' and not cache_hit:
+            result['full'] = f"{FULL_RESPONSE_PREFIX}{result_id}.json.gz"
+            s3.put_object(
+                Bucket=bucket_name,
+                Key=result['full'],
+                Body=compress_full_response(rek_response),
+                ContentType='application/json',
+                ContentEncoding='gzip'
+            )
+
         s3.put_object(
             Bucket=bucket_name,
             Key=file_key,
-            Body=json.dumps(result),
+            Body=dumps_compact(result),
             ContentType='application/json'
         )
     except Exception as e:
@@ -84,6 +157,13 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps({'error': 'S3 error', 'details': error_msg})
         }
+
+    # Point the latest-result index at the new object so getLatest never has to list the prefix
+    try:
+        write_latest_pointer(s3, bucket_name, file_key, camera_id)
+    except Exception as e:
+        # The result itself is stored, so only log this; the next stored result repairs the index
+        print(f"Error updating latest-result index: {str(e)}")
    
     # Save the result along with the S3 file location (for returning purposes)
     response_payload = {
@@ -1,54 +1,150 @@
 '''
-Triggered by S3 when a .jpg is uploaded.
+Triggered by S3 when a .jpg (or .jpeg/.png) is uploaded.
 Parses the uploaded file's S3 key to extract: ID, type, and timestamp.
 Constructs a JSON message
-Sends the message to NewFrames.fifo SQS queue
-Handles errors and logs output
+Sends the messages to NewFrames.fifo SQS queue in batches of up to 10
+Handles errors and logs output. Bad keys and entries SQS rejects as a sender fault are logged
+and counted as failed; if any other record could not be enqueued the invocation raises, so
+Lambda's async retry runs it again (frames already sent are deduplicated by a hash of their S3 key)
 '''
 
+import hashlib
 import json
-import boto3
 import os
-from datetime import datetime # may use to convert timestamp to a different format if needed
+import random
+import re
+import time
+import zlib
 
-sqs = boto3.client('sqs') # allows us to send messages to SQS
+from aws_clients import get_client
+from frame_keys import parse_frame_key
+from metrics import counter, emf_handler
 
+MAX_BATCH_SIZE = 10 # SendMessageBatch accepts at most 10 entries per call
+MAX_SEND_ATTEMPTS = 3 # total attempts per entry before it is reported as failed
+
+# 0 (default) gives every camera its own FIFO message group; N > 0 hashes cameras into N groups
+GROUP_BUCKETS = int(os.environ.get('FRAME_GROUP_BUCKETS', '0'))
+
+# Camera ids SQS accepts as-is in a MessageGroupId (alphanumerics and _.-, 128 chars with the prefix)
+_SQS_ID_RE = re.compile(r'[A-Za-z0-9_.-]{1,120}')
+
+FRAMES = counter('frames_enqueued_total', "Uploaded frames by outcome (sent/failed)", ('outcome',))
+
+
+def _message_group_id(camera_id):
+    '''
+    FIFO ordering is only needed per camera, so frames from different cameras go to
+    different message groups and can be consumed in parallel
+    '''
+    if GROUP_BUCKETS > 0:
+        # crc32 rather than hash() so the bucket is stable across Lambda containers
+        return f"frames-{zlib.crc32(camera_id.encode('utf-8')) % GROUP_BUCKETS}"
+    if not _SQS_ID_RE.fullmatch(camera_id):
+        # Decoded ids can hold spaces or non-ASCII ('front door', 'café'), which SQS rejects
+        return f"camera-{hashlib.sha256(camera_id.encode('utf-8')).hexdigest()[:32]}"
+    return f"camera-{camera_id}"
+
+
+def _deduplication_id(s3_key):
+    '''
+    sha256 of the decoded key: the same frame always gets the same id (however S3 encoded
+    the event key), and it stays within the characters and 128-char limit SQS accepts
+    '''
+    return hashlib.sha256(s3_key.encode('utf-8')).hexdigest()
+
+
+def _build_message(s3_key):
+    '''
+    Parses an S3 key like cameras/cam-123/frames/2025-07-23T22:00:00.jpg into the SQS message
+    '''
+    frame = parse_frame_key(s3_key) # raises ValueError for anything that isn't cameras/{cameraId}/frames/{timestamp}.{jpg,jpeg,png}
+
+    return { # constructs the message to send to SQS
+        "cameraId": frame.camera_id, # i.e. 'cam-123'
+        "s3Key": frame.key, # URL-decoded, so consumers can pass it straight to get_object
+        "timestamp": frame.timestamp # ISO 8601, i.e. '2025-07-23T22:00:00Z'
+    }
+
+
+def _send_batch(queue_url, entries):
+    '''
+    Sends up to 10 entries with SendMessageBatch, retrying only the entries that failed.
+
+    Returns (permanent, retryable): lists of (entry, reason) for entries SQS rejected as a
+    sender fault, and for entries that still failed for any other reason after MAX_SEND_ATTEMPTS
+    '''
+    permanent = [] # sender faults (bad entry) fail the same way again, so they are never retried
+    retryable = []
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt)) # jittered backoff between attempts
+
+        try:
+            # Shared client, allows us to send messages to SQS
+            response = get_client('sqs').send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            # The whole call failed (throttling, network), so every entry is retried
+            retryable = [(entry, str(e)) for entry in entries]
+            continue
+
+        # Log the response from SQS
+        for sent in response.get('Successful', []):
+            print(f"Sent message: {sent['MessageId']}")
+
+        by_id = {entry['Id']: entry for entry in entries}
+        retryable = []
+        for failure in response.get('Failed', []):
+            item = (by_id[failure['Id']], f"{failure.get('Code')}: {failure.get('Message')}")
+            (permanent if failure.get('SenderFault') else retryable).append(item)
+
+        if not retryable:
+            break
+        entries = [entry for entry, _ in retryable]
+
+    return permanent, retryable
+
+
+@emf_handler()
 def lambda_handler(event, context): # event is the S3 event data in json, context is the Lambda context i.e. metadata about the Lambda function execution
-    try:
-        for record in event['Records']: # loops through each record in the S3 event
-            s3_bucket = record['s3']['bucket']['name'] # pulls the S3 bucket name from the event
-
-            s3_key = record['s3']['object']['key'] # pulls the S3 object key from the event (path to the uploaded file, like cameras/cam-123/frames/2025-07-23T22:00:00.jpg)
-            path_parts = s3_key.split('/') # splits the S3 key into parts using '/' as the delimiter, i.e. ['cameras', 'cam-123', 'frames', '2025-07-23T22:00:00.jpg']
-
-            if len(path_parts) < 4: # prevent index out of range error
-                raise Exception("Invalid key format. Expected cameras/{cameraId}/frames/{timestamp}.jpg")
-
-            camera_id = path_parts[1] # extracts the camera ID from the S3 key, i.e. 'cam-123'
-            timestamp_raw = path_parts[-1].replace('.jpg', '') # extracts the timestamp from the S3 key, i.e. '2025-07-23T22:00:00'
-            timestamp_obj = datetime.strptime(timestamp_raw, "%Y-%m-%dT%H:%M:%S") # converts the timestamp string to a datetime object
-            iso_timestamp = timestamp_obj.strftime("%Y-%m-%dT%H:%M:%SZ") # formats the datetime object to ISO 8601 format, i.e. '2025-07-23T22:00:00Z'
-
-            message = { # constructs the message to send to SQS
-                "cameraId": camera_id,
-                "s3Key": s3_key,
-                "timestamp": iso_timestamp
-            }
-  
-            # Sends the message to the SQS queue.
-            response = sqs.send_message(
-                QueueUrl=os.environ['FRAME_QUEUE_URL'],  # pulled from the environment variable you set in Terraform
-                MessageBody=json.dumps(message), # json payload as a string
-                MessageGroupId="frame-events", # required for FIFO queues, all messages with this ID are delivered in order
-                MessageDeduplicationId=s3_key # ensures AWS doesn't enqueue duplicate messages (idempotency, using the S3 key as a unique identifier for the message)
-            )
-
-            # Log the response from SQS
-            print(f"Sent message: {response['MessageId']}")
-
-        return { 'statusCode': 200 } # return a 200 status code to indicate success
-
-    except Exception as e: # catch any exceptions that occur
-        print(f"Error: {str(e)}")
-        raise e
+    queue_url = os.environ['FRAME_QUEUE_URL'] # pulled from the environment variable you set in Terraform
+    failures = [] # S3 keys that can never be enqueued (bad key, rejected by SQS)
+    retryable = [] # S3 keys that may go through on another attempt
+
+    entries = []
+    keys = {} # entry Id -> S3 key, for logging the ones that fail
+    for record in event['Records']: # loops through each record in the S3 event
+        s3_key = record['s3']['object']['key'] # pulls the S3 object key from the event (path to the uploaded file, like cameras/cam-123/frames/2025-07-23T22:00:00.jpg)
+        try:
+            message = _build_message(s3_key)
+        except Exception as e: # a bad key only fails its own record
+            print(f"Error: {s3_key}: {str(e)}")
+            failures.append(s3_key)
+            continue
+
+        entries.append({
+            'Id': str(len(entries)), # only has to be unique within one batch call
+            'MessageBody': json.dumps(message), # json payload as a string
+            'MessageGroupId': _message_group_id(message['cameraId']), # required for FIFO queues, messages with the same ID (camera) are delivered in order
+            'MessageDeduplicationId': _deduplication_id(message['s3Key']) # ensures AWS doesn't enqueue duplicate messages (idempotency, using the S3 key as a unique identifier for the message)
+        })
+        keys[entries[-1]['Id']] = message['s3Key']
+
+    # Sends the messages to the SQS queue, 10 per round trip
+    for start in range(0, len(entries), MAX_BATCH_SIZE):
+        permanent, transient = _send_batch(queue_url, entries[start:start + MAX_BATCH_SIZE])
+        for entry, reason in permanent + transient:
+            print(f"Error: failed to enqueue {keys[entry['Id']]}: {reason}")
+        failures.extend(keys[entry['Id']] for entry, _ in permanent)
+        retryable.extend(keys[entry['Id']] for entry, _ in transient)
+
+    FRAMES.labels('sent').inc(len(event['Records']) - len(failures) - len(retryable))
+    FRAMES.labels('failed').inc(len(failures) + len(retryable))
 
+    # S3 invokes this asynchronously, so nothing reads a partial-batch response: fail the
+    # invocation instead and let Lambda retry it, but only for failures a retry can fix.
+    # MessageDeduplicationId comes from the S3 key, so the frames that did go out are
+    # dropped by the queue on the retry
+    if retryable:
+        raise RuntimeError(f"{len(retryable)} of {len(event['Records'])} frames not enqueued: {', '.join(retryable)}")
+    return { 'statusCode': 200 }
@@ -0,0 +1,124 @@
+'''
+Perceptual-hash dedup cache in front of Rekognition.
+
+A static scene sends near-identical frames over and over. Each frame gets a 64-bit dHash
+(difference hash) computed with NumPy on a 9x8 grayscale thumbnail; when a camera's new
+frame is within max_distance bits (Hamming distance) of a recent frame, the cached
+Rekognition response is reused instead of calling detect_protective_equipment again.
+
+Entries are kept per camera with a TTL and LRU eviction. The cache lives in the Lambda
+container, so it is shared by warm invocations only.
+
+Pillow and NumPy are optional (ship them as a Lambda layer). Without them hashing is
+unavailable and the cache is simply bypassed.
+'''
+
+import io
+import os
+import time
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError: # dedup is optional, the handler works without it
+    np = None
+    Image = None
+
+HASH_SIZE = 8 # 8x8 comparisons -> 64-bit hash
+
+
+def hashing_available():
+    return np is not None and Image is not None
+
+
+def dhash(image_bytes, hash_size=HASH_SIZE):
+    '''
+    Returns the dHash of an encoded image (JPEG/PNG) as an int
+    '''
+    image = Image.open(io.BytesIO(image_bytes))
+    # For JPEGs draft() lets the decoder downscale by up to 8x during decoding (DCT scaling)
+    image.draft('L', (hash_size * 8, hash_size * 8))
+    thumbnail = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    return dhash_pixels(np.asarray(thumbnail, dtype=np.int16))
+
+
+def dhash_pixels(pixels):
+    '''
+    dHash of an already-downscaled (hash_size, hash_size + 1) grayscale array
+    '''
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameCache:
+    '''
+    Per-camera LRU of (hash, value, stored_at) with a TTL.
+
+    lookup() returns (value, distance) for the closest fresh entry within max_distance,
+    or (None, None). Hit-rate counters are kept in self.stats
+    '''
+
+    def __init__(self, max_distance=4, ttl_seconds=30.0, max_entries_per_camera=16, clock=time.monotonic):
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_camera = max_entries_per_camera
+        self.clock = clock
+        self._cameras = {} # camera key -> OrderedDict(hash -> (value, stored_at))
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def lookup(self, camera, frame_hash):
+        entries = self._cameras.get(camera)
+        if not entries:
+            self.stats['misses'] += 1
+            return None, None
+
+        now = self.clock()
+        best_hash, best_distance = None, None
+        for cached_hash, (_, stored_at) in list(entries.items()):
+            if now - stored_at > self.ttl_seconds:
+                del entries[cached_hash]
+                self.stats['expired'] += 1
+                continue
+            distance = hamming(cached_hash, frame_hash)
+            if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                best_hash, best_distance = cached_hash, distance
+
+        if best_hash is None:
+            self.stats['misses'] += 1
+            return None, None
+
+        entries.move_to_end(best_hash) # most recently used
+        self.stats['hits'] += 1
+        return entries[best_hash][0], best_distance
+
+    def store(self, camera, frame_hash, value):
+        entries = self._cameras.setdefault(camera, OrderedDict())
+        entries[frame_hash] = (value, self.clock())
+        entries.move_to_end(frame_hash)
+        while len(entries) > self.max_entries_per_camera:
+            entries.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+
+def from_environment():
+    '''
+    Builds the cache from DEDUP_* environment variables, or returns None when dedup is off
+    (DEDUP_MAX_DISTANCE < 0) or Pillow/NumPy are not installed
+    '''
+    max_distance = int(os.environ.get('DEDUP_MAX_DISTANCE', '4'))
+    if max_distance < 0 or not hashing_available():
+        return None
+    return FrameCache(
+        max_distance=max_distance,
+        ttl_seconds=float(os.environ.get('DEDUP_TTL_SECONDS', '30')),
+        max_entries_per_camera=int(os.environ.get('DEDUP_MAX_ENTRIES', '16'))
+    )
@@ -0,0 +1,93 @@
+'''
+Parser and builder for frame object keys: cameras/{cameraId}/frames/{timestamp}.{ext}
+
+Shared by the lambdas (frameEnqueue_TF) and the stream processor container, which
+builds the keys it uploads with build_frame_key.
+
+Accepted timestamps (the file name without its extension):
+    2025-07-23T22:00:00          ISO seconds (the original format)
+    2025-07-23T22:00:00.123      ISO with milliseconds (up to 6 fractional digits)
+    2025-07-23T22-00-00          hyphens in the time, for filesystems that reject colons
+    1753308000 / 1753308000123   epoch seconds / epoch milliseconds
+Accepted extensions: .jpg, .jpeg, .png (any case). Keys from S3 events are URL-encoded
+(':' arrives as %3A), so they are decoded first.
+
+The ISO timestamp is assembled from the matched digits directly instead of going
+through datetime.strptime/strftime.
+'''
+
+import re
+import time
+from collections import namedtuple
+from urllib.parse import unquote_plus
+
+FrameKey = namedtuple('FrameKey', ['key', 'camera_id', 'timestamp', 'extension'])
+
+_KEY_RE = re.compile(r'cameras/([^/]+)/frames/([^/]+)\.(jpe?g|png)', re.IGNORECASE)
+_ISO_RE = re.compile(
+    r'(\d{4})-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'  # date
+    r'T([01]\d|2[0-3])([:-])([0-5]\d)\5([0-5]\d)'     # time, ':' or '-' used consistently
+    r'(?:\.(\d{1,6}))?Z?'                             # optional fraction
+)
+_EPOCH_RE = re.compile(r'\d{10}(\d{3})?')
+
+_DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def parse_frame_key(key):
+    '''
+    Parses a frame key into FrameKey(key, camera_id, timestamp, extension).
+
+    `key` in the result is the decoded key (usable for get_object) and `timestamp` is
+    ISO 8601 UTC, e.g. 2025-07-23T22:00:00Z or 2025-07-23T22:00:00.123Z.
+
+    Raises ValueError if the key does not match cameras/{cameraId}/frames/{timestamp}.{ext}
+    '''
+    if '%' in key or '+' in key:
+        key = unquote_plus(key)
+
+    match = _KEY_RE.fullmatch(key)
+    if not match:
+        raise ValueError(f"Invalid key format '{key}'. Expected cameras/{{cameraId}}/frames/{{timestamp}}.jpg")
+    camera_id, stamp, extension = match.groups()
+
+    iso = _ISO_RE.fullmatch(stamp)
+    if iso:
+        year, month, day, hour, _, minute, second, fraction = iso.groups()
+        if int(day) > _DAYS_IN_MONTH[int(month)] or (month == '02' and day == '29' and not _is_leap(int(year))):
+            raise ValueError(f"Invalid date in timestamp '{stamp}'")
+        timestamp = f"{year}-{month}-{day}T{hour}:{minute}:{second}"
+        if fraction:
+            timestamp += '.' + (fraction + '00')[:3] # normalise to milliseconds
+        return FrameKey(key, camera_id, timestamp + 'Z', extension.lower())
+
+    epoch = _EPOCH_RE.fullmatch(stamp)
+    if epoch:
+        millis = epoch.group(1)
+        seconds = int(stamp[:10])
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+        if millis:
+            timestamp += '.' + millis
+        return FrameKey(key, camera_id, timestamp + 'Z', extension.lower())
+
+    raise ValueError(f"Invalid timestamp '{stamp}' in key '{key}'")
+
+
+def build_frame_key(camera_id, timestamp, extension='jpg'):
+    '''
+    Builds cameras/{cameraId}/frames/{timestamp}.{ext} from an ISO timestamp
+    (a trailing 'Z' is dropped to match the existing key format) or from epoch seconds
+    '''
+    if not isinstance(timestamp, str):
+        seconds = int(timestamp)
+        millis = int(round((timestamp - seconds) * 1000))
+        if millis == 1000: # rounding pushed us into the next second
+            seconds, millis = seconds + 1, 0
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+        if millis:
+            timestamp += f".{millis:03d}"
+    return f"cameras/{camera_id}/frames/{timestamp.rstrip('Z')}.{extension}"
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
@@ -1,9 +1,239 @@
 import json
-import boto3
 import os
+import base64
+import heapq
+import itertools
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 
-s3 = boto3.client('s3')
+from aws_clients import get_client
+from metrics import emf_handler
+from result_layout import ROLLUP_PREFIX, ROLLUP_SUFFIX, hour_bounds, parse_result_key, partition, read_rollup, rollup_key
+from results_index import RESULTS_PREFIX
 
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Bounded pool for concurrent get_object calls. Keep it <= AWS_MAX_POOL_CONNECTIONS (aws_clients),
+# otherwise threads queue on botocore's connection pool
+MAX_WORKERS = int(os.environ.get('FETCH_WORKERS', '16'))
+# History window when a request sends no `since`; 0 (default) returns the whole history, paged
+HISTORY_HOURS = int(os.environ.get('DEFAULT_HISTORY_HOURS', '0'))
+EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def _parse_time(value):
+    '''
+    Accepts ISO 8601 (2025-08-11T11:32:09Z) or epoch seconds and returns an aware datetime
+    '''
+    if value.replace('.', '', 1).isdigit():
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _encode_token(key):
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def _decode_token(token):
+    return base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+
+
+def _is_flat_key(key):
+    # rekognition_results/{uuid}.json, as stored before the partitioned layout
+    return key.startswith(RESULTS_PREFIX) and '/' not in key[len(RESULTS_PREFIX):]
+
+
+def iter_result_keys(bucket_name, start_after=None, since=None, until=None, flat_only=False):
+    '''
+    Flat layout (?layout=flat, results stored before the partitioned layout and not yet
+    compacted): yields the keys under rekognition_results/ after start_after whose
+    LastModified is inside [since, until], in key order, one listing page at a time.
+    flat_only skips the camera=/date=/hour= partitions (one common prefix per camera)
+    '''
+    params = {'Bucket': bucket_name, 'Prefix': RESULTS_PREFIX}
+    if flat_only:
+        params['Delimiter'] = '/'
+    if start_after:
+        params['StartAfter'] = start_after
+
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(**params):
+        for obj in page.get('Contents', []):
+            modified = obj['LastModified']
+            if (since and modified < since) or (until and modified > until):
+                continue
+            yield obj['Key']
+
+
+def page_results(bucket_name, limit, start_after, since, until, camera_id=None):
+    '''
+    Flat layout page: returns (results, next_start_after) like page_history.
+
+    The cameraId filter needs the bodies, so keys keep being listed and fetched until
+    `limit` results of the camera are collected or the listing ends; a page is only short
+    when it is the last one. The cursor is the key of the last result returned, a valid
+    StartAfter because S3 lists keys in lexicographic order
+    '''
+    keys = iter_result_keys(bucket_name, start_after, since, until)
+    if not camera_id:
+        keys = itertools.islice(keys, limit) # every key is a result: don't fetch past the page
+    results = []
+    for item in iter_results(bucket_name, keys, camera_id):
+        results.append(item)
+        if len(results) >= limit:
+            return results, item[0]
+    return results, None # Listing exhausted, no further pages
+
+
+def _fetch(bucket_name, key):
+    file_obj = get_client('s3').get_object(Bucket=bucket_name, Key=key)
+    return file_obj['Body'].read()
+
+
+def iter_results(bucket_name, keys, camera_id=None):
+    '''
+    Yields (key, raw_json_bytes) in key order while fetching bodies on a bounded thread pool.
+    At most MAX_WORKERS * 2 bodies are in flight or buffered at any time
+    '''
+    window = MAX_WORKERS * 2
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        pending = deque()
+        for key in keys:
+            pending.append((key, pool.submit(_fetch, bucket_name, key)))
+            if len(pending) >= window:
+                yield from _drain(pending.popleft(), camera_id)
+        for item in pending:
+            yield from _drain(item, camera_id)
+
+
+def _drain(item, camera_id):
+    key, future = item
+    raw = future.result()
+    # Flat keys don't carry the camera, so the camera filter needs the body
+    if camera_id and json.loads(raw).get('cameraId') != camera_id:
+        return
+    yield key, raw
+
+
+def list_cameras(bucket_name):
+    '''
+    Camera ids that have per-frame results or rollups (one delimiter listing per prefix)
+    '''
+    cameras = set()
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for prefix in (RESULTS_PREFIX, ROLLUP_PREFIX):
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix + 'camera=', Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                cameras.add(common['Prefix'][len(prefix) + len('camera='):-1])
+    return sorted(cameras)
+
+
+def _list_range(bucket_name, prefix, start_after, stop_at):
+    # Keys under prefix after start_after and before stop_at, fetched one listing page at a time
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, StartAfter=start_after):
+        for obj in page.get('Contents', []):
+            if obj['Key'] >= stop_at:
+                return
+            yield obj
+
+
+def _rollup_records(bucket_name, camera, since_ms, until_ms, start_after):
+    s3 = get_client('s3')
+    floor = f"{ROLLUP_PREFIX}{partition(camera, since_ms / 1000)}"
+    if start_after and parse_result_key(start_after):
+        floor = max(floor, f"{ROLLUP_PREFIX}{parse_result_key(start_after)[1]}")
+    ceiling = rollup_key(partition(camera, until_ms / 1000)) + '~'
+    for obj in _list_range(bucket_name, f"{ROLLUP_PREFIX}camera={camera}/", floor, ceiling):
+        if not obj['Key'].endswith(ROLLUP_SUFFIX):
+            continue
+        hour_start, hour_end = hour_bounds(obj['Key'][len(ROLLUP_PREFIX):-len(ROLLUP_SUFFIX)])
+        records = read_rollup(
+            s3, bucket_name, obj['Key'],
+            since_ms if hour_start < since_ms else None,
+            until_ms if hour_end - 1 > until_ms else None,
+            size=obj['Size']
+        )
+        for record in records:
+            if not start_after or record['key'] > start_after:
+                yield record['key'], json.dumps(record['result']).encode('utf-8')
+
+
+def iter_history(bucket_name, since, until, camera_id=None, start_after=None):
+    '''
+    Yields (key, raw_json_bytes) from the partitioned layout in key order (camera, then time),
+    for results taken inside [since, until] with keys after start_after.
+
+    Per camera, the hourly rollups and the per-frame results compaction has not rolled up
+    yet are two key-ordered streams that are merged lazily. Listings start at the window
+    (or the cursor) and stop at its end, so a page never lists or fetches more than it returns
+    '''
+    since_ms, until_ms = int(since.timestamp() * 1000), int(until.timestamp() * 1000)
+    for camera in ([camera_id] if camera_id else list_cameras(bucket_name)):
+        # '~' sorts after every key of the camera, so this skips cameras wholly before the cursor
+        if start_after and f"{RESULTS_PREFIX}camera={camera}/~" < start_after:
+            continue
+        floor = f"{RESULTS_PREFIX}{partition(camera, since_ms / 1000)}/{since_ms:013d}"
+        ceiling = f"{RESULTS_PREFIX}{partition(camera, until_ms / 1000)}/{until_ms + 1:013d}"
+        frame_keys = (obj['Key'] for obj in _list_range(
+            bucket_name, f"{RESULTS_PREFIX}camera={camera}/", max(floor, start_after or ''), ceiling
+        ))
+        previous = None
+        for key, raw in heapq.merge(_rollup_records(bucket_name, camera, since_ms, until_ms, start_after),
+                                    iter_results(bucket_name, frame_keys), key=lambda item: item[0]):
+            if key != previous: # rolled up but not deleted yet: both streams have it
+                yield key, raw
+            previous = key
+
+
+def iter_unmigrated(bucket_name, since, until, camera_id=None, start_after=None):
+    '''
+    Yields (key, raw_json_bytes) for flat rekognition_results/{uuid}.json results that
+    compaction has not migrated into the partitioned layout yet, with LastModified inside
+    [since, until]. Once the migration has run this costs one empty listing
+    '''
+    keys = iter_result_keys(bucket_name, start_after, since, until, flat_only=True)
+    return iter_results(bucket_name, keys, camera_id)
+
+
+def page_history(bucket_name, limit, start_after, since, until, camera_id=None):
+    '''
+    Returns (results, next_start_after): up to `limit` (key, raw) pairs, and the last key as
+    the cursor when the page is full.
+
+    Partitioned results (iter_history) come first, then the flat results not migrated yet
+    (iter_unmigrated), so existing history stays visible until compaction has moved it. A
+    flat-key cursor means the partitioned results were all returned already
+    '''
+    if start_after and _is_flat_key(start_after):
+        items = iter_unmigrated(bucket_name, since, until, camera_id, start_after)
+    else:
+        items = itertools.chain(
+            iter_history(bucket_name, since, until, camera_id, start_after),
+            iter_unmigrated(bucket_name, since, until, camera_id)
+        )
+    results = []
+    for item in items:
+        results.append(item)
+        if len(results) >= limit:
+            return results, item[0]
+    return results, None
+
+
+def iter_ndjson(results):
+    '''
+    Yields one NDJSON line per (key, raw) result without re-serialising the whole page
+    '''
+    for key, raw in results:
+        if b'\n' in raw:
+            # Pretty-printed objects have to be compacted onto a single line
+            raw = json.dumps(json.loads(raw)).encode('utf-8')
+        yield b'{"key": ' + json.dumps(key).encode('utf-8') + b', "result": ' + raw + b'}\n'
+
+
+@emf_handler()
 def lambda_handler(event, context):
     bucket_name = os.environ.get('BUCKET_NAME')
     if not bucket_name:
@@ -11,31 +241,64 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps({'error': 'S3 bucket not configured in environment variables'})
         }
-    
+
+    # Query parameters: limit, continuation_token, cameraId, since, until, format (json|ndjson),
+    # layout (partitioned|flat)
+    params = (event or {}).get('queryStringParameters') or {}
     try:
-        # List objects in the S3 bucket
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix='rekognition_results/')
+        limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        start_after = _decode_token(params['continuation_token']) if params.get('continuation_token') else None
+        since = _parse_time(params['since']) if params.get('since') else None
+        until = _parse_time(params['until']) if params.get('until') else None
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid query parameters', 'details': str(e)})
+        }
+    camera_id = params.get('cameraId')
+    filtered = bool(since or until or camera_id) # a narrowed query may legitimately match nothing
+    output_format = params.get('format', 'json')
+    layout = params.get('layout', 'partitioned')
 
-        if 'Contents' not in response or not response['Contents']:
+    try:
+        if layout == 'flat':
+            # One page of results matching the time range (and camera)
+            keys, next_start_after = page_results(bucket_name, limit, start_after, since, until, camera_id)
+            results = keys
+        else:
+            # Camera/date/hour partitions and their rollups, then flat results not migrated yet;
+            # without ?since= that is every result (or the last HISTORY_HOURS when it is set)
+            until = until or datetime.now(timezone.utc)
+            since = since or (until - timedelta(hours=HISTORY_HOURS) if HISTORY_HOURS > 0 else EPOCH)
+            keys, next_start_after = page_history(bucket_name, limit, start_after, since, until, camera_id)
+            results = keys
+
+        if not keys and not start_after and not filtered:
             return {
                 'statusCode': 404,
                 'body': json.dumps({'error': 'No objects found in the S3 bucket'})
             }
-        
-        # Retrieve all files and read their contents
-        all_files_data = {}
-        for obj in response['Contents']:
-            file_key = obj['Key']
-            file_obj = s3.get_object(Bucket=bucket_name, Key=file_key)
-            file_content = file_obj['Body'].read().decode('utf-8')
 
+        # The cursor for the next page travels in a header so the body keeps its shape
+        headers = {}
+        if next_start_after:
+            headers['X-Continuation-Token'] = _encode_token(next_start_after)
+
+        if output_format == 'ndjson':
+            headers['Content-Type'] = 'application/x-ndjson'
+            body = b''.join(iter_ndjson(results)).decode('utf-8')
+        else:
             # Store content in dictionary using file name as key
-            all_files_data[file_key] = json.loads(file_content)
+            headers['Content-Type'] = 'application/json'
+            all_files_data = {key: json.loads(raw) for key, raw in results}
+            body = json.dumps(all_files_data)
 
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(all_files_data)
+            'headers': headers,
+            'body': body
         }
     except Exception as e:
         error_msg = f"Error retrieving files: {str(e)}"
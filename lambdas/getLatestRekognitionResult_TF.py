@@ -1,43 +1,58 @@
 import json
-import boto3
 import os
 
-# https://terrateam.io/blog/aws-lambda-function-with-terraform
+from aws_clients import get_client
+from metrics import emf_handler
+from result_layout import parse_result_key, read_result
+from results_index import read_latest_pointer, scan_latest_result_key, seed_latest_pointer
 
-s3 = boto3.client('s3')
+# https://terrateam.io/blog/aws-lambda-function-with-terraform
 
+@emf_handler()
 def lambda_handler(event, context):
+    s3 = get_client('s3')
     bucket_name = os.environ['BUCKET_NAME']
     if not bucket_name:
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'S3 bucket not configured in environment variables'})
         }
-    
+
+    # Optional ?cameraId=... narrows the lookup to a single camera
+    params = (event or {}).get('queryStringParameters') or {}
+    camera_id = params.get('cameraId')
+
     try:
-        # List objects in the S3 bucket and sort by LastModified timestamp
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix='rekognition_results/')
+        # Look up the latest result through the index pointer (O(1) requests)
+        pointer = read_latest_pointer(s3, bucket_name, camera_id)
+        if pointer:
+            latest_file_key = pointer['key']
+        elif camera_id:
+            # Per-camera pointers are the only way to find a camera's results
+            latest_file_key = None
+        else:
+            # Results stored before the index existed: scan every page once, then seed the index
+            latest_file_key = scan_latest_result_key(s3, bucket_name)
+            if latest_file_key:
+                seed_latest_pointer(s3, bucket_name, latest_file_key)
 
-        if 'Contents' not in response or not response['Contents']:
+        if not latest_file_key:
             return {
                 'statusCode': 404,
                 'body': json.dumps({'error': 'No objects found in the S3 bucket'})
             }
-        
-        # Find the latest file (sorted by last modified timestamp)
-        latest_file = max(response['Contents'], key=lambda obj: obj['LastModified'])
-        latest_file_key = latest_file['Key']
 
-        # Fetch the latest file from S3
-        file_obj = s3.get_object(Bucket=bucket_name, Key=latest_file_key)
-        file_content = file_obj['Body'].read().decode('utf-8')
+        # Fetch the latest file from S3 (from its hourly rollup if compaction already removed it)
+        file_content = read_result(s3, bucket_name, latest_file_key).decode('utf-8')
 
         # ZANE ADDED THIS
         rekognition_data = json.loads(file_content)
         image_id = os.path.basename(latest_file_key).replace('.json', '').replace('image_', '')
+        if parse_result_key(latest_file_key):
+            image_id = image_id.split('-', 1)[1] # partitioned keys lead with the epoch millis
         rekognition_data['imageId'] = image_id
 
-        
+
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
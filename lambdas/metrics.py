@@ -0,0 +1,395 @@
+'''
+Metrics shared by the lambdas and the stream processor container.
+
+Counters, gauges and histograms live in a process-wide registry (REGISTRY) and are
+exported two ways:
+- render_prometheus(): Prometheus text format; the container serves it on :5000/metrics (serve())
+- flush_emf(): CloudWatch Embedded Metric Format, one JSON log line per label set. The
+  lambdas flush at the end of every invocation (@emf_handler) and CloudWatch extracts the
+  metrics from the logs, so recording a metric never costs an API call
+
+instrument_client() hooks a boto3 client so every AWS call is counted and timed by
+service and operation (aws_requests_total, aws_request_seconds); aws_clients does this for
+every shared client.
+
+In EMF every label becomes a CloudWatch dimension and every distinct label set is a
+billed custom metric, so per-camera labels belong on the container (Prometheus) side.
+
+Standard library only, so it can be zipped next to any handler and copied into the
+container image like frame_keys.py.
+'''
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EMF_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SafeSight')
+EMF_MAX_VALUES = 100 # values per metric in one EMF document
+_UNITS = (('_seconds', 'Seconds'), ('_bytes', 'Bytes'), ('_total', 'Count'))
+
+
+class _Value:
+    '''
+    One counter or gauge time series
+    '''
+    __slots__ = ('value', 'emitted', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.emitted = 0.0 # counter value at the last EMF flush
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = float(value)
+
+    def take_delta(self):
+        with self._lock:
+            delta, self.emitted = self.value - self.emitted, self.value
+        return delta
+
+
+class _Histogram:
+    '''
+    One histogram time series: bucket counts for Prometheus, plus the raw values observed
+    since the last EMF flush (at most EMF_MAX_VALUES)
+    '''
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'pending', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.pending = []
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if len(self.pending) < EMF_MAX_VALUES:
+                self.pending.append(value)
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def take_pending(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+
+class Metric:
+    '''
+    A named metric family ('counter', 'gauge' or 'histogram') with fixed label names.
+
+    labels(...) returns the series for one set of label values. A metric without labels
+    can be used directly: counter.inc(), gauge.set(3), histogram.observe(0.2)
+    '''
+
+    def __init__(self, kind, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._function = None
+        self._emitted = {} # function-backed counters: label values -> value at the last EMF flush
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = _Histogram(self.buckets) if self.kind == 'histogram' else _Value()
+                    self._children[values] = child
+        return child
+
+    def remove(self, *values):
+        '''
+        Drops one series, e.g. for a camera this process no longer reads
+        '''
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def set_function(self, function):
+        '''
+        Reads the value at export time instead (counters and gauges): function() returns a
+        number, or {label values tuple: number} for a labelled metric
+        '''
+        self._function = function
+        return self
+
+    def samples(self):
+        '''
+        [(label values, series)], or [(label values, number)] for a function-backed metric
+        '''
+        if self._function is not None:
+            result = self._function()
+            if isinstance(result, dict):
+                return [(tuple(str(v) for v in (key if isinstance(key, tuple) else (key,))), float(value))
+                        for key, value in result.items()]
+            return [((), float(result))]
+        with self._lock:
+            return list(self._children.items())
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1.0):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def unit_for(name):
+    for suffix, unit in _UNITS:
+        if name.endswith(suffix):
+            return unit
+    return 'None'
+
+
+class Registry:
+    '''
+    Holds metric families by name. counter()/gauge()/histogram() return the existing
+    family when the name is already registered, so module-level definitions are safe in
+    warm Lambda containers and in modules imported more than once
+    '''
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, documentation, labelnames, **kwargs)
+            elif metric.kind != kind or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labelnames}")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get('counter', name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get('gauge', name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get('histogram', name, documentation, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self):
+        '''
+        Every metric in the Prometheus text exposition format (version 0.0.4)
+        '''
+        lines = []
+        for metric in self.metrics():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Metric {metric.name} failed to collect: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, series in samples:
+                if metric.kind != 'histogram':
+                    value = series if isinstance(series, float) else series.value
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, values)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), list(series.counts)):
+                    cumulative += count
+                    le = _labels(metric.labelnames, values, ('le', _number(bound)))
+                    lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labelnames, values)} {_number(series.sum)}")
+                lines.append(f"{metric.name}_count{_labels(metric.labelnames, values)} {series.count}")
+        return '\n'.join(lines) + '\n'
+
+    def flush_emf(self, namespace=EMF_NAMESPACE, dimensions=None, emit=print):
+        '''
+        Writes one EMF document per label set: counters as their increase since the last
+        flush, gauges as their current value, histograms as the values observed since the
+        last flush. Series with nothing new are left out. Returns the number of documents
+        '''
+        timestamp = int(time.time() * 1000)
+        documents = {}
+        for metric in self.metrics():
+            for values, series in metric.samples():
+                if metric.kind == 'histogram':
+                    value = series.take_pending()
+                elif metric.kind == 'counter':
+                    if isinstance(series, float):
+                        value = series - metric._emitted.get(values, 0.0)
+                        metric._emitted[values] = series
+                    else:
+                        value = series.take_delta()
+                else:
+                    value = series if isinstance(series, float) else series.value
+                if metric.kind != 'gauge' and not value:
+                    continue
+                labels = dict(dimensions or {})
+                labels.update(zip(metric.labelnames, values))
+                key = tuple(sorted(labels.items()))
+                document = documents.get(key)
+                if document is None:
+                    document = documents[key] = dict(labels, _aws={
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{'Namespace': namespace, 'Dimensions': [sorted(labels)], 'Metrics': []}]
+                    })
+                document['_aws']['CloudWatchMetrics'][0]['Metrics'].append({'Name': metric.name, 'Unit': unit_for(metric.name)})
+                document[metric.name] = value
+        for document in documents.values():
+            emit(json.dumps(document, separators=(',', ':')))
+        return len(documents)
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+
+def instrument_client(client, registry=None):
+    '''
+    Counts and times every call a boto3 client makes, by service, operation and outcome
+    (ok, or the error code / exception name). Latency includes botocore's own retries
+    '''
+    registry = registry or REGISTRY
+    requests = registry.counter('aws_requests_total', "AWS API calls", ('service', 'operation', 'outcome'))
+    latency = registry.histogram('aws_request_seconds', "AWS API call latency, retries included", ('service', 'operation'))
+
+    def finished(event_name, context, outcome):
+        started = context.pop('metrics_started', None)
+        _, service, operation = event_name.split('.', 2)
+        requests.labels(service, operation, outcome).inc()
+        if started is not None:
+            latency.labels(service, operation).observe(time.perf_counter() - started)
+
+    def before_call(context, **kwargs):
+        context['metrics_started'] = time.perf_counter()
+
+    def after_call(event_name, context, http_response=None, parsed=None, **kwargs):
+        ok = http_response is None or http_response.status_code < 300
+        finished(event_name, context, 'ok' if ok else (parsed or {}).get('Error', {}).get('Code', 'error'))
+
+    def after_call_error(event_name, context, exception=None, **kwargs):
+        finished(event_name, context, type(exception).__name__)
+
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
+    client.meta.events.register('after-call-error', after_call_error)
+    return client
+
+
+def emf_handler(namespace=EMF_NAMESPACE, registry=None):
+    '''
+    Decorates a Lambda handler so the metrics recorded during each invocation are flushed
+    as EMF when it returns or raises, with the function name as a dimension
+    '''
+    def decorate(handler):
+        @wraps(handler)
+        def wrapper(event, context):
+            try:
+                return handler(event, context)
+            finally:
+                try:
+                    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', handler.__module__)
+                    (registry or REGISTRY).flush_emf(namespace, {'FunctionName': function_name})
+                except Exception as e: # metrics must never fail the invocation
+                    print(f"Metrics flush error: {str(e)}")
+        return wrapper
+    return decorate
+
+
+def serve(port=5000, registry=None, host='0.0.0.0'):
+    '''
+    Serves GET /metrics (Prometheus text format) from a daemon thread. Returns the server
+    '''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # scrapes every few seconds would flood the task logs
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    return server
@@ -0,0 +1,154 @@
+'''
+Compact PPE result format for Rekognition detect_protective_equipment responses.
+
+The compact summary is what gets stored as the primary result object and what readers
+(getLatest, getAll) parse. It keeps, per person, the confidence, a quantised bounding box
+and the equipment found on each body part:
+
+{
+    "v": 1,
+    "cameraId": "cam-123",
+    "types": ["HEAD_COVER"],                 # equipment types checked (from the camera's tags)
+    "persons": [
+        {
+            "id": 0, "c": 99.8, "bb": [120, 40, 310, 900],
+            "eq": {"HEAD": [{"t": "HEAD_COVER", "c": 98.1, "bb": [180, 40, 90, 70], "cov": true}]}
+        }
+    ],
+    "summary": {"with": [0], "without": [], "indeterminate": []},
+    "HeadCoverings": [...]                   # same shape as before, for existing clients
+}
+
+Bounding boxes are [left, top, width, height] in thousandths of the frame and confidences are
+rounded to one decimal. The full Rekognition response can be kept as a gzip sidecar object.
+'''
+
+import gzip
+import json
+
+SCHEMA_VERSION = 1
+EQUIPMENT_TYPES = ('HEAD_COVER', 'FACE_COVER', 'HAND_COVER') # everything Rekognition PPE detects
+
+# Camera rekognition_tags (see raspberrypi-cli connect_camera --tags) -> Rekognition equipment type
+TAG_TO_EQUIPMENT = {
+    'hardhat': 'HEAD_COVER', 'hard-hat': 'HEAD_COVER', 'helmet': 'HEAD_COVER', 'head': 'HEAD_COVER',
+    'mask': 'FACE_COVER', 'face-mask': 'FACE_COVER', 'face': 'FACE_COVER',
+    'gloves': 'HAND_COVER', 'glove': 'HAND_COVER', 'hand': 'HAND_COVER',
+}
+
+
+def equipment_types_for_tags(tags):
+    '''
+    Maps a camera's rekognition_tags onto Rekognition equipment types.
+    Tags Rekognition can't detect (e.g. safety-vest, goggles) are skipped;
+    no usable tags means every equipment type. Accepts a list or a space-separated string
+    '''
+    if isinstance(tags, str):
+        tags = tags.split()
+    types = []
+    for tag in tags or []:
+        normalised = tag.strip().lower().replace('_', '-')
+        equipment = TAG_TO_EQUIPMENT.get(normalised) or (tag.upper() if tag.upper() in EQUIPMENT_TYPES else None)
+        if equipment and equipment not in types:
+            types.append(equipment)
+    return types or list(EQUIPMENT_TYPES)
+
+
+def _quantise_box(box):
+    if not box:
+        return None
+    return [
+        int(round(box.get('Left', 0) * 1000)),
+        int(round(box.get('Top', 0) * 1000)),
+        int(round(box.get('Width', 0) * 1000)),
+        int(round(box.get('Height', 0) * 1000))
+    ]
+
+
+def _confidence(value):
+    return round(value, 1) if value is not None else None
+
+
+def extract_equipment(rek_response, types=EQUIPMENT_TYPES):
+    '''
+    Returns every detection of the given equipment types as a flat list of
+    {'Type', 'BodyPart', 'PersonId', 'Confidence', 'BoundingBox', 'CoversBodyPart'}
+    '''
+    found = []
+    for person_index, person in enumerate(rek_response.get('Persons', [])):
+        for body_part in person.get('BodyParts', []):
+            for equipment in body_part.get('EquipmentDetections', []):
+                if equipment.get('Type') in types:
+                    found.append({
+                        'Type': equipment.get('Type'),
+                        'BodyPart': body_part.get('Name'),
+                        'PersonId': person.get('Id', person_index),
+                        'Confidence': equipment.get('Confidence'),
+                        'BoundingBox': equipment.get('BoundingBox'),
+                        'CoversBodyPart': equipment.get('CoversBodyPart', {}).get('Value')
+                    })
+    return found
+
+
+def summarize(rek_response, camera_id=None, types=EQUIPMENT_TYPES):
+    '''
+    Builds the compact summary dict (see module docstring) from a full Rekognition response
+    '''
+    persons = []
+    for person_index, person in enumerate(rek_response.get('Persons', [])):
+        equipment_by_part = {}
+        for body_part in person.get('BodyParts', []):
+            detections = [
+                {
+                    't': equipment.get('Type'),
+                    'c': _confidence(equipment.get('Confidence')),
+                    'bb': _quantise_box(equipment.get('BoundingBox')),
+                    'cov': equipment.get('CoversBodyPart', {}).get('Value')
+                }
+                for equipment in body_part.get('EquipmentDetections', [])
+                if equipment.get('Type') in types
+            ]
+            if detections:
+                equipment_by_part[body_part.get('Name')] = detections
+
+        persons.append({
+            'id': person.get('Id', person_index),
+            'c': _confidence(person.get('Confidence')),
+            'bb': _quantise_box(person.get('BoundingBox')),
+            'eq': equipment_by_part
+        })
+
+    # Rekognition only returns Summary when SummarizationAttributes were sent
+    summary = rek_response.get('Summary', {})
+    head_coverings = [
+        {'Type': item['Type'], 'Confidence': item['Confidence'], 'BoundingBox': item['BoundingBox']}
+        for item in extract_equipment(rek_response, ('HEAD_COVER',))
+        if item['BodyPart'] == 'HEAD'
+    ]
+
+    return {
+        'v': SCHEMA_VERSION,
+        'cameraId': camera_id,
+        'types': list(types),
+        'persons': persons,
+        'summary': {
+            'with': summary.get('PersonsWithRequiredEquipment', []),
+            'without': summary.get('PersonsWithoutRequiredEquipment', []),
+            'indeterminate': summary.get('PersonsIndeterminate', [])
+        },
+        'HeadCoverings': head_coverings
+    }
+
+
+def dumps_compact(summary):
+    '''
+    Serialises a summary without whitespace
+    '''
+    return json.dumps(summary, separators=(',', ':'))
+
+
+def compress_full_response(rek_response):
+    '''
+    Gzips the full Rekognition response for the optional sidecar object
+    '''
+    return gzip.compress(json.dumps(rek_response, separators=(',', ':')).encode('utf-8'))
@@ -0,0 +1,202 @@
+'''
+Time-partitioned layout for Rekognition results and the hourly rollups that compaction builds.
+
+Per-frame results (connectClientToRekognition_TF, the stream processor's frame dispatcher):
+    rekognition_results/camera={cameraId}/date=YYYY-MM-DD/hour=HH/{epoch ms}-{uuid}.json
+Rollups, one per camera-hour (compactRekognitionResults_TF):
+    rekognition_rollups/camera={cameraId}/date=YYYY-MM-DD/hour=HH.ndjson.gz
+
+Within a camera, keys sort by time (dates, hours and the zero-padded epoch millis all sort
+lexicographically), so a history query lists only the camera/dates it asks for, and a key
+is still a valid StartAfter-style cursor.
+
+A rollup is gzip NDJSON, one line per result in key order:
+    {"key": "<original per-frame key>", "ts": <epoch ms>, "result": {...}}
+The lines are compressed in blocks, each block its own gzip member, and the last member
+holds a small footer index:
+    {"index": {"v": 1, "cameraId": ..., "count": ..., "t0": ..., "t1": ...,
+               "blocks": [[offset, length, count, first ts, last ts], ...]}}
+zcat / gzip.decompress read the file as plain NDJSON; a reader that only needs part of the
+hour fetches the tail (one ranged GET), finds the footer and then fetches just the blocks
+that overlap its time range (a second ranged GET).
+'''
+
+import gzip
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+from results_index import RESULTS_PREFIX
+
+ROLLUP_PREFIX = 'rekognition_rollups/'
+ROLLUP_SUFFIX = '.ndjson.gz'
+ROLLUP_VERSION = 1
+BLOCK_RECORDS = 256 # results per gzip member
+FOOTER_TAIL = 16 * 1024 # bytes fetched from the end of a rollup to find the footer
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00' # gzip.compress(..., mtime=0): no name, no mtime
+CAMERA_ID_RE = re.compile(r'[A-Za-z0-9_.-]{1,128}') # one path segment, safe in keys and pointer names
+
+
+def check_camera_id(camera_id):
+    '''
+    Returns camera_id if it can go into a result key; raises ValueError otherwise
+    (a '/' would add a path segment that parse_result_key and compaction never see)
+    '''
+    if not isinstance(camera_id, str) or not CAMERA_ID_RE.fullmatch(camera_id):
+        raise ValueError(f"cameraId must match {CAMERA_ID_RE.pattern}")
+    return camera_id
+
+
+def partition(camera_id, when):
+    '''
+    Partition path for camera_id at epoch seconds `when`: camera=.../date=YYYY-MM-DD/hour=HH
+    '''
+    moment = datetime.fromtimestamp(when, tz=timezone.utc)
+    return f"camera={camera_id}/date={moment:%Y-%m-%d}/hour={moment:%H}"
+
+
+def result_key(camera_id, when=None, result_id=None):
+    '''
+    Key for a new per-frame result of camera_id taken at epoch seconds `when` (default now)
+    '''
+    when = time.time() if when is None else when
+    return f"{RESULTS_PREFIX}{partition(camera_id, when)}/{int(when * 1000):013d}-{result_id or uuid.uuid4()}.json"
+
+
+def parse_result_key(key):
+    '''
+    Returns (camera_id, partition, epoch ms) for a partitioned result key, or None for
+    anything else (e.g. flat rekognition_results/{uuid}.json keys written before the layout)
+    '''
+    if not key.startswith(RESULTS_PREFIX + 'camera='):
+        return None
+    parts = key[len(RESULTS_PREFIX):].split('/')
+    if len(parts) != 4 or not parts[1].startswith('date=') or not parts[2].startswith('hour='):
+        return None
+    try:
+        ts = int(parts[3].split('-', 1)[0])
+    except ValueError:
+        return None
+    return parts[0][len('camera='):], '/'.join(parts[:3]), ts
+
+
+def rollup_key(partition_path):
+    return f"{ROLLUP_PREFIX}{partition_path}{ROLLUP_SUFFIX}"
+
+
+def hour_bounds(partition_path):
+    '''
+    (start, end) of the partition's hour in epoch ms, end exclusive
+    '''
+    fields = dict(part.split('=', 1) for part in partition_path.split('/'))
+    start = datetime.strptime(f"{fields['date']} {fields['hour']}", '%Y-%m-%d %H').replace(tzinfo=timezone.utc)
+    start_ms = int(start.timestamp() * 1000)
+    return start_ms, start_ms + 3600 * 1000
+
+
+def build_rollup(records, camera_id=None, block_records=BLOCK_RECORDS):
+    '''
+    records: iterable of (key, ts ms, result dict). Returns (rollup bytes, footer index)
+    '''
+    records = sorted(records, key=lambda record: record[0])
+    members = []
+    blocks = []
+    offset = 0
+    for start in range(0, len(records), block_records):
+        block = records[start:start + block_records]
+        lines = b''.join(
+            json.dumps({'key': key, 'ts': ts, 'result': result}, separators=(',', ':')).encode('utf-8') + b'\n'
+            for key, ts, result in block
+        )
+        member = gzip.compress(lines, mtime=0)
+        blocks.append([offset, len(member), len(block), block[0][1], block[-1][1]])
+        members.append(member)
+        offset += len(member)
+    index = {
+        'v': ROLLUP_VERSION,
+        'cameraId': camera_id,
+        'count': len(records),
+        't0': min((record[1] for record in records), default=None),
+        't1': max((record[1] for record in records), default=None),
+        'blocks': blocks
+    }
+    members.append(gzip.compress(json.dumps({'index': index}, separators=(',', ':')).encode('utf-8') + b'\n', mtime=0))
+    return b''.join(members), index
+
+
+def _lines(data):
+    for line in gzip.decompress(data).splitlines():
+        if line:
+            record = json.loads(line)
+            if 'index' not in record:
+                yield record
+
+
+def parse_rollup(data):
+    '''
+    Every {"key", "ts", "result"} record of a whole rollup object, footer left out
+    '''
+    return list(_lines(data))
+
+
+def _find_footer(tail):
+    # The footer is the last gzip member; try candidate member starts from the end
+    position = len(tail)
+    while True:
+        position = tail.rfind(GZIP_HEADER, 0, position)
+        if position < 0:
+            return None
+        try:
+            record = json.loads(gzip.decompress(tail[position:]))
+        except (OSError, EOFError, ValueError):
+            continue
+        if isinstance(record, dict) and 'index' in record:
+            return record['index']
+
+
+def read_rollup(s3, bucket_name, key, since_ms=None, until_ms=None, size=None):
+    '''
+    Records of rollup `key` with since_ms <= ts <= until_ms.
+
+    Small rollups, or a window covering the whole rollup, cost one GET. Otherwise the footer
+    index picks the blocks to fetch: one ranged GET for the tail and one for the blocks
+    '''
+    def inside(record):
+        return (since_ms is None or record['ts'] >= since_ms) and (until_ms is None or record['ts'] <= until_ms)
+
+    if (since_ms is None and until_ms is None) or (size is not None and size <= 2 * FOOTER_TAIL):
+        data = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        return [record for record in _lines(data) if inside(record)]
+
+    tail = s3.get_object(Bucket=bucket_name, Key=key, Range=f"bytes=-{FOOTER_TAIL}")['Body'].read()
+    index = _find_footer(tail)
+    if index is None: # footer larger than the tail: read everything
+        data = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        return [record for record in _lines(data) if inside(record)]
+    wanted = [block for block in index['blocks']
+              if (since_ms is None or block[4] >= since_ms) and (until_ms is None or block[3] <= until_ms)]
+    if not wanted:
+        return []
+    start, end = wanted[0][0], wanted[-1][0] + wanted[-1][1] - 1
+    data = s3.get_object(Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}")['Body'].read()
+    return [record for record in _lines(data) if inside(record)]
+
+
+def read_result(s3, bucket_name, key):
+    '''
+    Body of result `key`, from the per-frame object or, once compaction has removed it,
+    from its hour's rollup. Raises s3.exceptions.NoSuchKey if neither has it
+    '''
+    try:
+        return s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        parsed = parse_result_key(key)
+        if parsed is None:
+            raise
+    _, partition_path, ts = parsed
+    for record in read_rollup(s3, bucket_name, rollup_key(partition_path), ts, ts):
+        if record['key'] == key:
+            return json.dumps(record['result']).encode('utf-8')
+    raise s3.exceptions.NoSuchKey(f"NoSuchKey: {key}")
@@ -0,0 +1,166 @@
+'''
+Latest-result index for the Rekognition results bucket.
+
+Every time connectClientToRekognition_TF stores a result it also writes a small
+pointer object per camera (plus one global pointer) that names the newest result key.
+The stream processor's frame dispatcher writes the same pointers once per batch.
+getLatestRekognitionResult_TF reads the pointer instead of listing the whole
+rekognition_results/ prefix, so the lookup is always two GETs (pointer + result)
+no matter how many results have piled up.
+
+Pointers live outside rekognition_results/ so they never show up in result listings:
+    rekognition_index/latest/{cameraId}.json
+    rekognition_index/latest/_all.json
+
+Writers race (concurrent invocations, the dispatcher's threads), and the one that finishes
+last is not always the one with the newest result. So every pointer carries resultAt, the
+time in its result key, and is only replaced by a pointer with a newer (or equal) resultAt:
+the current pointer is read, compared, and overwritten with a conditional PUT (IfMatch on
+the ETag read, IfNoneMatch for a new pointer), retried when another writer got in between.
+'''
+
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+RESULTS_PREFIX = 'rekognition_results/'
+INDEX_PREFIX = 'rekognition_index/latest/'
+ALL_CAMERAS = '_all' # pointer name for "latest across every camera"
+DEFAULT_CAMERA = 'default' # used when a caller does not send a cameraId
+POINTER_ATTEMPTS = 5 # conditional writes per pointer before giving up on a busy one
+CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict') # 412, 409
+
+
+def pointer_key(camera_id=None):
+    '''
+    Returns the S3 key of the latest-result pointer for camera_id
+    (or the global pointer when camera_id is None)
+    '''
+    return f"{INDEX_PREFIX}{camera_id or ALL_CAMERAS}.json"
+
+
+def result_time(result_key):
+    '''
+    Epoch seconds a result key was written for (partitioned keys lead with it), or 0 for
+    keys that don't carry one (flat keys from before the partitioned layout)
+    '''
+    from result_layout import parse_result_key # result_layout imports this module
+    parsed = parse_result_key(result_key)
+    return parsed[2] / 1000 if parsed else 0.0
+
+
+def update_pointer(s3, bucket_name, key, change):
+    '''
+    Read-modify-write of one pointer object. change(current pointer or None) returns the
+    pointer to write, or None to leave it as it is. The write is conditional on nobody
+    having changed the pointer since it was read; on a conflict the pointer is read again.
+
+    Returns the pointer now stored (None if there is none)
+    '''
+    for _ in range(POINTER_ATTEMPTS):
+        try:
+            file_obj = s3.get_object(Bucket=bucket_name, Key=key)
+            current, etag = json.loads(file_obj['Body'].read().decode('utf-8')), file_obj['ETag']
+        except s3.exceptions.NoSuchKey:
+            current, etag = None, None
+        pointer = change(current)
+        if pointer is None:
+            return current
+        try:
+            s3.put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=json.dumps(pointer),
+                ContentType='application/json',
+                **({'IfMatch': etag} if etag else {'IfNoneMatch': '*'})
+            )
+            return pointer
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in CONFLICT_CODES:
+                raise
+    raise RuntimeError(f"Pointer {key} kept changing, gave up after {POINTER_ATTEMPTS} attempts")
+
+
+def _if_newer(pointer):
+    # change() for update_pointer: replace the current pointer unless it names a newer result
+    return lambda current: None if current and current.get('resultAt', 0) > pointer['resultAt'] else pointer
+
+
+def write_latest_pointer(s3, bucket_name, result_key, camera_id=None, stored_at=None):
+    '''
+    Points the camera's pointer and the global pointer at result_key, unless they already
+    name a newer result (see the module docstring)
+    '''
+    pointer = {
+        'key': result_key,
+        'cameraId': camera_id or DEFAULT_CAMERA,
+        'resultAt': result_time(result_key),
+        'storedAt': stored_at if stored_at is not None else time.time()
+    }
+    for key in (pointer_key(camera_id or DEFAULT_CAMERA), pointer_key()):
+        update_pointer(s3, bucket_name, key, _if_newer(pointer))
+    return pointer
+
+
+def seed_latest_pointer(s3, bucket_name, result_key):
+    '''
+    Seeds the index from a scanned key whose camera the caller doesn't know. A partitioned
+    key names its camera, so both pointers are written; a flat key could be any camera's,
+    so only the global pointer is
+    '''
+    from result_layout import parse_result_key # result_layout imports this module
+    parsed = parse_result_key(result_key)
+    if parsed:
+        return write_latest_pointer(s3, bucket_name, result_key, parsed[0])
+    pointer = {'key': result_key, 'cameraId': None, 'resultAt': result_time(result_key), 'storedAt': time.time()}
+    update_pointer(s3, bucket_name, pointer_key(), _if_newer(pointer))
+    return pointer
+
+
+def write_latest_pointers(s3, bucket_name, result_keys, stored_at=None, executor=None):
+    '''
+    Bulk form of write_latest_pointer for a batch of results: one pointer update per
+    camera in result_keys ({cameraId: result key}) plus a single global one for the
+    newest of them, instead of two per result. Each update is a GET and a PUT, so the
+    per-camera ones run on executor when one is given
+    '''
+    stored_at = stored_at if stored_at is not None else time.time()
+    pointers = [
+        {'key': result_key, 'cameraId': camera_id or DEFAULT_CAMERA, 'resultAt': result_time(result_key), 'storedAt': stored_at}
+        for camera_id, result_key in result_keys.items()
+    ]
+    if not pointers:
+        return []
+
+    def update(pointer):
+        update_pointer(s3, bucket_name, pointer_key(pointer['cameraId']), _if_newer(pointer))
+    list(executor.map(update, pointers) if executor else map(update, pointers))
+    update_pointer(s3, bucket_name, pointer_key(), _if_newer(max(pointers, key=lambda pointer: pointer['resultAt'])))
+    return pointers
+
+
+def read_latest_pointer(s3, bucket_name, camera_id=None):
+    '''
+    Returns the pointer dict for camera_id (or the global pointer), or None if
+    no pointer has been written yet
+    '''
+    try:
+        file_obj = s3.get_object(Bucket=bucket_name, Key=pointer_key(camera_id))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(file_obj['Body'].read().decode('utf-8'))
+
+
+def scan_latest_result_key(s3, bucket_name, prefix=RESULTS_PREFIX):
+    '''
+    Fallback for buckets written before the index existed: walks every page of the
+    prefix (not just the first 1000 keys) and returns the newest key, or None
+    '''
+    latest = None
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if latest is None or obj['LastModified'] > latest['LastModified']:
+                latest = obj
+    return latest['Key'] if latest else None
@@ -4,6 +4,9 @@ from .cam_info_management import (
     update_camera,
     delete_camera,
     list_cameras,
-    load_camera
+    load_camera,
+    export_cameras,
+    import_cameras
 )
-from .start_cam_stream import start_cam_stream
\ No newline at end of file
+from .start_cam_stream import start_cam_stream
+from .stream_supervisor import start_all
@@ -1,36 +1,16 @@
 """
 This script contains all the camera information methods
-No other file should interact directly with the cameras.json file
-All interactions with the cameras.json file will happen here
+No other file should interact directly with the saved cameras
+All interactions with the camera registry (cameras.json, or cameras.db, see
+camera_registry) will happen here
 
 TODO save camera data to AWS and use that instead of a local json file
 """
 import json
-import os
+import sys
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-CAMERA_CONFIG_FILE = os.path.join(SCRIPT_DIR, "./cameras.json")
-
-def _load_configs():
-    """
-    PRIVATE METHOD
-
-    Returns the existing json file if it exists. If it does not
-    exist, then it returns empty
-    """
-    if not os.path.exists(CAMERA_CONFIG_FILE):
-        return {}
-    with open(CAMERA_CONFIG_FILE, "r") as f:
-        return json.load(f)
-
-def _save_configs(data):
-    """
-    PRIVATE METHOD
-    
-    Saves passed data to the json file
-    """
-    with open(CAMERA_CONFIG_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+from .camera_registry import get_registry
+from .pipeline_builder import DEFAULT_SNAPSHOT_INTERVAL, PRESETS, PROFILE_ORDER, SNAPSHOT_MODES
 
 # TODO save this data to s3
 def connect_camera(args):
@@ -44,16 +24,18 @@ def connect_camera(args):
     - room - name of the room camera is placed in
     - tags - rekognition tags to check for
     - connection_type - kind of connection (either rtsp or v4l2)
+    - profile, preset, input_format - how v4l2 video is encoded (see pipeline_builder)
+    - snapshot_mode, snapshot_interval - JPEG snapshots uploaded from the Pi (see snapshot_uploader)
     """
-    configs = _load_configs()
-
     # Add the initial camera info
-    configs[args.cam_name] = {
+    camera = {
         "stream_name": args.stream_name,
         "room": args.room,
         "rekognition_tags": args.tags,
         "aws_region": args.region,
-        "connection_type": args.connection_type # rtsp (wifi), or v4l2 (usb)
+        "connection_type": args.connection_type, # rtsp (wifi), or v4l2 (usb)
+        "snapshot_mode": args.snapshot_mode, # off, tee or only, see pipeline_builder
+        "snapshot_interval": args.snapshot_interval
     }
 
     # For rtsp cameras, build the uri and add that to the configs
@@ -61,20 +43,55 @@ def connect_camera(args):
         cam_user = input("Enter the wireless camera's username: ")
         cam_password = input("Enter the wireless camera's password: ")
         cam_ip = input("Enter the camera's IP address: ")
-        configs[args.cam_name]["uri"] = f"rtsp://{cam_user}:{cam_password}@{cam_ip}/stream1"
+        camera["uri"] = f"rtsp://{cam_user}:{cam_password}@{cam_ip}/stream1"
 
     # For v4l2 cameras, get the device location and add that to the configs
     elif args.connection_type == "v4l2":
         cam_device = input("Enter the USB camera's device location: ")
-        configs[args.cam_name]["device"] = cam_device
+        camera["device"] = cam_device
+        camera["profile"] = args.profile # see pipeline_builder
+        camera["preset"] = args.preset
+        camera["input_format"] = args.input_format
     
     else:
         print(f"ERROR: {args.connection_type} is not a valid type, enter either 'rtsp' for wireless or 'v4l2' for USB")
         return
         
-    _save_configs(configs)
+    get_registry().put(args.cam_name, camera)
     print(f"Saved camera '{args.cam_name}' successfully!")
 
+def _prompt_choice(label, current, choices):
+    """
+    PRIVATE METHOD
+
+    Asks for one of choices until it gets one; a blank answer keeps current
+    """
+    while True:
+        answer = input(f"{label} ({', '.join(choices)}) [{current}]: ").strip()
+        if not answer:
+            return current
+        if answer in choices:
+            return answer
+        print(f"'{answer}' is not one of {', '.join(choices)}, try again.")
+
+def _prompt_interval(current):
+    """
+    PRIVATE METHOD
+
+    Asks for the seconds between snapshots until it gets a number above 0; a blank answer keeps current
+    """
+    while True:
+        answer = input(f"Seconds between snapshots [{current}]: ").strip()
+        if not answer:
+            return current
+        try:
+            interval = float(answer)
+        except ValueError:
+            interval = 0
+        if interval > 0:
+            return interval
+        print(f"'{answer}' is not a number of seconds above 0, try again.")
+
 def update_camera(args):
     """
     Prompts the user to update camera configuration interactively.
@@ -82,13 +99,12 @@ def update_camera(args):
     ### Args Passed
     - cam_name - name of the camera in memory
     """
-    configs = _load_configs()
     name = args.cam_name
-    if name not in configs:
+    camera = get_registry().get(name)
+    if camera is None:
         print(f"Error: Camera '{name}' not found")
         return
     
-    camera = configs[name]
     print(f"Updating camera '{name}'. Leave responses blank to keep current values.")
 
     # Current values
@@ -107,7 +123,16 @@ def update_camera(args):
     camera['room'] = new_room
     camera['rekognition_tags'] = new_tags
 
-    _save_configs(configs) # Save data to memory
+    # Only snapshot settings pipeline_builder accepts are saved
+    camera['snapshot_mode'] = _prompt_choice("Snapshot mode", camera.get('snapshot_mode') or 'off', SNAPSHOT_MODES)
+    camera['snapshot_interval'] = _prompt_interval(camera.get('snapshot_interval') or DEFAULT_SNAPSHOT_INTERVAL)
+
+    # USB cameras also choose how their video is encoded; only values pipeline_builder accepts are saved
+    if camera.get('connection_type') == 'v4l2':
+        camera['profile'] = _prompt_choice("Profile", camera.get('profile') or 'auto', ["auto"] + PROFILE_ORDER)
+        camera['preset'] = _prompt_choice("Preset", camera.get('preset') or 'default', list(PRESETS))
+
+    get_registry().put(name, camera) # Save data to memory
 
     # Print updated info as validation
     print(f"Camera '{name}' updated successfully! New values")
@@ -119,12 +144,10 @@ def load_camera(cam_name):
     """
     Loads a camera from memory with cam_name as a reference
     """
-    configs = _load_configs()
-    if cam_name not in configs:
+    camera = get_registry().get(cam_name)
+    if camera is None:
         print(f"Error: Camera '{cam_name}' not found.")
         return None
-
-    camera = configs[cam_name]
     
     # Print all stored fields
     print(f"\nLoaded camera '{cam_name}':")
@@ -138,6 +161,13 @@ def load_camera(cam_name):
 
     return camera
 
+def load_all_cameras():
+    """
+    Returns every saved camera as {cam_name: camera config}, without printing anything
+    (used by the start_all supervisor)
+    """
+    return get_registry().all()
+
 
 def delete_camera(args):
     """
@@ -147,9 +177,8 @@ def delete_camera(args):
     - cam_name - name of the camera in memory
     """
     # Load the camera from memory
-    configs = _load_configs()
     name = args.cam_name
-    if name not in configs:
+    if get_registry().get(name) is None:
         print(f"Error: Camera '{name}' not found.")
         return
     
@@ -159,22 +188,63 @@ def delete_camera(args):
         print("Deletion cancelled.")
         return
     
-    del configs[name]
-    _save_configs(configs)
+    if not get_registry().delete(name):
+        print(f"Error: Camera '{name}' was deleted in the meantime.")
+        return
     print(f"Camera '{name}' deleted successfully!")
 
 def list_cameras(args):
     """
     List all currently saved cameras
 
-    NOTE: No args passed
+    ### Args passed
+    - room - only list the cameras of this room (optional)
     """
-    configs = _load_configs()
+    room = getattr(args, "room", None)
+    configs = get_registry().find(room=room) if room else get_registry().all()
     if not configs:
-        print("No cameras saved yet.")
+        print(f"No cameras saved in room '{room}'." if room else "No cameras saved yet.")
     else:
         for name, data in configs.items():
             print(f"\n{name}:")
             print(f"  Stream: {data['stream_name']}")
             print(f"  Room: {data['room']}")
-            print(f"  Tags: {', '.join(data['rekognition_tags'])}")
\ No newline at end of file
+            print(f"  Tags: {', '.join(data['rekognition_tags'])}")
+
+def export_cameras(args):
+    """
+    Writes every saved camera to a json file ({cam_name: camera config}), or to stdout
+
+    ### Args passed
+    - file - file to write (optional, stdout when missing)
+    """
+    configs = get_registry().all()
+    if not args.file:
+        json.dump(configs, sys.stdout, indent=4)
+        print()
+        return
+    with open(args.file, "w") as f:
+        json.dump(configs, f, indent=4)
+    print(f"Exported {len(configs)} cameras to '{args.file}'.")
+
+def import_cameras(args):
+    """
+    Saves every camera of a json file ({cam_name: camera config}, e.g. from export_cameras
+    or an old cameras.json) in one write
+
+    ### Args passed
+    - file - file to read
+    - replace - delete every saved camera that is not in the file
+    """
+    with open(args.file, "r") as f:
+        configs = json.load(f)
+
+    # Validation check: every camera needs what start_stream reads
+    required = ("stream_name", "aws_region", "connection_type")
+    broken = [name for name, camera in configs.items() if not all(camera.get(key) for key in required)]
+    if broken:
+        print(f"ERROR: Cameras missing {', '.join(required)}: {', '.join(broken)}. Nothing imported.")
+        return
+
+    get_registry().put_many(configs, replace=args.replace)
+    print(f"Imported {len(configs)} cameras from '{args.file}'" + (" (replaced all others)." if args.replace else "."))
@@ -0,0 +1,264 @@
+"""
+This script holds the saved cameras. cam_info_management is the only caller; everything
+else goes through it
+
+Two backends with the same methods (get, all, find, put, put_many, delete):
+- JsonRegistry (default) - cameras.json, readable and editable by hand
+    - writes go to a temporary file that is renamed over cameras.json, so a reader (or a
+      crash half-way) never sees half a file
+    - read-modify-write runs under an exclusive lock on cameras.json.lock, so the
+      supervisor and a CLI user updating cameras at the same time don't lose each
+      other's changes
+    - reads come from an in-process cache that is only re-parsed when the file's
+      mtime/size/inode change
+- SqliteRegistry - cameras.db, for sites with hundreds of cameras: one row per camera,
+  indexed on room and stream_name, so lookups and updates don't touch the other cameras
+
+Pick the backend with CAMERA_REGISTRY=json|sqlite (and CAMERA_REGISTRY_PATH to move the
+file). Move existing cameras over with export_cameras / import_cameras.
+"""
+
+# Internal OS imports
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # not on Windows; writes there are atomic but not locked
+    fcntl = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE = os.path.join(SCRIPT_DIR, "cameras.json")
+SQLITE_FILE = os.path.join(SCRIPT_DIR, "cameras.db")
+
+class JsonRegistry:
+    """
+    Cameras in a json file ({cam_name: camera config})
+
+    ### Args
+    - path - json file (created on the first write)
+    """
+    def __init__(self, path=JSON_FILE):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._cache = {}
+        self._signature = None # (mtime_ns, size, inode) of the file the cache was read from
+        self._mutex = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _configs(self):
+        """
+        PRIVATE METHOD
+
+        The cached cameras, re-read if the file changed since
+        """
+        with self._mutex:
+            signature = self._stat()
+            if signature != self._signature:
+                if signature is None:
+                    self._cache = {}
+                else:
+                    with open(self.path, "r") as f:
+                        self._cache = json.load(f)
+                self._signature = signature
+            return self._cache
+
+    @contextmanager
+    def _locked(self):
+        """
+        PRIVATE METHOD
+
+        Exclusive lock for a read-modify-write
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write(self, configs):
+        """
+        PRIVATE METHOD
+
+        Write to a temporary file next to the real one, then rename it into place
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".cameras-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(configs, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._mutex:
+            self._cache = configs
+            self._signature = self._stat()
+
+    @contextmanager
+    def _update(self):
+        """
+        PRIVATE METHOD
+
+        Yields a fresh copy of the cameras to change; written back when the block exits
+        """
+        with self._locked():
+            configs = copy.deepcopy(self._configs()) # under the lock: nobody writes in between
+            yield configs
+            self._write(configs)
+
+    def get(self, cam_name):
+        camera = self._configs().get(cam_name)
+        return copy.deepcopy(camera)
+
+    def all(self):
+        return copy.deepcopy(self._configs())
+
+    def find(self, room=None, stream_name=None):
+        return {
+            name: copy.deepcopy(camera) for name, camera in self._configs().items()
+            if (room is None or camera.get("room") == room)
+            and (stream_name is None or camera.get("stream_name") == stream_name)
+        }
+
+    def put(self, cam_name, camera):
+        with self._update() as configs:
+            configs[cam_name] = camera
+
+    def put_many(self, cameras, replace=False):
+        """
+        Saves every camera of {cam_name: camera} in one write; replace drops all others
+        """
+        with self._update() as configs:
+            if replace:
+                configs.clear()
+            configs.update(cameras)
+
+    def delete(self, cam_name):
+        """
+        Returns False if there was no such camera
+        """
+        with self._update() as configs:
+            return configs.pop(cam_name, None) is not None
+
+class SqliteRegistry:
+    """
+    Cameras in a SQLite database, one row per camera
+
+    ### Args
+    - path - database file (created with its tables on first use)
+    """
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._mutex = threading.Lock()
+        # 30s busy timeout: another process's write transaction waits instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL") # readers don't block the writer
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS cameras (
+                name TEXT PRIMARY KEY,
+                stream_name TEXT,
+                room TEXT,
+                config TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cameras_room ON cameras (room);
+            CREATE INDEX IF NOT EXISTS cameras_stream_name ON cameras (stream_name);
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._mutex:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._mutex:
+            rows = self._db.execute(sql, params).fetchall()
+        return {name: json.loads(config) for name, config in rows}
+
+    @staticmethod
+    def _row(cam_name, camera):
+        return (cam_name, camera.get("stream_name"), camera.get("room"), json.dumps(camera))
+
+    def get(self, cam_name):
+        return self._query("SELECT name, config FROM cameras WHERE name = ?", (cam_name,)).get(cam_name)
+
+    def all(self):
+        return self._query("SELECT name, config FROM cameras ORDER BY rowid")
+
+    def find(self, room=None, stream_name=None):
+        clauses, params = [], []
+        if room is not None:
+            clauses.append("room = ?")
+            params.append(room)
+        if stream_name is not None:
+            clauses.append("stream_name = ?")
+            params.append(stream_name)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT name, config FROM cameras{where} ORDER BY rowid", params)
+
+    def put(self, cam_name, camera):
+        self.put_many({cam_name: camera})
+
+    def put_many(self, cameras, replace=False):
+        """
+        Saves every camera of {cam_name: camera} in one transaction; replace drops all others
+        """
+        with self._transaction() as db:
+            if replace:
+                db.execute("DELETE FROM cameras")
+            db.executemany(
+                "INSERT INTO cameras (name, stream_name, room, config) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET stream_name = excluded.stream_name, "
+                "room = excluded.room, config = excluded.config",
+                [self._row(name, camera) for name, camera in cameras.items()]
+            )
+
+    def delete(self, cam_name):
+        """
+        Returns False if there was no such camera
+        """
+        with self._transaction() as db:
+            return db.execute("DELETE FROM cameras WHERE name = ?", (cam_name,)).rowcount > 0
+
+_registry = None
+
+def get_registry():
+    """
+    The registry picked by CAMERA_REGISTRY (json by default), created once per process
+    """
+    global _registry
+    if _registry is None:
+        backend = os.environ.get("CAMERA_REGISTRY", "json")
+        path = os.environ.get("CAMERA_REGISTRY_PATH")
+        if backend == "sqlite":
+            _registry = SqliteRegistry(path or SQLITE_FILE)
+        elif backend == "json":
+            _registry = JsonRegistry(path or JSON_FILE)
+        else:
+            raise ValueError(f"ERROR: Unknown CAMERA_REGISTRY '{backend}'. Must be 'json' or 'sqlite'.")
+    return _registry
@@ -0,0 +1,274 @@
+"""
+This script builds the gst-launch command line for a saved camera
+
+USB (v4l2) cameras can be streamed with one of three profiles:
+- passthrough - the camera already emits H.264: no decode, no encode
+- v4l2h264 - MJPEG decoded and encoded by the Pi's hardware H.264 encoder (v4l2h264enc)
+- x264 - MJPEG decoded and encoded in software (x264enc); works everywhere but one or two
+  cameras use up a Pi's CPU
+
+Cameras pick a profile with "profile" in cameras.json ("auto" when missing). A profile
+whose GStreamer elements aren't installed falls back to the next one in PROFILE_ORDER,
+and "auto" takes the first that is available (passthrough only for cameras saved with
+"input_format": "h264"; an explicit "passthrough" implies it). Elements are probed once
+per run with gst-inspect-1.0.
+
+Resolution, framerate and bitrate come from "preset" (a PRESETS name, "default" when
+missing), and any of "width", "height", "fps", "bitrate" saved on the camera override it.
+RTSP cameras already send H.264 and are always passed through.
+
+With "snapshot_mode" 'tee' the pipeline also writes one JPEG every "snapshot_interval"
+seconds for snapshot_uploader to upload; with 'only' it writes the JPEGs and doesn't
+stream at all (sites with little upload bandwidth). MJPEG cameras' own JPEGs are used
+as-is; H.264 cameras' video is decoded and re-encoded for them.
+"""
+
+# Internal OS imports
+import os
+import subprocess
+from fractions import Fraction
+
+# gst-inspect executable used to probe elements; point GST_INSPECT somewhere else to fake it
+GST_INSPECT = os.environ.get("GST_INSPECT", "gst-inspect-1.0")
+
+PRESETS = {
+    "low": {"width": 640, "height": 480, "fps": 10, "bitrate": 500},
+    "default": {"width": 800, "height": 600, "fps": 15, "bitrate": 1000}, # kbit/s
+    "hd": {"width": 1280, "height": 720, "fps": 15, "bitrate": 2000},
+    "full_hd": {"width": 1920, "height": 1080, "fps": 15, "bitrate": 4000}
+}
+
+# Fallback order, cheapest on the CPU first
+PROFILE_ORDER = ["passthrough", "v4l2h264", "x264"]
+
+# Elements each profile needs on top of v4l2src, h264parse and kvssink
+PROFILE_ELEMENTS = {
+    "passthrough": [],
+    "v4l2h264": ["jpegdec", "videoconvert", "v4l2h264enc"],
+    "x264": ["jpegdec", "videoconvert", "x264enc"]
+}
+COMMON_ELEMENTS = ["v4l2src", "h264parse", "kvssink"]
+
+# Snapshots (see snapshot_uploader): 'tee' streams and writes JPEGs, 'only' just writes JPEGs
+SNAPSHOT_MODES = ["off", "tee", "only"]
+DEFAULT_SNAPSHOT_INTERVAL = 5.0 # seconds
+SNAPSHOT_QUALITY = 85 # jpegenc quality, when snapshots have to be encoded (H.264 cameras)
+SNAPSHOT_INCOMING_MAX = 100 # multifilesink keeps at most this many files not yet picked up
+SNAPSHOT_ELEMENTS = {
+    "mjpeg": ["videorate", "multifilesink"],
+    "h264": ["avdec_h264", "videorate", "jpegenc", "multifilesink"]
+}
+
+_probed = {}
+
+def element_available(element):
+    """
+    True if gst-inspect knows the element, False if not, None if gst-inspect can't be run.
+    Results are kept for the rest of the run
+    """
+    if element not in _probed:
+        try:
+            result = subprocess.run(
+                [GST_INSPECT, element],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            _probed[element] = result.returncode == 0
+        except FileNotFoundError:
+            _probed[element] = None
+    return _probed[element]
+
+def available_profiles(candidates=PROFILE_ORDER, probe=element_available):
+    """
+    Profiles (of candidates) whose elements are all installed, in PROFILE_ORDER.
+    Returns None if nothing could be probed (GStreamer tools missing)
+    """
+    if probe(COMMON_ELEMENTS[0]) is None:
+        return None
+    if not all(probe(element) for element in COMMON_ELEMENTS):
+        return []
+    return [
+        profile for profile in PROFILE_ORDER
+        if profile in candidates and all(probe(element) for element in PROFILE_ELEMENTS[profile])
+    ]
+
+def choose_profile(camera, available=None):
+    """
+    Profile to stream a v4l2 camera with
+
+    ### Args
+    - camera - camera config as saved in cameras.json
+    - available - profiles that can run here (default: probe with gst-inspect)
+
+    Raises:
+        ValueError:          On an unknown profile, or if no profile can run.
+    """
+    requested = camera.get("profile") or "auto"
+    if requested != "auto" and requested not in PROFILE_ORDER:
+        raise ValueError(f"ERROR: Unknown profile '{requested}'. Must be 'auto' or one of {', '.join(PROFILE_ORDER)}.")
+
+    if requested != "auto":
+        candidates = PROFILE_ORDER[PROFILE_ORDER.index(requested):]
+    elif camera.get("input_format") == "h264":
+        candidates = PROFILE_ORDER
+    else:
+        # Only cameras that emit H.264 can be passed through
+        candidates = PROFILE_ORDER[1:]
+
+    if available is None:
+        available = available_profiles(candidates)
+    if available is None:
+        # Nothing to probe with: trust an explicit choice, else the software encoder that always worked
+        return candidates[0] if requested != "auto" else "x264"
+
+    for profile in candidates:
+        if profile in available:
+            if profile != candidates[0]:
+                print(f"Profile '{candidates[0]}' not available, falling back to '{profile}'.")
+            return profile
+    raise ValueError(f"ERROR: None of the profiles {', '.join(candidates)} can run here. Is GStreamer fully installed?")
+
+def resolve_preset(camera):
+    """
+    {width, height, fps, bitrate} for the camera: its preset, then its own overrides
+
+    Raises:
+        ValueError:          On an unknown preset name.
+    """
+    name = camera.get("preset") or "default"
+    if name not in PRESETS:
+        raise ValueError(f"ERROR: Unknown preset '{name}'. Must be one of {', '.join(PRESETS)}.")
+    settings = dict(PRESETS[name])
+    for key in settings:
+        if camera.get(key):
+            settings[key] = int(camera[key])
+    return settings
+
+def snapshot_settings(camera):
+    """
+    (mode, seconds between snapshots) for the camera
+
+    Raises:
+        ValueError:          On an unknown mode or a non-positive interval.
+    """
+    mode = camera.get("snapshot_mode") or "off"
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"ERROR: Unknown snapshot_mode '{mode}'. Must be one of {', '.join(SNAPSHOT_MODES)}.")
+    interval = float(camera.get("snapshot_interval") or DEFAULT_SNAPSHOT_INTERVAL)
+    if interval <= 0:
+        raise ValueError("ERROR: snapshot_interval must be more than 0 seconds.")
+    return mode, interval
+
+def _snapshot_branch(input_format, snapshot_dir, interval, teed):
+    """
+    PRIVATE METHOD
+
+    Elements that turn the video into one JPEG file every `interval` seconds in snapshot_dir
+    """
+    rate = Fraction(1 / interval).limit_denominator(1000)
+    rate = f"{rate.numerator}/{rate.denominator}"
+    branch = []
+    if input_format == "h264":
+        # H.264 frames depend on each other, so the queue behind the tee can't drop any
+        branch += ["queue", "!"] if teed else []
+        branch += [
+            "avdec_h264", "!",
+            "videorate", "drop-only=true", "!", f"video/x-raw,framerate={rate}", "!",
+            "jpegenc", f"quality={SNAPSHOT_QUALITY}", "!"
+        ]
+    else:
+        # MJPEG cameras: the camera's own JPEGs are kept, nothing is decoded or encoded.
+        # Behind a tee, a leaky queue drops snapshot frames rather than ever stalling the stream
+        branch += ["queue", "leaky=downstream", "max-size-buffers=5", "!"] if teed else []
+        branch += ["videorate", "drop-only=true", "!", f"image/jpeg,framerate={rate}", "!"]
+    return branch + [
+        "multifilesink", f"location={os.path.join(snapshot_dir, 'snapshot-%06d.jpg')}",
+        f"max-files={SNAPSHOT_INCOMING_MAX}"
+    ]
+
+def build_pipeline(camera, gst_launch="gst-launch-1.0", available=None, snapshot_dir=None):
+    """
+    gst-launch command line for a saved camera
+
+    ### Args
+    - camera - camera config as saved in cameras.json
+    - gst_launch - gst-launch executable
+    - available - profiles that can run here (default: probe with gst-inspect)
+    - snapshot_dir - directory snapshot JPEGs are written to (needed when snapshot_mode
+      is 'tee' or 'only', see snapshot_uploader)
+
+    Returns (command, profile) - profile is 'snapshot' for snapshot-only USB cameras
+
+    Raises:
+        ValueError:          On an unsupported connection_type, a missing device/uri, or
+                             an unknown/unavailable profile, preset or snapshot setting.
+    """
+    stream_name = camera["stream_name"]
+    region = camera["aws_region"]
+    conn_type = camera["connection_type"]
+    mode, interval = snapshot_settings(camera)
+    if mode != "off" and not snapshot_dir:
+        raise ValueError(f"ERROR: snapshot_mode '{mode}' needs a snapshot directory.")
+    sink = ["kvssink", f"stream-name={stream_name}", f"aws-region={region}"]
+
+    if conn_type == "rtsp": # Wifi connection
+        uri = camera.get("uri") # Any rtsp connections *should* have uri info
+        if not uri:
+            raise ValueError("ERROR: No 'uri' specified for rtsp camera.")
+
+        head = [
+            gst_launch, "-v",
+            "rtspsrc", f"location={uri}", "latency=100", "!",
+            "rtph264depay", "!",
+            "h264parse", "!"
+        ]
+        input_format, encode, profile = "h264", [], "passthrough"
+
+    elif conn_type == "v4l2": # USB connection
+        device = camera.get("device") # Any v4l2 connections *should* have device info
+        if not device:
+            raise ValueError("ERROR: No 'device' specified for v4l2 camera.")
+
+        preset = resolve_preset(camera)
+        if mode == "only":
+            # Nothing is encoded, so no profile to pick; only what the camera sends matters
+            profile = "snapshot"
+            input_format = "h264" if camera.get("input_format") == "h264" or camera.get("profile") == "passthrough" else "mjpeg"
+        else:
+            profile = choose_profile(camera, available)
+            input_format = "h264" if profile == "passthrough" else "mjpeg"
+
+        size = f"width={preset['width']},height={preset['height']},framerate={preset['fps']}/1"
+        head = [gst_launch, "-v", "v4l2src", f"device={device}", "do-timestamp=true", "!"]
+        if input_format == "h264":
+            head += [f"video/x-h264,{size}", "!", "h264parse", "!"]
+            encode = []
+        else:
+            head += [f"image/jpeg,{size}", "!"]
+            encode = ["jpegdec", "!", "videoconvert", "!"]
+            if profile == "v4l2h264":
+                encode += [
+                    "video/x-raw,format=I420", "!",
+                    "v4l2h264enc", f"extra-controls=controls,video_bitrate={preset['bitrate'] * 1000}", "!",
+                    "video/x-h264,level=(string)4", "!"
+                ]
+            else:
+                encode += ["x264enc", "tune=zerolatency", f"bitrate={preset['bitrate']}", "speed-preset=superfast", "!"]
+            encode += ["h264parse", "!"]
+
+    else:
+        raise ValueError(f"ERROR: Unsupported connection_type '{conn_type}'. Must be 'v4l2' or 'rtsp'.")
+
+    if mode != "off" and available is None:
+        needed = SNAPSHOT_ELEMENTS[input_format]
+        if any(element_available(element) is False for element in needed):
+            raise ValueError(f"ERROR: snapshot_mode needs the GStreamer elements {', '.join(needed)}.")
+
+    if mode == "off":
+        return head + encode + sink, profile
+    if mode == "only":
+        return head + _snapshot_branch(input_format, snapshot_dir, interval, teed=False), profile
+    return (
+        head + ["tee", "name=snap", "!", "queue", "!"] + encode + sink
+        + ["snap.", "!"] + _snapshot_branch(input_format, snapshot_dir, interval, teed=True)
+    ), profile
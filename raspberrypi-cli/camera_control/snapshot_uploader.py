@@ -0,0 +1,203 @@
+"""
+This script uploads the JPEG snapshots a camera's pipeline writes (snapshot_mode 'tee' or
+'only', see pipeline_builder) to cameras/{cameraId}/frames/{timestamp}.jpg, the key
+frameEnqueue_TF picks up. cameraId is the camera's stream name, as for frames the
+stream processor pulls out of KVS
+
+Each camera has a spool directory, snapshots/<cam_name>/:
+- incoming/ - where GStreamer's multifilesink writes snapshot-NNNNNN.jpg
+- queue/ - the upload queue. Files in incoming/ that haven't been touched for
+  SETTLE_SECONDS are renamed to queue/<epoch ms>.jpg (their write time), so the queue
+  survives network drops, pipeline restarts and reboots
+The queue is bounded (max_files, max_bytes); when it is full the oldest snapshots are
+dropped. Uploads go oldest first; after a failed upload the uploader waits a jittered,
+doubling delay (up to backoff_max) before trying again, and nothing is lost meanwhile.
+"""
+
+# Internal OS imports
+import os
+import random
+import threading
+import time
+
+# External AWS imports
+import boto3
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_ROOT = os.path.join(SCRIPT_DIR, "snapshots")
+SNAPSHOT_BUCKET = os.environ.get("SNAPSHOT_BUCKET", "bucket-zmc-0001")
+MAX_QUEUED_FILES = 2000
+MAX_QUEUED_BYTES = 200 * 1024 * 1024
+SETTLE_SECONDS = 0.5 # a file this old is completely written
+
+def spool_dir(cam_name):
+    """
+    Spool directory of a camera (not created)
+    """
+    return os.path.join(SNAPSHOT_ROOT, cam_name.strip("/").replace("/", "_"))
+
+def incoming_dir(cam_name):
+    """
+    Where the camera's pipeline writes its snapshots
+    """
+    return os.path.join(spool_dir(cam_name), "incoming")
+
+def frame_key(camera_id, epoch_ms):
+    """
+    cameras/{cameraId}/frames/{ISO timestamp with ms}.jpg
+    """
+    seconds, millis = divmod(int(epoch_ms), 1000)
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+    return f"cameras/{camera_id}/frames/{stamp}.{millis:03d}.jpg"
+
+class SnapshotUploader:
+    """
+    Moves one camera's snapshots into its on-disk queue and uploads them to S3
+
+    ### Args
+    - camera_id - cameraId in the uploaded keys (the camera's stream name)
+    - directory - spool directory (see spool_dir); created if missing
+    - bucket - S3 bucket frameEnqueue_TF listens on
+    - s3 - S3 client (default: boto3.client("s3") in region)
+    - region - AWS region for the default client
+    - max_files / max_bytes - queue bounds; the oldest snapshots are dropped beyond them
+    - poll_seconds - how often incoming/ is checked
+    - backoff_max - longest wait after failed uploads, in seconds
+    """
+    def __init__(self, camera_id, directory, bucket=SNAPSHOT_BUCKET, s3=None, region=None, max_files=MAX_QUEUED_FILES,
+                 max_bytes=MAX_QUEUED_BYTES, poll_seconds=1.0, backoff_max=60.0):
+        self.camera_id = camera_id
+        self.incoming = os.path.join(directory, "incoming")
+        self.queue = os.path.join(directory, "queue")
+        os.makedirs(self.incoming, exist_ok=True)
+        os.makedirs(self.queue, exist_ok=True)
+        self.bucket = bucket
+        self.s3 = s3 if s3 is not None else boto3.client("s3", region_name=region)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self.backoff_max = backoff_max
+        self.stats = {"uploaded": 0, "bytes": 0, "dropped": 0, "failures": 0}
+        self._delay = 0.0 # current backoff, 0 while uploads succeed
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def ingest(self, now=None):
+        """
+        Moves settled snapshots from incoming/ into the queue. Returns how many
+        """
+        now = time.time() if now is None else now
+        moved = 0
+        for name in sorted(os.listdir(self.incoming)):
+            if not name.endswith(".jpg"):
+                continue
+            path = os.path.join(self.incoming, name)
+            try:
+                modified = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if now - modified < SETTLE_SECONDS:
+                continue # multifilesink may still be writing it
+            epoch_ms = int(modified * 1000)
+            target = os.path.join(self.queue, f"{epoch_ms:013d}.jpg")
+            while os.path.exists(target): # two snapshots in one millisecond
+                epoch_ms += 1
+                target = os.path.join(self.queue, f"{epoch_ms:013d}.jpg")
+            os.replace(path, target)
+            moved += 1
+        return moved
+
+    def queued(self):
+        """
+        Queued snapshot file names, oldest first
+        """
+        return sorted(name for name in os.listdir(self.queue) if name.endswith(".jpg"))
+
+    def enforce_bounds(self):
+        """
+        Drops the oldest queued snapshots beyond max_files / max_bytes
+        """
+        names = self.queued()
+        sizes = []
+        for name in names:
+            try:
+                sizes.append(os.path.getsize(os.path.join(self.queue, name)))
+            except FileNotFoundError:
+                sizes.append(0)
+        total = sum(sizes)
+        index = 0
+        while index < len(names) and (len(names) - index > self.max_files or total > self.max_bytes):
+            try:
+                os.remove(os.path.join(self.queue, names[index]))
+            except FileNotFoundError:
+                pass
+            total -= sizes[index]
+            self.stats["dropped"] += 1
+            index += 1
+
+    def upload_queued(self, now=None):
+        """
+        Uploads queued snapshots oldest first until the queue is empty or an upload fails.
+        Returns how many were uploaded
+        """
+        now = time.monotonic() if now is None else now
+        if now < self._retry_at:
+            return 0
+        uploaded = 0
+        for name in self.queued():
+            if self._stop.is_set():
+                break
+            path = os.path.join(self.queue, name)
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                continue
+            try:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=frame_key(self.camera_id, int(name[:-len(".jpg")])),
+                    Body=body,
+                    ContentType="image/jpeg"
+                )
+            except Exception as e:
+                # Network down or S3 unhappy: keep the file, back off
+                self.stats["failures"] += 1
+                self._delay = min(self.backoff_max, max(self.poll_seconds, self._delay * 2))
+                self._retry_at = time.monotonic() + random.uniform(self._delay / 2, self._delay)
+                print(f"[{self.camera_id}] snapshot upload failed ({e}), retrying in up to {self._delay:.0f}s")
+                break
+            os.remove(path)
+            self._delay = 0.0
+            self.stats["uploaded"] += 1
+            self.stats["bytes"] += len(body)
+            uploaded += 1
+        return uploaded
+
+    def run_once(self):
+        self.ingest()
+        self.enforce_bounds()
+        return self.upload_queued()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except OSError as e:
+                print(f"[{self.camera_id}] snapshot spool error: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"snapshots-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """
+        Stops the upload thread; whatever is still queued stays on disk for the next run
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
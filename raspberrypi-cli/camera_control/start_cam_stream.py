@@ -7,28 +7,51 @@ as a go-between
 # Internal OS imports
 import subprocess
 import os
+import shlex
 import sys
-import time
 
 # External AWS imports
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
+from botocore.exceptions import NoCredentialsError
 
 # Other CLI script imports
 from .cam_info_management import load_camera
+from .pipeline_builder import build_pipeline, snapshot_settings
+from .snapshot_uploader import SnapshotUploader, incoming_dir, spool_dir
+from .stream_provisioning import provision_streams
+
+# gst-launch executable; point GST_LAUNCH at a fake one to run pipelines without GStreamer/cameras
+GST_LAUNCH = os.environ.get("GST_LAUNCH", "gst-launch-1.0")
+
+def build_command(camera, available=None, snapshot_dir=None):
+    """
+    Build the gst-launch command line for a saved camera (see pipeline_builder).
+
+    ### Args
+    - camera - camera config as saved in cameras.json
+    - available - profiles that can run here (default: probe with gst-inspect)
+    - snapshot_dir - where snapshot JPEGs go, for cameras with a snapshot_mode
+
+    Raises:
+        ValueError:          On an unsupported connection_type, a missing device/uri, or
+                             an unknown/unavailable profile or preset.
+    """
+    command, _ = build_pipeline(camera, GST_LAUNCH, available, snapshot_dir)
+    return command
 
 def start_cam_stream(args):
     """
     Ensure the given KVS stream exists & is ready, then launch the GStreamer pipeline.
 
-    1. Describe the stream:
-         - If it exists and is not 'ACTIVE', exit with error.
-         - If it exists and is 'ACTIVE', proceed.
-    2. If it does not exist, create it, then poll DescribeStream until it becomes 'ACTIVE'.
-    3. Launch gst-launch-1.0 with the provided device and stream name.
+    1. Check/create the stream (see stream_provisioning.provision_streams); a stream
+       seen ACTIVE recently is taken from the local cache without asking AWS.
+    2. Launch gst-launch-1.0 with the pipeline built for the camera's profile and preset.
+       Cameras with a snapshot_mode also upload JPEG snapshots while it runs (see
+       snapshot_uploader); 'only' cameras skip step 1, as they don't stream.
 
     Args:
         args.cam_name (str):      Path or identifier for the camera (e.g. '/dev/video0').
+        args.refresh_streams (bool): Ignore the cached stream ARN and describe the stream.
+        args.dry_run (bool):      Print the chosen pipeline instead of running it.
 
     Raises:
         SystemExit:          On AWS errors, missing creds, or if stream stays non‑ACTIVE.
@@ -36,92 +59,38 @@ def start_cam_stream(args):
 
     # Load camera config from json
     camera = load_camera(args.cam_name)
-    
-    stream_name = camera["stream_name"]
-    region = camera["aws_region"]
-    conn_type = camera["connection_type"]
+    if camera is None:
+        sys.exit(1)
+
+    try:
+        mode, _ = snapshot_settings(camera)
+        command = build_command(camera, snapshot_dir=incoming_dir(args.cam_name))
+    except ValueError as e:
+        sys.exit(str(e))
 
-    if conn_type not in ["v4l2", "rtsp"]:
-        sys.exit(f"ERROR: Unsupported connection_type '{conn_type}'. Must be 'v4l2' or 'rtsp'.")
+    # Show the pipeline that would run, without touching AWS or the camera
+    if args.dry_run:
+        print(shlex.join(command))
+        return
 
     # Set debug logging for GStreamer
     os.environ["GST_DEBUG"] = "3"
 
-    # Initialize KVS client, if user is currently authenticated through the AWS CLI
-    try:
-        kvs = boto3.client("kinesisvideo", region_name=region)
-    except NoCredentialsError:
-        sys.exit("ERROR: AWS credentials not found. Configure them and retry.")
-    
-    # Check for existing stream
-    try:
-        resp = kvs.describe_stream(StreamName=stream_name)
-        status = resp["StreamInfo"]["Status"]
-
-        # If stream is inactive, tell the user what status it is in and exit the program
-        if status != "ACTIVE":
-            sys.exit(f"ERROR: Stream '{stream_name}' exists but is in status '{status}'") # Quit program with error
-        
-        # else: ACTIVE -> reuse
-        print(f"Re‑using existing ACTIVE stream '{stream_name}'.")
-    except ClientError as e:
-        code = e.response["Error"]["Code"]
-
-        # We want a ResourceNotFoundException for the later part of this block, if it is something else, we cannot handle it here
-        if code != "ResourceNotFoundException":
-            sys.exit(f"AWS ClientError: {e}") # Quit program with error
-        
-        # If we get to this part of the block, we do have a ResourceNotFoundException
-        # This means that everything else in the call should be correct, we just need to create a new stream to use
-        print(f"Stream '{stream_name}' not found -> creating new stream...")
-        kvs.create_stream(StreamName=stream_name, DataRetentionInHours=24)
-
-        # Wait until stream is ACTIVE
-        for _ in range(30):
-            time.sleep(2)
-
-            try:
-                # Get the current status of the new stream
-                s = kvs.describe_stream(StreamName=stream_name)["StreamInfo"]["Status"]
-                if s == "ACTIVE":
-                    print(f"Stream '{stream_name}' is now ACTIVE.")
-                    break
-            except ClientError:
-                pass
-        # If the stream didn't activate in a minute, assume that it won't start
-        else:
-            sys.exit(f"ERROR: Stream '{stream_name}' did not become ACTIVE in time.") # Quit program with error
-
-    # Build the appropriate GStreamer command based on connection type    
-    if conn_type == "v4l2": # USB connection
-        device = camera["device"] # Any v4l2 connections *should* have device info
-        if not device:
-            sys.exit("ERROR: No 'device' specified for v4l2 camera.")
-        
-        command = [
-            "gst-launch-1.0", "-v",
-            "v4l2src", f"device={device}", "do-timestamp=true", "!",
-            "image/jpeg,width=800,height=600,framerate=15/1", "!",
-            "jpegdec", "!",
-            "videoconvert", "!",
-            "x264enc", "tune=zerolatency", "bitrate=1000", "speed-preset=superfast", "!",
-            "h264parse", "!",
-            "kvssink", f"stream-name={stream_name}", f"aws-region={region}"
-        ]
-            
-    elif conn_type == "rtsp": # Wifi connection
-        uri = camera["uri"] # Any rtsp connections *should* have uri info
-        if not uri:
-            sys.exit("ERROR: No 'uri' specified for rtsp camera.")
-        
-        command = [
-            "gst-launch-1.0", "-v",
-            "rtspsrc", f"location={uri}", "latency=100", "!",
-            "rtph264depay", "!",
-            "h264parse", "!",
-            "kvssink", f"stream-name={stream_name}", f"aws-region={region}"
-        ]
-
+    # Check/create the stream, if user is currently authenticated through the AWS CLI
+    # (snapshot-only cameras don't stream)
+    if mode != "only":
+        try:
+            _, errors = provision_streams({args.cam_name: camera}, refresh=args.refresh_streams)
+        except NoCredentialsError:
+            sys.exit("ERROR: AWS credentials not found. Configure them and retry.")
+        if errors:
+            sys.exit(errors[args.cam_name]) # Quit program with error
+
+    # Snapshots are uploaded from their spool directory while the pipeline runs
+    uploader = None
+    if mode != "off":
+        uploader = SnapshotUploader(camera["stream_name"], spool_dir(args.cam_name), region=camera["aws_region"])
+        uploader.start()
 
     # Attempt to run GStreamer pipeline
     try:
@@ -129,4 +98,10 @@ def start_cam_stream(args):
     except subprocess.CalledProcessError as e:
         print(f"Pipeline execution failed: {e}")
     except FileNotFoundError:
-        print("gst-launch-1.0 not found. Make sure GStreamer is installed and in your PATH.")
+        print(f"{GST_LAUNCH} not found. Make sure GStreamer is installed and in your PATH.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if uploader:
+            uploader.stop()
+            print(f"Snapshots: {uploader.stats} ({len(uploader.queued())} left queued for the next run)")
@@ -0,0 +1,217 @@
+"""
+This script makes sure the Kinesis Video Streams of a set of cameras exist and are ACTIVE,
+all cameras at once (start_stream, start_all)
+
+1. Streams with a cached ARN that was seen ACTIVE less than STREAM_CACHE_TTL ago are
+   taken as-is: no AWS call at all
+2. Every other stream is described in parallel (one kinesisvideo client per region).
+   Missing streams are created, also in parallel
+3. A single shared waiter then polls every stream that isn't ACTIVE yet, in parallel,
+   sleeping a jittered, growing delay between rounds, until they are all ACTIVE or
+   the deadline passes
+4. ARNs of ACTIVE streams are written to stream_cache.json
+
+A stream deleted behind the cache's back shows up as a failing kvssink; pass
+refresh=True (--refresh_streams) to ignore the cache.
+"""
+
+# Internal OS imports
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# External AWS imports
+import boto3
+from botocore.exceptions import ClientError
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STREAM_CACHE_FILE = os.path.join(SCRIPT_DIR, "./stream_cache.json")
+STREAM_CACHE_TTL = 12 * 3600 # seconds an ACTIVE stream is trusted without describing it
+RETENTION_HOURS = 24
+MAX_WORKERS = 8
+
+# Shared waiter: delays between polling rounds grow from POLL_INITIAL x2 up to POLL_MAX,
+# each one jittered down to half so a fleet of Pis booting together doesn't poll in step
+POLL_INITIAL = 0.5
+POLL_MAX = 2.0
+ACTIVE_TIMEOUT = 60.0 # same budget as the old 30 x 2s loop
+WAITING_STATUSES = ("CREATING", "UPDATING")
+
+class StreamCache:
+    """
+    ARNs of streams last seen ACTIVE, persisted to a json file
+
+    ### Args
+    - path - json file
+    - ttl - seconds an entry stays valid
+    """
+    def __init__(self, path=STREAM_CACHE_FILE, ttl=STREAM_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {} # a broken cache only costs a describe per stream
+
+    @staticmethod
+    def _key(region, stream_name):
+        return f"{region}/{stream_name}"
+
+    def get(self, region, stream_name, now=None):
+        """
+        Cached ARN, or None if unknown or older than the TTL
+        """
+        entry = self.entries.get(self._key(region, stream_name))
+        now = time.time() if now is None else now
+        if not entry or now - entry["checked_at"] > self.ttl:
+            return None
+        return entry["arn"]
+
+    def put(self, region, stream_name, arn, now=None):
+        self.entries[self._key(region, stream_name)] = {
+            "arn": arn,
+            "checked_at": time.time() if now is None else now
+        }
+
+    def save(self):
+        # Write then rename, so an interrupted write never leaves half a file behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(temp_path, self.path)
+
+def _error_code(e):
+    return e.response.get("Error", {}).get("Code")
+
+def _describe(kvs, stream_name):
+    """
+    PRIVATE METHOD
+
+    Returns (status, arn), or (None, None) if the stream does not exist
+    """
+    try:
+        info = kvs.describe_stream(StreamName=stream_name)["StreamInfo"]
+    except ClientError as e:
+        if _error_code(e) != "ResourceNotFoundException":
+            raise
+        return None, None
+    return info["Status"], info.get("StreamARN")
+
+def _check_or_create(kvs, stream_name):
+    """
+    PRIVATE METHOD
+
+    Describe the stream and create it if missing. Returns (status, arn)
+
+    Raises:
+        RuntimeError:        If the stream exists in a state it won't become ACTIVE from.
+    """
+    status, arn = _describe(kvs, stream_name)
+    if status is None:
+        print(f"Stream '{stream_name}' not found -> creating new stream...")
+        try:
+            arn = kvs.create_stream(StreamName=stream_name, DataRetentionInHours=RETENTION_HOURS)["StreamARN"]
+        except ClientError as e:
+            # Another Pi (or another camera entry) created it first; wait for it like ours
+            if _error_code(e) != "ResourceInUseException":
+                raise
+        return "CREATING", arn
+    if status != "ACTIVE" and status not in WAITING_STATUSES:
+        raise RuntimeError(f"ERROR: Stream '{stream_name}' exists but is in status '{status}'")
+    return status, arn
+
+def _poll_delays(initial=POLL_INITIAL, maximum=POLL_MAX):
+    delay = initial
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(maximum, delay * 2)
+
+def provision_streams(cameras, client_factory=None, cache=None, refresh=False, timeout=ACTIVE_TIMEOUT):
+    """
+    Make sure every camera's KVS stream exists and is ACTIVE
+
+    ### Args
+    - cameras - {cam_name: camera config} as saved in cameras.json
+    - client_factory - region -> kinesisvideo client (default: boto3.client)
+    - cache - StreamCache to read/update (default: the one in stream_cache.json)
+    - refresh - ignore cached ARNs and describe every stream
+    - timeout - seconds to wait for new streams to become ACTIVE
+
+    Returns ({cam_name: stream ARN}, {cam_name: error message}) - a camera is in exactly one.
+    May raise botocore's NoCredentialsError, as that affects every camera
+    """
+    if client_factory is None:
+        client_factory = lambda region: boto3.client("kinesisvideo", region_name=region)
+    cache = StreamCache() if cache is None else cache
+
+    arns = {}
+    errors = {}
+    clients = {}
+    todo = {} # cam_name -> (kvs client, region, stream name)
+    for name, camera in cameras.items():
+        region, stream_name = camera["aws_region"], camera["stream_name"]
+        arn = None if refresh else cache.get(region, stream_name)
+        if arn:
+            print(f"Re‑using cached ACTIVE stream '{stream_name}'.")
+            arns[name] = arn
+            continue
+        if region not in clients:
+            clients[region] = client_factory(region)
+        todo[name] = (clients[region], region, stream_name)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(todo))) as pool:
+            def run(function, names):
+                # Calls function(kvs, stream_name) for every camera in parallel;
+                # yields (cam_name, result) and records failures in errors
+                futures = {name: pool.submit(function, todo[name][0], todo[name][2]) for name in names}
+                for name, future in futures.items():
+                    try:
+                        yield name, future.result()
+                    except (ClientError, RuntimeError) as e:
+                        errors[name] = str(e)
+
+            pending = {} # cam_name -> arn (None if another creator beat us to it)
+            for name, (status, arn) in run(_check_or_create, list(todo)):
+                if status == "ACTIVE":
+                    print(f"Re‑using existing ACTIVE stream '{todo[name][2]}'.")
+                    arns[name] = arn
+                else:
+                    pending[name] = arn
+
+            # Shared waiter: one polling round covers every stream still coming up
+            deadline = time.monotonic() + timeout
+            delays = _poll_delays()
+            while pending and time.monotonic() < deadline:
+                time.sleep(min(next(delays), max(0.0, deadline - time.monotonic())))
+                for name, (status, arn) in run(_describe, list(pending)):
+                    if status == "ACTIVE":
+                        print(f"Stream '{todo[name][2]}' is now ACTIVE.")
+                        arns[name] = arn or pending[name]
+                        del pending[name]
+                    elif status is not None and status not in WAITING_STATUSES:
+                        errors[name] = f"ERROR: Stream '{todo[name][2]}' went to status '{status}'"
+                        del pending[name]
+                for name in errors:
+                    pending.pop(name, None)
+
+            for name in pending:
+                errors[name] = f"ERROR: Stream '{todo[name][2]}' did not become ACTIVE in time."
+
+    for name, arn in arns.items():
+        if name in todo and arn:
+            cache.put(todo[name][1], todo[name][2], arn)
+    if todo:
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Could not save stream cache: {e}")
+    return arns, errors
@@ -0,0 +1,398 @@
+"""
+This script supervises the GStreamer pipelines of every saved camera at once
+(raspi_cli.py start_all), for Pis that host several cameras
+
+- every camera gets its own gst-launch process, started concurrently
+- a pipeline that exits (crash, camera unplugged, network drop) is restarted after an
+  exponential backoff: backoff_initial, x2 per consecutive failure, capped at backoff_max.
+  A pipeline that stayed up for stable_seconds starts again from backoff_initial
+- pipelines are pinned to CPU cores round-robin (all their threads, via sched_setaffinity
+  in the child before exec), so one busy encoder can't starve the others
+- every report_seconds (and on exit) a table of per-pipeline pid, core, uptime, restarts
+  and CPU is printed. CPU is read from /proc/<pid>/stat while a pipeline runs and from
+  the rusage of os.wait4 when it exits
+- Ctrl+C / SIGTERM sends SIGINT to every pipeline (gst-launch stops its pipeline on it)
+  and kills the ones still running after stop_timeout
+
+Set GST_LAUNCH to a fake gst-launch executable to run the supervisor without GStreamer
+(see benchmarks/fake_gst_launch.py)
+"""
+
+# Internal OS imports
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+# External AWS imports
+from botocore.exceptions import NoCredentialsError
+
+# Other CLI script imports
+from .cam_info_management import load_all_cameras
+from .pipeline_builder import snapshot_settings
+from .snapshot_uploader import SnapshotUploader, incoming_dir, spool_dir
+from .start_cam_stream import build_command
+from .stream_provisioning import provision_streams
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+CPU_SAMPLE_MIN = 1.0 # seconds; shorter intervals keep the previous CPU % figure
+
+def available_cores():
+    """
+    CPU cores this process may run on
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def _proc_cpu_seconds(pid):
+    """
+    PRIVATE METHOD
+
+    utime + stime of a running process in seconds, or None if /proc isn't available
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name (field 2) may contain spaces; the fields after it don't
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+
+class Pipeline:
+    """
+    One camera's gst-launch process and its restart bookkeeping
+
+    ### Args
+    - name - camera name
+    - command - gst-launch command line (see start_cam_stream.build_command)
+    - core - CPU core to pin to, or None
+    - log_path - file the pipeline's stdout/stderr are appended to, or None to inherit
+    """
+    def __init__(self, name, command, core=None, log_path=None):
+        self.name = name
+        self.command = command
+        self.core = core
+        self.log_path = log_path
+        self.process = None
+        self.started_at = None # start of the current run
+        self.first_started_at = None
+        self.restarts = 0
+        self.failures = 0 # consecutive short runs, drives the backoff
+        self.next_start = 0.0 # monotonic time of the next (re)start while not running
+        self.last_exit = None # exit code of the previous run
+        self.uptime_exited = 0.0 # seconds up across runs that already exited
+        self.cpu_exited = 0.0 # CPU seconds of runs that already exited
+        self.cpu_sample = (None, 0.0) # (monotonic time, CPU seconds) of the last report
+        self.cpu_percent = 0.0
+
+    def running(self):
+        return self.process is not None
+
+    def start(self, now):
+        log = open(self.log_path, "ab") if self.log_path else None
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT if log else None,
+                start_new_session=True # Ctrl+C in the terminal reaches the supervisor only
+            )
+        finally:
+            if log:
+                log.close()
+
+        if self.core is not None and hasattr(os, "sched_setaffinity"):
+            # Pinned from here rather than with preexec_fn, which can deadlock when the
+            # supervisor has other threads (the snapshot uploaders). gst-launch is still
+            # parsing its pipeline, so the threads GStreamer starts inherit the pin
+            try:
+                os.sched_setaffinity(self.process.pid, {self.core})
+            except OSError as e: # already exited, or the core went offline
+                print(f"[{self.name}] could not pin to core {self.core}: {e}")
+
+        if self.first_started_at is None:
+            self.first_started_at = now
+        self.started_at = now
+
+    def reap(self, block=False):
+        """
+        Returns (exit code, CPU seconds of the run) if the process has exited, else None
+        """
+        try:
+            pid, status, usage = os.wait4(self.process.pid, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            return (self.process.returncode or -1, 0.0)
+        if pid == 0:
+            return None
+        code = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status
+        self.process.returncode = code # tell Popen the child is gone
+        return (code, usage.ru_utime + usage.ru_stime)
+
+    def exited(self, code, cpu, now, backoff_initial, backoff_max, stable_seconds):
+        """
+        Bookkeeping for a run that ended; schedules the restart
+        """
+        self.cpu_exited += cpu
+        self.uptime_exited += now - self.started_at
+        self.last_exit = code
+        self.process = None
+        if now - self.started_at >= stable_seconds:
+            self.failures = 0
+        delay = min(backoff_max, backoff_initial * (2 ** self.failures))
+        self.failures += 1
+        self.next_start = now + delay
+        return delay
+
+    def cpu_seconds(self):
+        if not self.running():
+            return self.cpu_exited
+        current = _proc_cpu_seconds(self.process.pid)
+        return self.cpu_exited + (current or 0.0)
+
+    def sample_cpu(self, now):
+        """
+        Updates cpu_percent (of one core) since the previous sample
+        """
+        total = self.cpu_seconds()
+        last_time, last_total = self.cpu_sample
+        if last_time is not None and now - last_time < CPU_SAMPLE_MIN:
+            return # too short to mean much, e.g. the report right after stop()
+        if last_time is not None:
+            self.cpu_percent = max(0.0, total - last_total) / (now - last_time) * 100
+        self.cpu_sample = (now, total)
+
+    def stats(self, now):
+        return {
+            "name": self.name,
+            "pid": self.process.pid if self.running() else None,
+            "core": self.core,
+            "uptime": now - self.started_at if self.running() else 0.0,
+            "uptime_total": self.uptime_exited + (now - self.started_at if self.running() else 0.0),
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "cpu_seconds": self.cpu_seconds(),
+            "cpu_percent": self.cpu_percent
+        }
+
+class StreamSupervisor:
+    """
+    Runs and restarts a set of pipelines until stopped
+
+    ### Args
+    - commands - {camera name: gst-launch command line}
+    - cores - CPU cores to pin pipelines to, round-robin (None: available_cores(); [] : no pinning)
+    - backoff_initial / backoff_max - restart delay bounds in seconds
+    - stable_seconds - a run this long resets the backoff
+    - report_seconds - how often the stats table is printed (0: only on exit)
+    - log_dir - directory for <camera>.log files, or None to inherit stdout/stderr
+    - stop_timeout - seconds a pipeline gets to stop after SIGINT before it is killed
+    """
+    def __init__(self, commands, cores=None, backoff_initial=1.0, backoff_max=60.0, stable_seconds=30.0,
+                 report_seconds=60.0, log_dir=None, stop_timeout=10.0):
+        cores = available_cores() if cores is None else list(cores)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self.pipelines = [
+            Pipeline(
+                name,
+                command,
+                core=cores[index % len(cores)] if cores else None,
+                log_path=os.path.join(log_dir, f"{name.strip('/').replace('/', '_')}.log") if log_dir else None
+            )
+            for index, (name, command) in enumerate(commands.items())
+        ]
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+        self.report_seconds = report_seconds
+        self.stop_timeout = stop_timeout
+        self.stopping = False
+
+    def _launch(self, pipeline, now):
+        try:
+            pipeline.start(now)
+        except OSError as e:
+            # e.g. gst-launch not installed; treated like a crash so it backs off
+            pipeline.started_at = now
+            delay = pipeline.exited(None, 0.0, now, self.backoff_initial, self.backoff_max, self.stable_seconds)
+            print(f"[{pipeline.name}] failed to start: {e}, retrying in {delay:.1f}s")
+            return
+        print(f"[{pipeline.name}] started pid {pipeline.process.pid}"
+              + (f" on core {pipeline.core}" if pipeline.core is not None else ""))
+
+    def start(self):
+        now = time.monotonic()
+        for pipeline in self.pipelines:
+            self._launch(pipeline, now)
+
+    def check(self, now=None):
+        """
+        Reaps exited pipelines and restarts the ones whose backoff has run out
+        """
+        now = time.monotonic() if now is None else now
+        for pipeline in self.pipelines:
+            if pipeline.running():
+                result = pipeline.reap()
+                if result is None:
+                    continue
+                code, cpu = result
+                uptime = now - pipeline.started_at
+                delay = pipeline.exited(code, cpu, now, self.backoff_initial, self.backoff_max, self.stable_seconds)
+                if self.stopping:
+                    print(f"[{pipeline.name}] stopped with code {code} after {_format_duration(uptime)}")
+                else:
+                    print(f"[{pipeline.name}] exited with code {code} after "
+                          f"{_format_duration(uptime)}, restarting in {delay:.1f}s")
+            elif not self.stopping and pipeline.started_at is not None and now >= pipeline.next_start:
+                pipeline.restarts += 1
+                self._launch(pipeline, now)
+
+    def stats(self, now=None):
+        now = time.monotonic() if now is None else now
+        for pipeline in self.pipelines:
+            pipeline.sample_cpu(now)
+        return [pipeline.stats(now) for pipeline in self.pipelines]
+
+    def report(self, now=None):
+        rows = self.stats(now)
+        print(f"{'camera':<20} {'pid':>7} {'core':>4} {'uptime':>9} {'restarts':>8} {'exit':>5} {'cpu %':>6} {'cpu s':>8}")
+        for row in rows:
+            print(f"{row['name']:<20} {row['pid'] or '-':>7} {'-' if row['core'] is None else row['core']:>4} "
+                  f"{_format_duration(row['uptime']):>9} {row['restarts']:>8} "
+                  f"{'-' if row['last_exit'] is None else row['last_exit']:>5} "
+                  f"{row['cpu_percent']:>6.1f} {row['cpu_seconds']:>8.1f}")
+
+    def stop(self):
+        """
+        SIGINT every pipeline, wait up to stop_timeout, then SIGKILL the rest
+        """
+        self.stopping = True
+        for pipeline in self.pipelines:
+            if pipeline.running():
+                try:
+                    pipeline.process.send_signal(signal.SIGINT)
+                except ProcessLookupError:
+                    pass
+
+        deadline = time.monotonic() + self.stop_timeout
+        while any(pipeline.running() for pipeline in self.pipelines) and time.monotonic() < deadline:
+            self.check()
+            time.sleep(0.05)
+
+        for pipeline in self.pipelines:
+            if pipeline.running():
+                print(f"[{pipeline.name}] did not stop in {self.stop_timeout:.0f}s, killing it")
+                pipeline.process.kill()
+                code, cpu = pipeline.reap(block=True)
+                pipeline.exited(code, cpu, time.monotonic(), self.backoff_initial, self.backoff_max, self.stable_seconds)
+
+    def run(self, poll_seconds=0.5):
+        """
+        Start everything and supervise until SIGINT/SIGTERM
+        """
+        def handle(signum, frame):
+            self.stopping = True
+
+        previous = {sig: signal.signal(sig, handle) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start()
+            next_report = time.monotonic() + self.report_seconds if self.report_seconds else None
+            while not self.stopping:
+                time.sleep(poll_seconds)
+                self.check()
+                if next_report is not None and time.monotonic() >= next_report:
+                    self.report()
+                    next_report += self.report_seconds
+            print("Stopping pipelines...")
+            self.stop()
+            self.report()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+def start_all(args):
+    """
+    Start and supervise the pipelines of every saved camera
+
+    ### Args passed
+    - cores - comma separated CPU cores to pin pipelines to (default: every available core)
+    - backoff_max - longest restart delay in seconds
+    - report_seconds - seconds between stats reports
+    - log_dir - directory for per-camera pipeline logs
+    - no_provision - skip the KVS stream check/creation (streams already exist)
+    - refresh_streams - ignore cached stream ARNs and describe every stream
+    - dry_run - print every camera's pipeline instead of running them
+    """
+    cameras = load_all_cameras()
+    if not cameras:
+        sys.exit("ERROR: No cameras saved yet.")
+
+    # Set debug logging for GStreamer
+    os.environ["GST_DEBUG"] = "3"
+
+    commands = {}
+    snapshots = {} # cam_name -> snapshot_mode, for cameras that take snapshots
+    for name, camera in cameras.items():
+        try:
+            commands[name] = build_command(camera, snapshot_dir=incoming_dir(name))
+            mode, _ = snapshot_settings(camera)
+        except ValueError as e:
+            # One broken camera shouldn't keep the others from streaming
+            print(f"[{name}] skipped: {e}")
+            continue
+        if mode != "off":
+            snapshots[name] = mode
+
+    # Show the pipelines that would run, without touching AWS or the cameras
+    if args.dry_run:
+        for name, command in commands.items():
+            print(f"[{name}] {shlex.join(command)}")
+        return
+
+    if commands and not args.no_provision:
+        # Every stream is checked/created at once, see stream_provisioning
+        try:
+            streaming = {name: cameras[name] for name in commands if snapshots.get(name) != "only"}
+            _, errors = provision_streams(streaming, refresh=args.refresh_streams)
+        except NoCredentialsError:
+            sys.exit("ERROR: AWS credentials not found. Configure them and retry.")
+        for name, error in errors.items():
+            print(f"[{name}] skipped: {error}")
+            del commands[name]
+
+    if not commands:
+        sys.exit("ERROR: No camera could be started.")
+
+    cores = [int(core) for core in args.cores.split(",")] if args.cores else None
+    supervisor = StreamSupervisor(
+        commands,
+        cores=cores,
+        backoff_max=args.backoff_max,
+        report_seconds=args.report_seconds,
+        log_dir=args.log_dir or LOG_DIR
+    )
+
+    # Snapshots are uploaded from their spool directories while the pipelines run
+    uploaders = [
+        SnapshotUploader(cameras[name]["stream_name"], spool_dir(name), region=cameras[name]["aws_region"])
+        for name in snapshots if name in commands
+    ]
+    for uploader in uploaders:
+        uploader.start()
+    try:
+        supervisor.run()
+    finally:
+        for uploader in uploaders:
+            uploader.stop()
+            print(f"[{uploader.camera_id}] snapshots: {uploader.stats} ({len(uploader.queued())} left queued for the next run)")
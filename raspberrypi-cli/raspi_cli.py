@@ -1,11 +1,15 @@
 import argparse
+from camera_control.pipeline_builder import DEFAULT_SNAPSHOT_INTERVAL, PRESETS, PROFILE_ORDER, SNAPSHOT_MODES
 from camera_control import (
     connect_camera,
     update_camera,
     delete_camera,
     load_camera,
     list_cameras,
-    start_cam_stream
+    export_cameras,
+    import_cameras,
+    start_cam_stream,
+    start_all
 )
 
 def main():
@@ -20,8 +24,25 @@ def main():
                     "NOTE: Camera must first be saved (see 'save_camera' command)"
     )
     parser_start.add_argument("--cam_name", required=True, help="Name of the camera to start streaming (e.g. --cam_name /dev/video0)")
+    parser_start.add_argument("--refresh_streams", action="store_true", help="Ignore the locally cached stream ARN and check the stream on AWS")
+    parser_start.add_argument("--dry_run", action="store_true", help="Print the GStreamer pipeline that would run (profile and preset applied) and exit")
     parser_start.set_defaults(func=start_cam_stream)
 
+    parser_start_all = subparsers.add_parser(
+        "start_all",
+        help="Start and supervise the video streams of every saved camera.",
+        description="Start every saved camera's pipeline, restart crashed pipelines with exponential backoff "
+                    "and report per-pipeline uptime, restarts and CPU. Stop with Ctrl+C"
+    )
+    parser_start_all.add_argument("--cores", help="Comma separated CPU cores to pin pipelines to, round-robin (e.g. --cores 1,2,3). Default: every available core")
+    parser_start_all.add_argument("--backoff_max", type=float, default=60.0, help="Longest delay between restarts of a crashing pipeline, in seconds")
+    parser_start_all.add_argument("--report_seconds", type=float, default=60.0, help="Seconds between stats reports (0 to only report on exit)")
+    parser_start_all.add_argument("--log_dir", help="Directory for per-camera pipeline logs (default: camera_control/logs)")
+    parser_start_all.add_argument("--no_provision", action="store_true", help="Skip the KVS stream check/creation (streams already exist)")
+    parser_start_all.add_argument("--refresh_streams", action="store_true", help="Ignore the locally cached stream ARNs and check every stream on AWS")
+    parser_start_all.add_argument("--dry_run", action="store_true", help="Print every camera's GStreamer pipeline and exit")
+    parser_start_all.set_defaults(func=start_all)
+
     # --- Camera Info Commands --- #
     parser_save = subparsers.add_parser("connect_camera", help="Save a camera's to the local JSON file for later reference")
     parser_save.add_argument("--cam_name", required=True, help="Name of the camera to save")
@@ -30,6 +51,11 @@ def main():
     parser_save.add_argument("--room", required=True, help="Name of the room the camera is placed in")
     parser_save.add_argument("--tags", required=True, nargs="*", help="Any rekognition tags that the camera should test for (e.g. --tags hardhat safety-vest goggles)")
     parser_save.add_argument("--connection_type", required=True, help="Connection type between the pi and camera ('rtsp' for wireless, 'v4l2' for USB)")
+    parser_save.add_argument("--profile", default="auto", choices=["auto"] + PROFILE_ORDER, help="USB cameras only: how the video is encoded ('passthrough' for cameras that emit H.264, 'v4l2h264' hardware encode, 'x264' software encode, 'auto' picks the cheapest available)")
+    parser_save.add_argument("--preset", default="default", choices=list(PRESETS), help="USB cameras only: resolution/framerate/bitrate preset")
+    parser_save.add_argument("--input_format", default="mjpeg", choices=["mjpeg", "h264"], help="USB cameras only: what the camera outputs")
+    parser_save.add_argument("--snapshot_mode", default="off", choices=SNAPSHOT_MODES, help="Upload JPEG snapshots from the Pi: 'tee' alongside the stream, 'only' instead of streaming (low-bandwidth sites)")
+    parser_save.add_argument("--snapshot_interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL, help="Seconds between snapshots")
     parser_save.set_defaults(func=connect_camera)
 
     parser_update = subparsers.add_parser("update_camera", help="Update a camera's information")
@@ -48,8 +74,23 @@ def main():
     
 
     parser_list = subparsers.add_parser("list_saved_cameras", help="Lists all the currently saved cameras")
+    parser_list.add_argument("--room", help="Only list the cameras in this room")
     parser_list.set_defaults(func=list_cameras)
 
+    parser_export = subparsers.add_parser("export_cameras", help="Export every saved camera to a JSON file")
+    parser_export.add_argument("--file", help="File to write (default: print to the terminal)")
+    parser_export.set_defaults(func=export_cameras)
+
+    parser_import = subparsers.add_parser(
+        "import_cameras",
+        help="Save every camera in a JSON file at once",
+        description="Save every camera in a JSON file ({cam_name: camera}, e.g. from export_cameras) in one write. "
+                    "Set CAMERA_REGISTRY=sqlite to import into the SQLite registry"
+    )
+    parser_import.add_argument("--file", required=True, help="File to read")
+    parser_import.add_argument("--replace", action="store_true", help="Delete every saved camera that is not in the file")
+    parser_import.set_defaults(func=import_cameras)
+
     args = parser.parse_args()
     args.func(args)
 
@@ -0,0 +1,169 @@
+"""
+Load-aware autoscaler for the stream processor ECS service
+
+Terraform leaves desired_count alone after creation (ignore_changes), so this sets it.
+From the scheduler's '#members' heartbeats it knows, per task, the streams held, the
+configured capacity, the measured CPU and the frame lag. From that it works out:
+- the effective capacity of a task: the configured stream limit, or fewer streams if the
+  measured CPU per stream says a task would go past `target_cpu` before reaching it
+- a lag factor: when frames are falling behind by more than `max_lag_seconds` every
+  stream is treated as (up to 2x) more expensive than its CPU suggests
+- the tasks needed for all streams, plus the backlog of unassigned streams
+
+Hysteresis and cooldowns keep it from flapping:
+- scale up as soon as more tasks are needed (after `scale_up_cooldown`), all at once, so
+  an onboarding spike is absorbed in one step
+- scale down only when the remaining tasks would still sit below (1 - scale_down_margin)
+  of their effective capacity, after `scale_down_cooldown`, and by at most
+  `max_scale_down_step` tasks at a time
+
+The backend is pluggable: ECSBackend reads the members item and updates the ECS service;
+the simulator in benchmarks/ provides its own.
+"""
+
+import math
+import time
+from collections import namedtuple
+
+from scheduler import read_member_entries
+
+# Per-task load as reported in the scheduler heartbeat; cpu and lag_seconds may be None
+TaskLoad = namedtuple('TaskLoad', ['streams', 'capacity', 'cpu', 'lag_seconds'])
+# What the autoscaler decides from
+LoadSignals = namedtuple('LoadSignals', ['total_streams', 'tasks'])
+
+
+class Autoscaler:
+    """
+    Computes and applies the desired task count.
+
+    ### Args
+    - backend - object with signals() -> LoadSignals, current() -> (desired, running) and set_desired(count)
+    - min_tasks, max_tasks - bounds on the task count
+    - target_cpu - CPU utilisation (fraction of a task's vCPUs) to plan for
+    - max_lag_seconds - frame lag above which tasks count as overloaded
+    - scale_up_cooldown, scale_down_cooldown - seconds after any change before scaling up / down again
+    - scale_down_margin - headroom the remaining tasks must keep before scaling down
+    - max_scale_down_step - tasks removed per scale-down
+    - clock - time source, replaced in simulations
+    """
+
+    def __init__(self, backend, min_tasks=1, max_tasks=50, target_cpu=0.7, max_lag_seconds=5.0,
+                 scale_up_cooldown=60.0, scale_down_cooldown=300.0, scale_down_margin=0.2,
+                 max_scale_down_step=2, clock=time.time):
+        self.backend = backend
+        self.min_tasks = min_tasks
+        self.max_tasks = max_tasks
+        self.target_cpu = target_cpu
+        self.max_lag_seconds = max_lag_seconds
+        self.scale_up_cooldown = scale_up_cooldown
+        self.scale_down_cooldown = scale_down_cooldown
+        self.scale_down_margin = scale_down_margin
+        self.max_scale_down_step = max_scale_down_step
+        self.clock = clock
+        self.last_change = None
+        self.history = [] # (time, old desired, new desired, reason)
+
+    def effective_capacity(self, signals):
+        """
+        Streams one task can take: the configured capacity, lowered by measured CPU per stream
+        """
+        capacity = min((task.capacity for task in signals.tasks), default=0) or 1
+        measured = [task for task in signals.tasks if task.cpu is not None and task.streams]
+        if measured:
+            cpu_per_stream = sum(task.cpu for task in measured) / sum(task.streams for task in measured)
+            if cpu_per_stream > 0:
+                capacity = min(capacity, self.target_cpu / cpu_per_stream)
+        return max(capacity, 1.0)
+
+    def lag_factor(self, signals):
+        lags = sorted(task.lag_seconds for task in signals.tasks if task.lag_seconds is not None)
+        if not lags:
+            return 1.0
+        worst = lags[int(0.9 * (len(lags) - 1))] # p90, so one stuck task doesn't double the fleet
+        return min(max(worst / self.max_lag_seconds, 1.0), 2.0)
+
+    def needed(self, signals):
+        """
+        Returns (tasks needed at target load, tasks that would still be under the
+        scale-down margin); both clamped to [min_tasks, max_tasks]
+        """
+        capacity = self.effective_capacity(signals)
+        demand = signals.total_streams * self.lag_factor(signals)
+        up = math.ceil(demand / capacity)
+        # Streams the bounded-load assignment couldn't place count on top, in case the
+        # fleet is fragmented (e.g. tasks with smaller capacities)
+        unassigned = signals.total_streams - sum(task.streams for task in signals.tasks)
+        if unassigned > 0 and len(signals.tasks) >= up:
+            up = max(up, len(signals.tasks) + math.ceil(unassigned / capacity))
+        down = math.ceil(demand / (capacity * (1 - self.scale_down_margin)))
+        clamp = lambda count: min(max(count, self.min_tasks), self.max_tasks)
+        return clamp(up), clamp(down)
+
+    def step(self):
+        """
+        One autoscaling decision. Returns the desired count that is now in effect
+        """
+        now = self.clock()
+        signals = self.backend.signals()
+        desired, running = self.backend.current()
+        up, down = self.needed(signals)
+        since_change = now - self.last_change if self.last_change is not None else math.inf
+
+        target, reason = desired, None
+        if up > desired:
+            if since_change >= self.scale_up_cooldown:
+                target, reason = up, 'scale up'
+        elif down < desired and running >= desired: # never scale down while tasks are still starting
+            if since_change >= self.scale_down_cooldown:
+                target, reason = max(down, desired - self.max_scale_down_step), 'scale down'
+
+        if reason:
+            print(f"Autoscaler: {reason} {desired} -> {target} ({signals.total_streams} streams, "
+                  f"{self.effective_capacity(signals):.1f} per task, lag x{self.lag_factor(signals):.2f})")
+            self.backend.set_desired(target)
+            self.history.append((now, desired, target, reason))
+            self.last_change = now
+        return target
+
+
+def is_leader(instance_id, members):
+    """
+    Only one task should run the autoscaler: the live member with the smallest id
+    """
+    return bool(members) and instance_id == min(members)
+
+
+class ECSBackend:
+    """
+    Reads load from the scheduler's members item and scales the ECS service
+
+    ### Args
+    - ecs, dynamodb - boto3 clients
+    - cluster, service - ECS cluster and service names
+    - stream_source - callable returning every stream name that should be processed
+    """
+
+    def __init__(self, ecs, dynamodb, cluster, service, stream_source, clock=time.time):
+        self.ecs = ecs
+        self.dynamodb = dynamodb
+        self.cluster = cluster
+        self.service = service
+        self.stream_source = stream_source
+        self.clock = clock
+
+    def signals(self):
+        now = self.clock()
+        tasks = [
+            TaskLoad(int(entry.get('streams', 0)), int(entry['capacity']), entry.get('cpu'), entry.get('lagSeconds'))
+            for entry in read_member_entries(self.dynamodb).values()
+            if entry['expiresAt'] > now
+        ]
+        return LoadSignals(len(list(self.stream_source())), tasks)
+
+    def current(self):
+        service = self.ecs.describe_services(cluster=self.cluster, services=[self.service])['services'][0]
+        return service['desiredCount'], service['runningCount']
+
+    def set_desired(self, count):
+        self.ecs.update_service(cluster=self.cluster, service=self.service, desiredCount=count)
@@ -0,0 +1,199 @@
+"""
+Cached, hot-reloadable configuration
+
+Settings live in SSM Parameter Store under /stream-processor/{ENVIRONMENT}/, e.g.
+/stream-processor/dev/uploader/workers. They are bulk-loaded with GetParametersByPath
+(10 per page) once at startup and kept in memory; reads are plain dict lookups and never
+call AWS. A daemon thread reloads them every `ttl` seconds and swaps in the new values
+atomically, so the frame loop never waits on SSM. A failed reload keeps the current
+values and tries again sooner.
+
+Lookup order for a name like 'uploader/workers':
+1. the environment variable UPLOADER_WORKERS (handy for local runs and one-off overrides)
+2. the parameter
+3. the default passed to the accessor
+
+FileSource reads the same settings from a JSON file (nested objects or "a/b" keys) and
+stands in for SSM in local runs and benchmarks.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+PARAMETER_PATH = os.environ.get('CONFIG_PARAMETER_PATH', f"/stream-processor/{ENVIRONMENT}/")
+
+_TRUE = {'1', 'true', 'yes', 'on'}
+_FALSE = {'0', 'false', 'no', 'off', ''}
+
+
+class SSMSource:
+    """
+    Loads every parameter under a path with GetParametersByPath
+    """
+
+    def __init__(self, ssm=None, path=PARAMETER_PATH):
+        if ssm is None:
+            import boto3
+            ssm = boto3.client('ssm')
+        self.ssm = ssm
+        self.path = path if path.endswith('/') else path + '/'
+
+    def load(self):
+        values = {}
+        paginator = self.ssm.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=self.path, Recursive=True, WithDecryption=True):
+            for parameter in page['Parameters']:
+                values[parameter['Name'][len(self.path):]] = parameter['Value']
+        return values
+
+
+class FileSource:
+    """
+    Loads settings from a JSON file; nested objects become 'a/b' names
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        values = {}
+
+        def flatten(prefix, value):
+            if isinstance(value, dict):
+                for key, child in value.items():
+                    flatten(f"{prefix}{key}/", child)
+            else:
+                values[prefix.rstrip('/')] = value if isinstance(value, str) else json.dumps(value)
+
+        flatten('', data)
+        return values
+
+
+class Config:
+    """
+    In-memory settings with background refresh.
+
+    ### Args
+    - source - object with load() -> {name: string value}
+    - ttl - seconds between background reloads
+    - environ - environment overrides (os.environ by default)
+    """
+
+    def __init__(self, source, ttl=300.0, environ=None):
+        self.source = source
+        self.ttl = ttl
+        self.environ = os.environ if environ is None else environ
+        self.version = 0 # bumped whenever a reload changes something
+        self.loaded_at = None
+        self._values = {}
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """
+        Reloads from the source. Returns the set of names that changed
+        """
+        values = self.source.load()
+        previous = self._values
+        changed = {name for name in set(values) | set(previous) if values.get(name) != previous.get(name)}
+        self._values = values # a single reference swap, so readers see old or new, never a mix
+        self.loaded_at = time.monotonic()
+        if changed:
+            self.version += 1
+            for listener in self._listeners:
+                try:
+                    listener(changed)
+                except Exception as e:
+                    print(f"Config listener error: {e}")
+        return changed
+
+    def _refresh_loop(self):
+        delay = self.ttl
+        while not self._stop.wait(delay):
+            try:
+                changed = self.refresh()
+                if changed:
+                    print(f"Config reloaded, changed: {', '.join(sorted(changed))}")
+                delay = self.ttl
+            except Exception as e:
+                # Keep serving the values we have; retry sooner than a full TTL
+                delay = min(self.ttl, 5.0) * random.uniform(0.5, 1.5)
+                print(f"Config reload failed, keeping current values: {e}")
+
+    def start(self):
+        """
+        Loads once (blocking, so a task never starts without its settings) and starts the
+        background refresh thread
+        """
+        self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, daemon=True, name='config-refresh')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def on_change(self, listener):
+        """
+        Calls listener(changed names) after every reload that changed something
+        """
+        self._listeners.append(listener)
+
+    # --- accessors
+    def raw(self, name):
+        override = self.environ.get(name.upper().replace('/', '_').replace('-', '_'))
+        return override if override is not None else self._values.get(name)
+
+    def _typed(self, name, default, parse):
+        value = self.raw(name)
+        if value is None:
+            return default
+        try:
+            return parse(value)
+        except (ValueError, TypeError) as e:
+            print(f"Invalid value for config '{name}' ({value!r}), using {default!r}: {e}")
+            return default
+
+    def get_str(self, name, default=None):
+        return self._typed(name, default, str)
+
+    def get_int(self, name, default=None):
+        return self._typed(name, default, int)
+
+    def get_float(self, name, default=None):
+        return self._typed(name, default, float)
+
+    def get_bool(self, name, default=None):
+        def parse(value):
+            value = value.strip().lower()
+            if value in _TRUE:
+                return True
+            if value in _FALSE:
+                return False
+            raise ValueError("expected true/false")
+        return self._typed(name, default, parse)
+
+    def get_list(self, name, default=None):
+        # SSM StringList parameters are comma-separated
+        return self._typed(name, default, lambda value: [item.strip() for item in value.split(',') if item.strip()])
+
+    def get_json(self, name, default=None):
+        return self._typed(name, default, json.loads)
+
+
+def from_environment():
+    """
+    Config backed by CONFIG_FILE when set (local runs), otherwise by SSM
+    """
+    ttl = float(os.environ.get('CONFIG_TTL_SECONDS', '300'))
+    config_file = os.environ.get('CONFIG_FILE')
+    source = FileSource(config_file) if config_file else SSMSource()
+    return Config(source, ttl=ttl)
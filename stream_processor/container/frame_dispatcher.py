@@ -0,0 +1,445 @@
+"""
+SQS frame dispatcher (the "FrameDispatcher" consumer of NewFrames.fifo)
+
+frameEnqueue_TF sends one message per uploaded frame ({"cameraId", "s3Key", "timestamp"}).
+The dispatcher runs PPE detection on each of them:
+- long-polls the queue for up to 10 messages per receive, and keeps receiving while
+  fewer than max_in_flight frames are being worked on, so Rekognition never waits on SQS
+- Rekognition reads each frame straight from S3 (S3Object, nothing is downloaded) on a
+  thread pool, behind a token bucket set to the account's DetectProtectiveEquipment TPS
+  quota. A throttled call empties the bucket and is retried with jittered backoff
+- results are stored in the compact format (ppe_summary) under rekognition_results/ like
+  connectClientToRekognition_TF does; the latest-result pointers and the SQS deletes are
+  written in bulk every flush_seconds, or as soon as 10 deletes are waiting (one pointer
+  per camera, deletes 10 per request) instead of once per frame. A FIFO group stays
+  locked until its messages are deleted, so deletes are not held back for long
+- while a frame is in flight (or waiting for its delete) its message's visibility timeout
+  is extended in ChangeMessageVisibilityBatch calls, so a slow call never has SQS hand the
+  frame to someone else
+- frames that can never succeed (bad message, missing object, unreadable image) are deleted
+  and logged. Anything else makes the message visible again after retry_seconds, so the
+  queue's redrive policy still moves a frame that keeps failing to its dead-letter queue
+
+Runs from the stream processor image with the command overridden:
+    python frame_dispatcher.py
+Settings come from the same config layer as main.py (dispatcher/*, see serve()).
+"""
+
+import json
+import os
+import random
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+import metrics
+from ppe_summary import dumps_compact, equipment_types_for_tags, summarize
+from result_layout import result_key
+from results_index import DEFAULT_CAMERA, write_latest_pointers
+
+MAX_BATCH = 10 # SQS ReceiveMessage / DeleteMessageBatch / ChangeMessageVisibilityBatch limit
+INDEX_WORKERS = 8 # concurrent latest-pointer updates per flush
+
+# Rekognition error codes: back off and retry / drop the frame for good
+THROTTLE_ERRORS = {'ThrottlingException', 'ProvisionedThroughputExceededException', 'LimitExceededException'}
+PERMANENT_ERRORS = {'InvalidS3ObjectException', 'InvalidImageFormatException', 'ImageTooLargeException',
+                    'InvalidParameterException'}
+
+FRAMES = metrics.counter('dispatcher_frames_total', "Frames by outcome (stored, rejected, retried)", ('outcome',))
+THROTTLED = metrics.counter('dispatcher_throttled_total', "Rekognition calls throttled by the service")
+WAIT_SECONDS = metrics.histogram('dispatcher_rate_wait_seconds', "Time a frame waited for a rate limiter token")
+
+
+def error_code(error):
+    """
+    AWS error code of a botocore ClientError (or the exception's class name)
+    """
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(error).__name__
+
+
+def captured_at(timestamp):
+    """
+    Epoch seconds of a frameEnqueue_TF timestamp (ISO 8601 UTC), or None (now) if it is missing or malformed
+    """
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `burst` saved up.
+
+    ### Args
+    - rate - calls per second, i.e. the account's TPS quota for the API
+    - burst - tokens the bucket holds (defaults to one second's worth)
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it. Returns the seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+    def throttled(self):
+        """
+        The service pushed back: spend whatever was saved up so callers slow down at once
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+class FrameDispatcher:
+    """
+    Consumes frame messages and stores a PPE result for each.
+
+    ### Args
+    - queue_url - NewFrames.fifo URL
+    - bucket - bucket the frames are in and the results go to
+    - sqs, s3, rekognition - clients (shared by every thread)
+    - rate - Rekognition calls per second (account TPS quota), or a RateLimiter
+    - workers - concurrent Rekognition calls; about rate x call latency keeps the quota busy
+    - max_in_flight - frames received but not finished; receiving pauses above it
+    - visibility_seconds - visibility timeout per receive, extended while a frame is in flight
+    - wait_seconds - ReceiveMessage long-poll time
+    - retry_seconds - how long a failed frame stays hidden before SQS hands it out again
+    - flush_seconds - how often pointers and deletes are written
+    - equipment_types - Rekognition equipment types to check (from PPE_TAGS by default)
+    - min_confidence - SummarizationAttributes MinConfidence
+    - max_throttle_retries - throttled attempts per frame before it is released for later
+    """
+
+    def __init__(self, queue_url, bucket, sqs, s3, rekognition, rate=5.0, workers=None, max_in_flight=None,
+                 visibility_seconds=60, wait_seconds=20, retry_seconds=10, flush_seconds=1.0,
+                 equipment_types=None, min_confidence=80.0, max_throttle_retries=5):
+        self.queue_url = queue_url
+        self.bucket = bucket
+        self.sqs = sqs
+        self.s3 = s3
+        self.rekognition = rekognition
+        self.limiter = rate if isinstance(rate, RateLimiter) else RateLimiter(rate)
+        self.workers = workers or max(4, int(self.limiter.rate * 2))
+        self.max_in_flight = max_in_flight or max(MAX_BATCH, self.workers * 2)
+        self.visibility_seconds = visibility_seconds
+        self.wait_seconds = wait_seconds
+        self.retry_seconds = retry_seconds
+        self.flush_seconds = flush_seconds
+        self.equipment_types = equipment_types or equipment_types_for_tags(os.environ.get('PPE_TAGS', ''))
+        self.min_confidence = min_confidence
+        self.max_throttle_retries = max_throttle_retries
+        self.stats = Counter()
+        self._held = {} # receipt handle -> message id, from receive until deleted or released
+        self._working = 0 # frames received and not yet finished
+        self._deletes = [] # receipt handles of finished frames
+        self._latest = {} # camera id -> (timestamp, result key) of its newest stored frame
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._wake = threading.Event() # set when a full delete batch is waiting
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='dispatch')
+        # Pointer updates are conditional (GET + PUT each), so a flush spreads them out
+        # rather than holding up the housekeeping thread that extends visibility
+        self._index_pool = ThreadPoolExecutor(INDEX_WORKERS, thread_name_prefix='dispatch-index')
+        self._housekeeper = None
+
+    def _count(self, name):
+        with self._condition:
+            self.stats[name] += 1
+
+    def in_flight(self):
+        """
+        Frames received and not yet finished
+        """
+        return self._working
+
+    # --- receiving ---------------------------------------------------------------------
+
+    def _room(self):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stop.is_set() or self._working + MAX_BATCH <= self.max_in_flight, timeout=1.0
+            )
+            return max(0, min(MAX_BATCH, self.max_in_flight - self._working))
+
+    def poll(self):
+        """
+        One long-poll receive; hands every message to the pool. Returns the number received
+        """
+        room = self._room()
+        if not room or self._stop.is_set():
+            return 0
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=room,
+            WaitTimeSeconds=self.wait_seconds,
+            VisibilityTimeout=self.visibility_seconds
+        )
+        messages = response.get('Messages', [])
+        with self._condition:
+            for message in messages:
+                self._held[message['ReceiptHandle']] = message['MessageId']
+            self._working += len(messages)
+            self.stats['received'] += len(messages)
+            self.stats['receives'] += 1
+        for message in messages:
+            self._pool.submit(self._process, message)
+        return len(messages)
+
+    # --- one frame ---------------------------------------------------------------------
+
+    def _detect(self, key):
+        for attempt in range(self.max_throttle_retries + 1):
+            WAIT_SECONDS.observe(self.limiter.acquire())
+            self._count('rekognition_calls')
+            try:
+                return self.rekognition.detect_protective_equipment(
+                    Image={'S3Object': {'Bucket': self.bucket, 'Name': key}},
+                    SummarizationAttributes={
+                        'MinConfidence': self.min_confidence,
+                        'RequiredEquipmentTypes': self.equipment_types
+                    }
+                )
+            except Exception as e:
+                if error_code(e) not in THROTTLE_ERRORS or attempt == self.max_throttle_retries:
+                    raise
+                self.limiter.throttled()
+                self._count('throttled')
+                THROTTLED.inc()
+                time.sleep(random.uniform(0, min(2.0, 0.1 * 2 ** attempt)))
+
+    def _process(self, message):
+        handle = message['ReceiptHandle']
+        try:
+            body = json.loads(message['Body'])
+            key = body['s3Key']
+            camera_id = body.get('cameraId') or DEFAULT_CAMERA
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Dropping malformed message {message['MessageId']}: {e}")
+            return self._finish(handle, 'rejected')
+        try:
+            response = self._detect(key)
+            result = summarize(response, camera_id, self.equipment_types)
+            result['frameKey'] = key
+            # Partitioned by capture time, so history queries find the frame where it was taken
+            stored_key = result_key(camera_id, captured_at(body.get('timestamp')))
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=stored_key,
+                Body=dumps_compact(result),
+                ContentType='application/json'
+            )
+        except Exception as e:
+            if error_code(e) in PERMANENT_ERRORS:
+                print(f"Dropping frame {key}: {e}")
+                return self._finish(handle, 'rejected')
+            print(f"Frame {key} failed, retrying in {self.retry_seconds} s: {e}")
+            return self._release(handle)
+        self._finish(handle, 'stored', camera_id, body.get('timestamp') or '', stored_key)
+
+    def _finish(self, handle, outcome, camera_id=None, timestamp=None, stored_key=None):
+        # The message stays held (and its visibility extended) until the next flush deletes it
+        with self._condition:
+            self._deletes.append(handle)
+            if len(self._deletes) >= MAX_BATCH:
+                self._wake.set()
+            if stored_key and (camera_id not in self._latest or timestamp >= self._latest[camera_id][0]):
+                self._latest[camera_id] = (timestamp, stored_key)
+            self._working -= 1
+            self.stats[outcome] += 1
+            self._condition.notify_all()
+        FRAMES.labels(outcome).inc()
+
+    def _release(self, handle):
+        with self._condition:
+            self._held.pop(handle, None)
+            self._working -= 1
+            self.stats['retried'] += 1
+            self._condition.notify_all()
+        FRAMES.labels('retried').inc()
+        try:
+            self.sqs.change_message_visibility(
+                QueueUrl=self.queue_url, ReceiptHandle=handle, VisibilityTimeout=self.retry_seconds
+            )
+        except Exception as e:
+            print(f"Error releasing message: {e}") # it comes back when its visibility timeout runs out
+
+    # --- bulk writes -------------------------------------------------------------------
+
+    def _batches(self, handles):
+        for start in range(0, len(handles), MAX_BATCH):
+            yield [{'Id': str(index), 'ReceiptHandle': handle}
+                   for index, handle in enumerate(handles[start:start + MAX_BATCH])]
+
+    def flush(self):
+        """
+        Writes the latest-result pointers, then deletes the finished messages
+        """
+        with self._condition:
+            handles, self._deletes = self._deletes, []
+            latest, self._latest = self._latest, {}
+        if latest:
+            try:
+                write_latest_pointers(self.s3, self.bucket, {
+                    camera_id: stored_key for camera_id, (_, stored_key) in sorted(latest.items(), key=lambda item: item[1])
+                }, executor=self._index_pool)
+            except Exception as e:
+                # The results are stored; the next flush repairs the index
+                print(f"Error updating latest-result index: {e}")
+        for entries in self._batches(handles):
+            try:
+                response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+                for failure in response.get('Failed', []):
+                    print(f"Delete failed: {failure.get('Code')} {failure.get('Message')}")
+            except Exception as e:
+                print(f"Error deleting messages: {e}") # they come back and are processed again
+            with self._condition:
+                self.stats['delete_batches'] += 1
+                for entry in entries:
+                    self._held.pop(entry['ReceiptHandle'], None)
+
+    def extend_visibility(self):
+        """
+        Pushes back the visibility timeout of every held message
+        """
+        with self._condition:
+            handles = list(self._held)
+        for entries in self._batches(handles):
+            for entry in entries:
+                entry['VisibilityTimeout'] = self.visibility_seconds
+            try:
+                self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            except Exception as e:
+                print(f"Error extending visibility: {e}")
+            self._count('visibility_batches')
+
+    def _housekeeping(self):
+        # Extend at a third of the timeout so one failed batch call still leaves time for the next
+        extend_every = self.visibility_seconds / 3
+        next_flush = next_extend = time.monotonic()
+        while not self._stop.is_set():
+            self._wake.wait(min(self.flush_seconds, extend_every))
+            self._wake.clear()
+            now = time.monotonic()
+            if now >= next_extend:
+                self.extend_visibility()
+                next_extend = now + extend_every
+            if now >= next_flush or len(self._deletes) >= MAX_BATCH:
+                self.flush()
+                next_flush = now + self.flush_seconds
+
+    # --- lifecycle ---------------------------------------------------------------------
+
+    def start(self):
+        self._housekeeper = threading.Thread(target=self._housekeeping, daemon=True, name='dispatch-housekeeping')
+        self._housekeeper.start()
+        return self
+
+    def run(self, stop=None):
+        """
+        Receives until `stop` (or stop()) is set, then finishes the frames in flight
+        """
+        stop = stop or self._stop
+        self.start()
+        while not stop.is_set() and not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Receive error: {e}")
+                time.sleep(1.0)
+        self.stop()
+
+    def stop(self, timeout=20.0):
+        """
+        Stops receiving, waits up to `timeout` seconds for the frames in flight, and
+        writes the last pointers and deletes. Frames still unfinished come back via SQS
+        """
+        self._stop.set()
+        self._wake.set()
+        with self._condition:
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._working == 0, timeout=timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._housekeeper:
+            self._housekeeper.join()
+        self.flush()
+        self._index_pool.shutdown()
+
+
+def serve(settings):
+    import boto3
+    from botocore.config import Config
+
+    metrics.serve(settings.get_int('metrics/port', 5000))
+    rate = settings.get_float('dispatcher/rekognition_tps', 5.0)
+    workers = settings.get_int('dispatcher/workers') or max(4, int(rate * 2))
+    client_config = Config(
+        max_pool_connections=workers + 2,
+        tcp_keepalive=True,
+        retries={'max_attempts': 1, 'mode': 'standard'} # throttling is handled by the rate limiter
+    )
+    client = lambda service: metrics.instrument_client(boto3.client(service, config=client_config))
+    queue_url = settings.get_str('dispatcher/queue_url', os.environ.get('FRAME_QUEUE_URL'))
+    bucket = settings.get_str('dispatcher/bucket', os.environ.get('BUCKET_NAME'))
+    if not queue_url or not bucket:
+        raise SystemExit("dispatcher/queue_url (FRAME_QUEUE_URL) and dispatcher/bucket (BUCKET_NAME) must be set")
+
+    dispatcher = FrameDispatcher(
+        queue_url, bucket, client('sqs'), client('s3'), client('rekognition'),
+        rate=rate,
+        workers=workers,
+        max_in_flight=settings.get_int('dispatcher/max_in_flight'),
+        visibility_seconds=settings.get_int('dispatcher/visibility_seconds', 60),
+        retry_seconds=settings.get_int('dispatcher/retry_seconds', 10),
+        equipment_types=equipment_types_for_tags(settings.get_str('dispatcher/ppe_tags', os.environ.get('PPE_TAGS', ''))),
+        min_confidence=settings.get_float('dispatcher/min_confidence', 80.0)
+    )
+    # A raised quota only needs a parameter change
+    settings.on_change(lambda changed: setattr(dispatcher.limiter, 'rate', settings.get_float('dispatcher/rekognition_tps', rate)))
+    metrics.gauge('dispatcher_frames_in_flight', "Frames received and not yet finished").set_function(dispatcher.in_flight)
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    print(f"Dispatching {queue_url} at {rate} TPS with {dispatcher.workers} workers")
+    try:
+        dispatcher.run(stop)
+    finally:
+        print(f"Dispatcher stopped: {dict(dispatcher.stats)}")
+        settings.stop()
+
+
+def main():
+    serve(config.from_environment().start())
+
+
+if __name__ == '__main__':
+    main()
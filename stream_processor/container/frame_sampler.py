@@ -0,0 +1,119 @@
+"""
+Motion-gated frame sampler
+
+Sits between frame decoding and the S3 upload. A frame is forwarded only when it differs
+enough from the last forwarded frame of the same camera, or when the camera has been
+quiet for longer than the keep-alive interval, so static scenes stop costing S3 PUTs
+and Rekognition calls.
+
+Frame differencing is vectorised NumPy on a strided, grayscale copy of the frame
+(every `downsample`-th pixel). Each camera gets an adaptive threshold: a slow moving
+average of its idle motion score (sensor noise, flicker, swaying trees) is tracked and
+the effective threshold never drops below a multiple of it.
+"""
+
+import time
+
+import numpy as np
+
+# ITU-R BT.601 luma weights, applied to RGB frames; BGR frames (OpenCV) swap R and B
+_RGB_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class _CameraState:
+    __slots__ = ('reference', 'last_forwarded', 'noise', 'frames_in', 'frames_out', 'cpu_seconds')
+
+    def __init__(self):
+        self.reference = None      # downsampled grayscale of the last forwarded frame
+        self.last_forwarded = None # timestamp of the last forwarded frame
+        self.noise = 0.0           # moving average of the motion score on idle frames
+        self.frames_in = 0
+        self.frames_out = 0
+        self.cpu_seconds = 0.0
+
+
+class MotionSampler:
+    """
+    Decides per frame whether it should be forwarded.
+
+    ### Args
+    - threshold - minimum fraction of changed pixels that counts as motion
+    - keepalive_seconds - forward at least one frame this often even without motion
+    - pixel_delta - grey-level change (0-255) for a pixel to count as changed
+    - downsample - keep every Nth pixel in both directions before differencing
+    - noise_factor - the effective threshold is at least noise_factor * the camera's idle noise
+    - noise_rate - smoothing factor of the idle-noise moving average
+    - bgr - frames are BGR (OpenCV) rather than RGB
+    """
+
+    def __init__(self, threshold=0.02, keepalive_seconds=5.0, pixel_delta=25, downsample=8,
+                 noise_factor=3.0, noise_rate=0.05, bgr=False):
+        self.threshold = threshold
+        self.keepalive_seconds = keepalive_seconds
+        self.pixel_delta = pixel_delta
+        self.downsample = downsample
+        self.noise_factor = noise_factor
+        self.noise_rate = noise_rate
+        self.weights = _RGB_WEIGHTS[::-1].copy() if bgr else _RGB_WEIGHTS
+        self._cameras = {}
+
+    def _grayscale(self, frame):
+        small = frame[::self.downsample, ::self.downsample]
+        if small.ndim == 3:
+            return small[..., :3].astype(np.float32) @ self.weights
+        return small.astype(np.float32)
+
+    def motion_score(self, reference, gray):
+        """
+        Fraction of (downsampled) pixels that changed by more than pixel_delta
+        """
+        return float(np.count_nonzero(np.abs(gray - reference) > self.pixel_delta)) / gray.size
+
+    def threshold_for(self, camera_id):
+        state = self._cameras.get(camera_id)
+        noise = state.noise if state else 0.0
+        return max(self.threshold, self.noise_factor * noise)
+
+    def should_forward(self, camera_id, frame, timestamp=None):
+        """
+        Returns True if this frame (HxW grayscale or HxWx3 array) should be forwarded
+        """
+        started = time.process_time()
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self._cameras.get(camera_id)
+        if state is None:
+            state = self._cameras[camera_id] = _CameraState()
+        state.frames_in += 1
+
+        gray = self._grayscale(frame)
+        if state.reference is None or state.reference.shape != gray.shape:
+            forward = True # first frame (or a resolution change) always goes through
+        else:
+            score = self.motion_score(state.reference, gray)
+            threshold = self.threshold_for(camera_id)
+            forward = score >= threshold or timestamp - state.last_forwarded >= self.keepalive_seconds
+            if score < threshold:
+                # Only idle frames feed the noise estimate, so real motion can't raise the bar
+                state.noise += self.noise_rate * (score - state.noise)
+
+        if forward:
+            state.reference = gray
+            state.last_forwarded = timestamp
+            state.frames_out += 1
+        state.cpu_seconds += time.process_time() - started
+        return forward
+
+    def stats(self):
+        """
+        Per-camera frames in/out, reduction and CPU cost per frame
+        """
+        return {
+            camera_id: {
+                'frames_in': state.frames_in,
+                'frames_out': state.frames_out,
+                'reduction': 1 - state.frames_out / state.frames_in if state.frames_in else 0.0,
+                'cpu_ms_per_frame': state.cpu_seconds / state.frames_in * 1000 if state.frames_in else 0.0,
+                'threshold': self.threshold_for(camera_id)
+            }
+            for camera_id, state in self._cameras.items()
+        }
@@ -0,0 +1,326 @@
+"""
+asyncio multi-stream Kinesis Video Streams ingest
+
+One KVSClient pulls every stream assigned to this task concurrently. Each stream gets a
+StreamSession that:
+- holds one GetMedia (MKV chunks) or GetImages (JPEG) session open
+- parses the MKV as it arrives (mkv_parser) and pushes only the frames worth decoding
+  (keyframes by default) into a bounded per-stream queue; when the consumer falls behind
+  the queue fills up and the session stops reading, so backpressure reaches the socket
+  instead of piling up in memory
+- remembers the last fragment number / continuation token it saw and resumes from
+  there after a disconnect, with jittered exponential backoff; frames of a re-read
+  fragment that were already queued are dropped
+
+boto3 is blocking, so the actual reads run on the source's own thread pool, sized to the
+number of streams (a GetMedia read holds its thread for as long as the stream is quiet), while
+the event loop keeps every other stream moving. The default pool is left to everything else.
+
+Media sources are pluggable: KVSMediaSource and KVSImageSource talk to AWS, and the
+benchmarks use a local fake that replays MKV/JPEG fixtures.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import instrument_client
+from mkv_parser import MKVParser
+
+# What a session hands to its consumer. data is the encoded frame (H.264 access unit or JPEG)
+StreamFrame = namedtuple('StreamFrame', [
+    'stream_name', 'fragment_number', 'timecode_ms', 'keyframe', 'codec_id', 'codec_private', 'data', 'received_at'
+])
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def _blocking(executor, function, *args, **kwargs):
+    # Runs a blocking boto3 call on `executor` instead of the loop's default pool
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+
+class KVSMediaSource:
+    """
+    GetMedia source. Resolves each stream's data endpoint once (again only after a failed
+    GetMedia), then streams the MKV payload in CHUNK_SIZE reads.
+
+    Every stream holds one of the source's `max_streams` threads while it reads, so size it
+    to the most streams this task can be assigned
+    """
+    container = 'mkv'
+
+    def __init__(self, region_name=None, max_streams=64):
+        import boto3
+        from botocore.config import Config
+        self._session = boto3.session.Session(region_name=region_name)
+        self._config = Config(max_pool_connections=max_streams, tcp_keepalive=True, read_timeout=30)
+        self._kvs = instrument_client(self._session.client('kinesisvideo', config=self._config))
+        self._media_clients = {} # endpoint -> kinesis-video-media client
+        self._stream_clients = {} # stream name -> client for its data endpoint
+        # A few threads on top of one per stream for the short get_data_endpoint calls
+        self._executor = ThreadPoolExecutor(max_streams + 4, thread_name_prefix='getmedia')
+
+    def _media_client(self, stream_name):
+        if stream_name not in self._stream_clients:
+            endpoint = self._kvs.get_data_endpoint(StreamName=stream_name, APIName='GET_MEDIA')['DataEndpoint']
+            if endpoint not in self._media_clients:
+                self._media_clients[endpoint] = instrument_client(self._session.client(
+                    'kinesis-video-media', endpoint_url=endpoint, config=self._config
+                ))
+            self._stream_clients[stream_name] = self._media_clients[endpoint]
+        return self._stream_clients[stream_name]
+
+    async def open(self, stream_name, resume):
+        """
+        Async iterator of raw MKV bytes, starting after `resume` (see StreamSession._start_selector)
+        """
+        client = await _blocking(self._executor, self._media_client, stream_name)
+        try:
+            response = await _blocking(self._executor, client.get_media, StreamName=stream_name, StartSelector=resume)
+        except Exception:
+            self._stream_clients.pop(stream_name, None) # the endpoint may have moved: resolve it again
+            raise
+        payload = response['Payload']
+        try:
+            while True:
+                data = await _blocking(self._executor, payload.read, CHUNK_SIZE)
+                if not data:
+                    return
+                yield data
+        finally:
+            payload.close()
+
+    def close(self):
+        # Reads still blocked end on their own within read_timeout
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class KVSImageSource:
+    """
+    GetImages source: polls the archived-media API for JPEG images sampled every
+    `sampling_ms`. Each yielded chunk is one JPEG
+    """
+    container = 'jpeg'
+
+    def __init__(self, region_name=None, sampling_ms=1000, poll_seconds=2.0, max_streams=64):
+        import boto3
+        from botocore.config import Config
+        self._session = boto3.session.Session(region_name=region_name)
+        self._config = Config(max_pool_connections=max_streams, tcp_keepalive=True)
+        self._kvs = instrument_client(self._session.client('kinesisvideo', config=self._config))
+        self._clients = {}
+        self._executor = ThreadPoolExecutor(max_streams, thread_name_prefix='getimages')
+        self.sampling_ms = sampling_ms
+        self.poll_seconds = poll_seconds
+        self.last_timestamp = {} # stream -> timestamp of the newest image returned
+
+    def _archive_client(self, stream_name):
+        if stream_name not in self._clients:
+            endpoint = self._kvs.get_data_endpoint(StreamName=stream_name, APIName='GET_IMAGES')['DataEndpoint']
+            self._clients[stream_name] = instrument_client(self._session.client(
+                'kinesis-video-archived-media', endpoint_url=endpoint, config=self._config
+            ))
+        return self._clients[stream_name]
+
+    async def open(self, stream_name, resume):
+        import base64
+        from datetime import datetime, timezone
+        client = await _blocking(self._executor, self._archive_client, stream_name)
+        start = self.last_timestamp.get(stream_name) or time.time() - self.poll_seconds
+        while True:
+            end = time.time()
+            response = await _blocking(
+                self._executor, client.get_images,
+                StreamName=stream_name,
+                ImageSelectorType='PRODUCER_TIMESTAMP',
+                StartTimestamp=datetime.fromtimestamp(start, tz=timezone.utc),
+                EndTimestamp=datetime.fromtimestamp(end, tz=timezone.utc),
+                SamplingInterval=self.sampling_ms,
+                Format='JPEG'
+            )
+            for image in response.get('Images', []):
+                if image.get('ImageContent'):
+                    self.last_timestamp[stream_name] = image['TimeStamp'].timestamp() + 0.001
+                    yield base64.b64decode(image['ImageContent'])
+            start = self.last_timestamp.get(stream_name, end)
+            await asyncio.sleep(self.poll_seconds)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamSession:
+    """
+    Reads one stream into a bounded queue and resumes after disconnects.
+
+    ### Args
+    - stream_name - KVS stream to read
+    - source - media source with an async `open(stream_name, start_selector)` iterator
+    - max_buffered - queue size in frames; a full queue pauses reading (backpressure)
+    - keyframes_only, every_nth - which frames are queued (see MKVParser)
+    """
+
+    def __init__(self, stream_name, source, max_buffered=32, keyframes_only=True, every_nth=1, max_backoff=30.0):
+        self.stream_name = stream_name
+        self.source = source
+        self.queue = asyncio.Queue(maxsize=max_buffered)
+        self.keyframes_only = keyframes_only
+        self.every_nth = every_nth
+        self.max_backoff = max_backoff
+        self.last_fragment = None
+        self.continuation_token = None
+        self.last_queued = None # (fragment number, timecode) of the newest queued frame
+        self.stats = {'chunks': 0, 'bytes': 0, 'frames': 0, 'reconnects': 0, 'blocked_seconds': 0.0}
+        self._task = None
+
+    def _start_selector(self):
+        # Prefer the continuation token a cleanly-ended response carries. After a dropped
+        # connection, restart at the last fragment seen: GetMedia starts *at* that fragment,
+        # so the one that was cut off is read again in full (at-least-once)
+        token, self.continuation_token = self.continuation_token, None # only valid once
+        if token:
+            return {'StartSelectorType': 'CONTINUATION_TOKEN', 'ContinuationToken': token}
+        if self.last_fragment:
+            return {'StartSelectorType': 'FRAGMENT_NUMBER', 'AfterFragmentNumber': self.last_fragment}
+        return {'StartSelectorType': 'NOW'}
+
+    async def _put(self, item):
+        if self.queue.full():
+            started = time.monotonic()
+            await self.queue.put(item)
+            self.stats['blocked_seconds'] += time.monotonic() - started
+        else:
+            self.queue.put_nowait(item)
+
+    def _frames(self, parser, data):
+        if parser is None: # GetImages: every chunk is a JPEG
+            return [StreamFrame(self.stream_name, None, int(time.time() * 1000), True, 'V_MJPEG', None, data, time.time())]
+        frames = []
+        for frame in parser.feed(data):
+            if parser.fragment_number:
+                self.last_fragment = parser.fragment_number
+            position = (frame.fragment_number, frame.timecode_ms)
+            if self.last_queued and position[0] == self.last_queued[0] and position[1] <= self.last_queued[1]:
+                continue # already queued before the connection dropped
+            self.last_queued = position
+            frames.append(StreamFrame(
+                self.stream_name, frame.fragment_number, frame.timecode_ms, frame.keyframe,
+                parser.codec_id, parser.codec_private, frame.data, time.time()
+            ))
+        if parser.fragment_number:
+            self.last_fragment = parser.fragment_number
+        self.continuation_token = parser.continuation_token
+        return frames
+
+    async def run(self):
+        backoff = 0.5
+        while True:
+            # A fresh parser per response: every GetMedia response starts with a new EBML header
+            parser = MKVParser(self.keyframes_only, self.every_nth) if self.source.container == 'mkv' else None
+            try:
+                async for data in self.source.open(self.stream_name, self._start_selector()):
+                    self.stats['chunks'] += 1
+                    self.stats['bytes'] += len(data)
+                    for frame in self._frames(parser, data):
+                        self.stats['frames'] += 1
+                        await self._put(frame)
+                    backoff = 0.5 # data is flowing again
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream '{self.stream_name}' disconnected: {e}")
+            # GetMedia ends when the producer pauses or the connection drops; resume either way
+            self.stats['reconnects'] += 1
+            await asyncio.sleep(random.uniform(0, backoff))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class KVSClient:
+    """
+    Holds one StreamSession per assigned stream and feeds every selected frame to `handler`.
+
+    `handler(frame)` is an async callable taking a StreamFrame; each stream has its own
+    consumer task, so a slow stream only backs up its own queue
+    """
+
+    def __init__(self, source, handler, max_buffered=32, keyframes_only=True, every_nth=1):
+        self.source = source
+        self.handler = handler
+        self.max_buffered = max_buffered
+        self.keyframes_only = keyframes_only
+        self.every_nth = every_nth
+        self.sessions = {}
+        self._consumers = {}
+
+    async def _consume(self, session):
+        while True:
+            frame = await session.queue.get()
+            try:
+                await self.handler(frame)
+            except Exception as e:
+                print(f"Handler error on '{session.stream_name}': {e}")
+            finally:
+                session.queue.task_done()
+
+    def add_stream(self, stream_name):
+        if stream_name in self.sessions:
+            return self.sessions[stream_name]
+        session = StreamSession(stream_name, self.source, self.max_buffered, self.keyframes_only, self.every_nth)
+        self.sessions[stream_name] = session
+        session.start()
+        self._consumers[stream_name] = asyncio.ensure_future(self._consume(session))
+        return session
+
+    async def remove_stream(self, stream_name):
+        session = self.sessions.pop(stream_name, None)
+        consumer = self._consumers.pop(stream_name, None)
+        if session:
+            await session.stop()
+        if consumer:
+            consumer.cancel()
+            try:
+                await consumer
+            except asyncio.CancelledError:
+                pass
+
+    async def set_streams(self, stream_names):
+        """
+        Starts sessions for new streams and stops sessions for streams no longer assigned
+        """
+        wanted = set(stream_names)
+        for stream_name in list(self.sessions):
+            if stream_name not in wanted:
+                await self.remove_stream(stream_name)
+        for stream_name in wanted:
+            self.add_stream(stream_name)
+
+    async def close(self, drain=False):
+        """
+        Stops every stream. With drain, reading stops first and the frames already queued
+        are handed to the handler before the consumers go away
+        """
+        if drain:
+            for session in self.sessions.values():
+                await session.stop()
+            await asyncio.gather(*(session.queue.join() for session in self.sessions.values()))
+        for stream_name in list(self.sessions):
+            await self.remove_stream(stream_name)
+
+    def stats(self):
+        return {name: dict(session.stats, queued=session.queue.qsize()) for name, session in self.sessions.items()}
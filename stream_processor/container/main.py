@@ -1 +1,490 @@
-print("Hello from the container!")
\ No newline at end of file
+"""
+Stream processor runtime
+
+Reads the KVS streams this task holds a lease on and uploads the frames worth analysing
+as JPEGs to cameras/{streamName}/frames/{timestamp}.jpg, where frameEnqueue_TF picks them up.
+
+    ingest ──▶ decode queue ──▶ decode + sample ──▶ encode queue ──▶ JPEG encode ──▶ uploader
+    (asyncio)                   (worker processes)                   (worker processes)  (S3 threads)
+
+    heartbeat: scheduler leases, autoscaler (leader only), stats    (own control thread)
+
+- Ingest runs on the asyncio loop (kvs_client); it only parses MKV and copies out the
+  selected frames.
+- Decoding, motion sampling and JPEG encoding are CPU-bound, so they run in worker
+  processes and never hold the GIL the network I/O needs. Every stream is pinned to one
+  single-process shard: its H.264 decoder and sampler state live there, its frames stay
+  in order, and a decoded frame waits in the shard for its encode step instead of being
+  pickled back (only the JPEG crosses back).
+- The queues between stages are bounded. A full queue blocks the stage in front of it,
+  back to the stream sessions, which then stop reading their sockets. The uploader
+  never blocks: it drops a camera's oldest frame when S3 falls behind.
+- On SIGTERM (ECS stopping the task) ingest stops first, the frames already read are
+  decoded, encoded and uploaded, and then the leases are released so other tasks take
+  the streams over at once. ECS kills the task 30 s after SIGTERM, so the drain is
+  capped at pipeline/drain_seconds.
+- The heartbeat's blocking scheduler and autoscaler calls run on a control thread of
+  their own, never on a pool that stream reads or uploads can fill, so a busy task keeps
+  renewing its leases instead of being fenced off its own streams.
+
+Pipeline.stats() has end-to-end frames per second and per-stage latency; it is logged
+every pipeline/stats_seconds. The same numbers, with per-camera frame lag, queue depths
+and AWS call counts, are served in Prometheus format on :5000/metrics (lambdas/metrics.py).
+benchmarks/bench_pipeline.py runs the pipeline on local fixtures.
+"""
+
+import asyncio
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import urllib.request
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import config
+import metrics
+from autoscaler import Autoscaler, ECSBackend, is_leader
+from frame_sampler import MotionSampler
+from kvs_client import KVSClient, KVSImageSource, KVSMediaSource
+from mkv_parser import Frame, FrameDecoder
+from s3_uploader import S3Uploader
+from scheduler import Scheduler, list_kvs_streams
+
+_EPOCH_MS = 10 ** 12 # KVS timecodes above this are producer wall-clock milliseconds
+
+# A selected frame on its way through the stages
+_Work = namedtuple('_Work', ['frame', 'ref', 'timestamp', 'decoded_at'])
+
+STAGE_SECONDS = metrics.histogram('pipeline_stage_seconds', "Time a frame spends in each pipeline stage", ('stage',))
+FRAMES = metrics.counter('pipeline_frames_total', "Frames by outcome (read, forwarded, skipped, error)", ('outcome',))
+FRAME_LAG = metrics.gauge('camera_frame_lag_seconds', "Frame timestamp to upload queue, newest frame per camera", ('camera',))
+TICK_SECONDS = metrics.histogram('scheduler_tick_seconds', "Lease scheduler round, DynamoDB calls included")
+
+
+# --- worker processes ----------------------------------------------------------------------
+# Each shard process keeps the decoders of its streams, one sampler, and the decoded
+# frames that are waiting for their encode step
+
+_decoders = {}
+_sampler = None
+_decoded = {}
+
+
+def _init_worker(sampler_settings):
+    global _sampler
+    # The parent decides when to stop, and drains through the workers first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    _sampler = MotionSampler(**sampler_settings)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _decode_and_sample(stream_name, codec_id, codec_private, data, timestamp, ref, keyframes_only, sampler_settings):
+    """
+    Decodes one frame and keeps it for _encode if the sampler forwards it.
+    Returns (forwarded, CPU seconds)
+    """
+    started = time.process_time()
+    for name, value in sampler_settings.items(): # hot-reloaded; per-camera state is kept
+        setattr(_sampler, name, value)
+    decoder = _decoders.get(stream_name)
+    if decoder is None or decoder.codec_id != codec_id:
+        decoder = _decoders[stream_name] = FrameDecoder(codec_id, codec_private, keyframes_only)
+    image = decoder.decode(Frame(None, None, True, data, None))
+    forwarded = image is not None and _sampler.should_forward(stream_name, image, timestamp)
+    if forwarded and codec_id != 'V_MJPEG': # JPEG input is uploaded as it came
+        _decoded[ref] = image
+    return forwarded, time.process_time() - started
+
+
+def _encode(ref, quality):
+    """
+    JPEG-encodes a frame kept by _decode_and_sample. Returns (JPEG bytes, CPU seconds)
+    """
+    from PIL import Image
+    started = time.process_time()
+    buffer = io.BytesIO()
+    Image.fromarray(_decoded.pop(ref)).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue(), time.process_time() - started
+
+
+def _forget(stream_name):
+    _decoders.pop(stream_name, None)
+
+
+# --- pipeline ------------------------------------------------------------------------------
+
+class StageTimer:
+    """
+    Frame count and recent latencies (seconds) of one stage, also observed into `histogram`
+    """
+
+    def __init__(self, histogram=None, window=5000):
+        self.histogram = histogram
+        self.count = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.count += 1
+        self.latencies.append(seconds)
+        if self.histogram:
+            self.histogram.observe(seconds)
+
+    def percentile(self, percentile):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+class Pipeline:
+    """
+    Ingest, decode/sample, encode and upload stages connected by bounded queues.
+
+    ### Args
+    - source - media source for kvs_client (KVSMediaSource, KVSImageSource or a local fake)
+    - uploader - S3Uploader the JPEGs are handed to
+    - workers - decode/encode worker processes (default: one per CPU)
+    - decode_queue, encode_queue - frames allowed to wait in front of each stage
+    - max_buffered - frames each stream session buffers before it stops reading
+    - keyframes_only, every_nth - which frames are decoded (see MKVParser)
+    - sampler_settings - MotionSampler arguments; threshold and keepalive_seconds may change while running
+    - jpeg_quality - quality of the uploaded JPEGs
+    """
+
+    def __init__(self, source, uploader, workers=None, decode_queue=64, encode_queue=32, max_buffered=16,
+                 keyframes_only=True, every_nth=1, sampler_settings=None, jpeg_quality=85):
+        self.uploader = uploader
+        self.workers = workers or len(os.sched_getaffinity(0))
+        self.keyframes_only = keyframes_only
+        self.sampler_settings = dict(sampler_settings or {})
+        self.jpeg_quality = jpeg_quality
+        self.kvs = KVSClient(source, self._ingest, max_buffered, keyframes_only, every_nth)
+        self.decode_queue = asyncio.Queue(maxsize=decode_queue)
+        self.encode_queue = asyncio.Queue(maxsize=encode_queue)
+        # ingest: read -> decode starts (both queues); decode: decode + sample;
+        # encode: queued for and running the encode; total: read -> handed to the uploader
+        self.stages = {name: StageTimer(STAGE_SECONDS.labels(name)) for name in ('ingest', 'decode', 'encode', 'total')}
+        self.counts = {'frames': 0, 'forwarded': 0, 'skipped': 0, 'errors': 0}
+        self.worker_cpu = 0.0
+        self.started_at = None
+        self._shards = []
+        self._tasks = []
+        self._refs = itertools.count()
+        self._last_load = None
+
+    def _shard(self, stream_name):
+        return self._shards[zlib.crc32(stream_name.encode()) % len(self._shards)]
+
+    @staticmethod
+    def _timestamp(frame):
+        # Prefer the producer's clock; fall back to when the frame arrived
+        return frame.timecode_ms / 1000 if frame.timecode_ms and frame.timecode_ms > _EPOCH_MS else frame.received_at
+
+    async def start(self, stream_names=()):
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context('spawn') # the parent has threads (uploader, config); don't fork them
+        self._shards = [
+            ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker, initargs=(self.sampler_settings,))
+            for _ in range(self.workers)
+        ]
+        # Start the processes now rather than on the first frame
+        await asyncio.gather(*(loop.run_in_executor(shard, _ready) for shard in self._shards))
+        # Two loops per shard, so each shard has its next call queued while one runs
+        self._tasks = [asyncio.ensure_future(self._decode_loop()) for _ in range(2 * self.workers)]
+        self._tasks += [asyncio.ensure_future(self._encode_loop()) for _ in range(2 * self.workers)]
+        self.started_at = time.monotonic()
+        self._register_metrics()
+        await self.set_streams(stream_names)
+
+    def _register_metrics(self):
+        # Read at scrape time from the state the stages already keep
+        metrics.gauge('pipeline_queue_depth', "Frames waiting in front of a stage", ('queue',)).set_function(lambda: {
+            'decode': self.decode_queue.qsize(),
+            'encode': self.encode_queue.qsize(),
+            'upload': self.uploader.pending()
+        })
+        metrics.gauge('kvs_buffered_frames', "Frames a stream session has read but not handed on", ('camera',)) \
+            .set_function(lambda: {name: session.queue.qsize() for name, session in self.kvs.sessions.items()})
+        metrics.counter('kvs_bytes_total', "GetMedia/GetImages bytes read", ('camera',)) \
+            .set_function(lambda: {name: session.stats['bytes'] for name, session in self.kvs.sessions.items()})
+        metrics.counter('kvs_reconnects_total', "Stream session reconnects", ('camera',)) \
+            .set_function(lambda: {name: session.stats['reconnects'] for name, session in self.kvs.sessions.items()})
+        metrics.counter('upload_frames_total', "Frames by upload outcome", ('outcome',)).set_function(lambda: {
+            outcome: self.uploader.stats[outcome] for outcome in ('uploaded', 'dropped', 'failed', 'budget_exhausted')
+        })
+        metrics.counter('pipeline_worker_cpu_seconds_total', "CPU used by the decode/encode workers") \
+            .set_function(lambda: self.worker_cpu)
+
+    async def set_streams(self, stream_names):
+        removed = set(self.kvs.sessions) - set(stream_names)
+        await self.kvs.set_streams(stream_names)
+        for stream_name in removed:
+            self._shard(stream_name).submit(_forget, stream_name)
+            FRAME_LAG.remove(stream_name)
+
+    async def _ingest(self, frame):
+        # Called per frame by the stream's consumer; blocks while the decode queue is full
+        self.counts['frames'] += 1
+        FRAMES.labels('read').inc()
+        work = _Work(frame._replace(data=bytes(frame.data)), next(self._refs), self._timestamp(frame), None)
+        await self.decode_queue.put(work)
+
+    async def _decode_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            work = await self.decode_queue.get()
+            frame = work.frame
+            started = time.time()
+            self.stages['ingest'].record(started - frame.received_at)
+            try:
+                # Submitted right after get() with no await in between, so a shard sees each stream's frames in order
+                forwarded, cpu = await loop.run_in_executor(
+                    self._shard(frame.stream_name), _decode_and_sample, frame.stream_name, frame.codec_id,
+                    frame.codec_private, frame.data, work.timestamp, work.ref, self.keyframes_only,
+                    dict(self.sampler_settings)
+                )
+                self.worker_cpu += cpu
+                self.stages['decode'].record(time.time() - started)
+                if forwarded:
+                    self.counts['forwarded'] += 1
+                    FRAMES.labels('forwarded').inc()
+                    await self.encode_queue.put(work._replace(decoded_at=time.time()))
+                else:
+                    self.counts['skipped'] += 1
+                    FRAMES.labels('skipped').inc()
+            except Exception as e:
+                self.counts['errors'] += 1
+                FRAMES.labels('error').inc()
+                print(f"Decode error on '{frame.stream_name}': {e}")
+            finally:
+                self.decode_queue.task_done()
+
+    async def _encode_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            work = await self.encode_queue.get()
+            frame = work.frame
+            try:
+                if frame.codec_id == 'V_MJPEG':
+                    body = frame.data
+                else:
+                    body, cpu = await loop.run_in_executor(self._shard(frame.stream_name), _encode, work.ref, self.jpeg_quality)
+                    self.worker_cpu += cpu
+                now = time.time()
+                self.stages['encode'].record(now - work.decoded_at)
+                self.stages['total'].record(now - frame.received_at)
+                FRAME_LAG.labels(frame.stream_name).set(now - work.timestamp)
+                self.uploader.submit(frame.stream_name, body, work.timestamp)
+            except Exception as e:
+                self.counts['errors'] += 1
+                FRAMES.labels('error').inc()
+                print(f"Encode error on '{frame.stream_name}': {e}")
+            finally:
+                self.encode_queue.task_done()
+
+    async def drain(self, timeout=20.0):
+        """
+        Stops reading, then waits (up to timeout seconds in total) until every frame
+        already read has been uploaded, and shuts the workers down
+        """
+        started = time.monotonic()
+
+        async def finish():
+            await self.kvs.close(drain=True)
+            await self.decode_queue.join()
+            await self.encode_queue.join()
+
+        try:
+            await asyncio.wait_for(finish(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Drain timed out with {self.decode_queue.qsize() + self.encode_queue.qsize()} frames queued")
+            await self.kvs.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.to_thread(self.uploader.close, max(1.0, timeout - (time.monotonic() - started)))
+        for shard in self._shards:
+            shard.shutdown(wait=False, cancel_futures=True)
+
+    def load(self):
+        """
+        Scheduler load report: CPU used (this process and the workers) as a fraction of
+        the task's CPUs since the last report, and the p90 read-to-upload-queue lag
+        """
+        now, cpu = time.monotonic(), time.process_time() + self.worker_cpu
+        last_now, last_cpu = self._last_load or (self.started_at or now, cpu)
+        self._last_load = (now, cpu)
+        elapsed = now - last_now
+        return {
+            'cpu': (cpu - last_cpu) / elapsed / len(os.sched_getaffinity(0)) if elapsed > 0 else 0.0,
+            'lagSeconds': self.stages['total'].percentile(90) or 0.0
+        }
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        stages = {
+            name: {'count': timer.count, 'p50': timer.percentile(50), 'p99': timer.percentile(99)}
+            for name, timer in self.stages.items()
+        }
+        stages['upload'] = {
+            'count': self.uploader.stats['uploaded'],
+            'p50': self.uploader.latency_percentile(50),
+            'p99': self.uploader.latency_percentile(99)
+        }
+        return dict(
+            self.counts,
+            streams=len(self.kvs.sessions),
+            fps_in=self.counts['frames'] / elapsed if elapsed else 0.0,
+            fps_out=self.uploader.stats['uploaded'] / elapsed if elapsed else 0.0,
+            queued={'decode': self.decode_queue.qsize(), 'encode': self.encode_queue.qsize()},
+            stages=stages
+        )
+
+
+def format_stats(stats):
+    def ms(value):
+        return f"{value * 1000:.0f}" if value is not None else '-'
+    stages = ', '.join(f"{name} {ms(stage['p50'])}/{ms(stage['p99'])}" for name, stage in stats['stages'].items())
+    return (f"{stats['streams']} streams, {stats['fps_in']:.1f} fps in, {stats['fps_out']:.1f} fps out, "
+            f"queued {stats['queued']['decode']}/{stats['queued']['encode']}, p50/p99 ms: {stages}")
+
+
+# --- task wiring ---------------------------------------------------------------------------
+
+def instance_id():
+    # The ECS task ARN from the task metadata endpoint; hostname and pid anywhere else
+    uri = os.environ.get('ECS_CONTAINER_METADATA_URI_V4')
+    if uri:
+        try:
+            with urllib.request.urlopen(f"{uri}/task", timeout=2) as response:
+                return json.load(response)['TaskARN']
+        except Exception as e:
+            print(f"Task metadata unavailable: {e}")
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def sampler_settings(settings):
+    return {
+        'threshold': settings.get_float('sampler/threshold', 0.02),
+        'keepalive_seconds': settings.get_float('sampler/keepalive_seconds', 5.0)
+    }
+
+
+async def heartbeat(pipeline, scheduler, autoscaler, settings, stop, control):
+    """
+    Heartbeat stage: renews leases and applies assignment changes, runs the autoscaler
+    on the leader and logs stats, until `stop` is set. Blocking calls run on the
+    `control` executor
+    """
+    loop = asyncio.get_running_loop()
+    next_scale = next_stats = 0.0
+    while not stop.is_set():
+        now = time.monotonic()
+        try:
+            with TICK_SECONDS.time():
+                added, removed = await loop.run_in_executor(control, scheduler.tick)
+            if added or removed:
+                print(f"Streams: +{len(added)} -{len(removed)}, holding {len(scheduler.held)}")
+                await pipeline.set_streams(scheduler.held)
+            if now >= next_scale and is_leader(scheduler.instance_id, scheduler.members):
+                await loop.run_in_executor(control, autoscaler.step)
+                next_scale = now + settings.get_float('autoscaler/interval_seconds', 30.0)
+        except Exception as e:
+            print(f"Heartbeat error: {e}")
+        if now >= next_stats:
+            print(format_stats(pipeline.stats()))
+            next_stats = now + settings.get_float('pipeline/stats_seconds', 60.0)
+        try:
+            await asyncio.wait_for(stop.wait(), settings.get_float('scheduler/interval_seconds', 10.0))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def serve(settings):
+    import boto3
+
+    metrics.serve(settings.get_int('metrics/port', 5000))
+    client = lambda service: metrics.instrument_client(boto3.client(service))
+
+    capacity = settings.get_int('scheduler/capacity', 50)
+    # One read thread per stream this task may hold, so no stream waits for another's thread
+    if settings.get_str('kvs/source', 'media') == 'images':
+        source = KVSImageSource(sampling_ms=settings.get_int('kvs/sampling_ms', 1000), max_streams=capacity)
+    else:
+        source = KVSMediaSource(max_streams=capacity)
+    bucket = settings.get_str('uploader/bucket')
+    if not bucket:
+        raise SystemExit("No frame bucket configured (parameter uploader/bucket or UPLOADER_BUCKET)")
+    uploader = S3Uploader(
+        bucket,
+        workers=settings.get_int('uploader/workers', 8),
+        max_queued_per_camera=settings.get_int('uploader/max_queued_per_camera', 30)
+    )
+    pipeline = Pipeline(
+        source, uploader,
+        workers=settings.get_int('pipeline/workers'),
+        decode_queue=settings.get_int('pipeline/decode_queue', 64),
+        encode_queue=settings.get_int('pipeline/encode_queue', 32),
+        keyframes_only=settings.get_bool('kvs/keyframes_only', True),
+        every_nth=settings.get_int('kvs/every_nth', 1),
+        sampler_settings=sampler_settings(settings),
+        jpeg_quality=settings.get_int('pipeline/jpeg_quality', 85)
+    )
+    settings.on_change(lambda changed: pipeline.sampler_settings.update(sampler_settings(settings)))
+
+    kinesisvideo = client('kinesisvideo')
+    dynamodb = client('dynamodb')
+    streams = lambda: list_kvs_streams(kinesisvideo)
+    scheduler = Scheduler(
+        instance_id(), dynamodb, streams,
+        capacity=capacity,
+        lease_ttl=settings.get_float('scheduler/lease_ttl', 30.0),
+        load_reporter=pipeline.load
+    )
+    metrics.gauge('scheduler_streams_held', "Streams this task holds a lease on").set_function(lambda: len(scheduler.held))
+    autoscaler = Autoscaler(
+        ECSBackend(
+            client('ecs'), dynamodb,
+            settings.get_str('autoscaler/cluster', f"stream-processor-cluster-{config.ENVIRONMENT}"),
+            settings.get_str('autoscaler/service', 'stream-processor-service'),
+            streams
+        ),
+        min_tasks=settings.get_int('autoscaler/min_tasks', 1),
+        max_tasks=settings.get_int('autoscaler/max_tasks', 50)
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    control = ThreadPoolExecutor(1, thread_name_prefix='control') # heartbeat only: lease renewals never queue behind I/O
+    await pipeline.start()
+    try:
+        await heartbeat(pipeline, scheduler, autoscaler, settings, stop, control)
+    finally:
+        print("Stopping: draining in-flight frames")
+        await pipeline.drain(settings.get_float('pipeline/drain_seconds', 20.0))
+        source.close()
+        print(format_stats(pipeline.stats()))
+        await loop.run_in_executor(control, scheduler.close) # only now, so no one else re-reads frames we still had
+        control.shutdown()
+        settings.stop()
+
+
+def main():
+    asyncio.run(serve(config.from_environment().start()))
+
+
+if __name__ == '__main__':
+    main()
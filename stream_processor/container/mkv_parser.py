@@ -0,0 +1,252 @@
+"""
+Incremental EBML/MKV parser for GetMedia responses
+
+GetMedia returns a stream of MKV fragments, each an EBML header plus a Segment holding
+the track info, KVS tags (fragment number, timestamps) and one Cluster of frames. The
+parser is fed chunks as they arrive and returns the frames worth decoding:
+- only keyframes (default), optionally only every Nth keyframe; H.264 keyframes decode on
+  their own, so the decoder never has to touch the P/B frames in between
+- or every Nth frame, for intra-only codecs such as MJPEG
+
+Frames that aren't selected are skipped after reading their 4-byte block header, without
+buffering or copying the payload. Selected frame data is a memoryview into the chunk it
+arrived in (zero-copy); only a frame that straddles chunks is joined into one buffer.
+Chunks must be bytes (immutable), so those memoryviews stay valid after feed() returns.
+"""
+
+from collections import namedtuple
+
+Frame = namedtuple('Frame', ['track', 'timecode_ms', 'keyframe', 'data', 'fragment_number'])
+
+# Masters the parser descends into; any other element is read (if listed below) or skipped
+_SEGMENT = 0x18538067
+_MASTERS = {
+    _SEGMENT,
+    0x1F43B675, # Cluster
+    0xA0,       # BlockGroup
+    0x1654AE6B, # Tracks
+    0xAE,       # TrackEntry
+    0x1549A966, # Info
+    0x1254C367, # Tags
+    0x7373,     # Tag
+    0x67C8,     # SimpleTag
+}
+_SIMPLE_BLOCK = 0xA3
+_BLOCK = 0xA1
+_TIMECODE = 0xE7
+_TIMECODE_SCALE = 0x2AD7B1
+_TRACK_NUMBER = 0xD7
+_CODEC_ID = 0x86
+_CODEC_PRIVATE = 0x63A2
+_TAG_NAME = 0x45A3
+_TAG_STRING = 0x4487
+_VALUES = {_TIMECODE, _TIMECODE_SCALE, _TRACK_NUMBER, _CODEC_ID, _CODEC_PRIVATE, _TAG_NAME, _TAG_STRING}
+
+_UNKNOWN_SIZES = {(1 << (7 * n)) - 1 for n in range(1, 9)} # all value bits set = size unknown
+
+
+def _vint(buffer, pos, end, keep_marker):
+    """
+    Reads an EBML variable-length integer at buffer[pos]. Returns (value, length), or
+    (None, 0) when the buffer ends first
+    """
+    if pos >= end:
+        return None, 0
+    first = buffer[pos]
+    length = 9 - first.bit_length() if first else 9
+    if length > 8:
+        raise ValueError(f"Invalid EBML variable-length integer at byte {pos}")
+    if pos + length > end:
+        return None, 0
+    value = first if keep_marker else first & (0xFF >> length)
+    for i in range(1, length):
+        value = (value << 8) | buffer[pos + i]
+    return value, length
+
+
+class MKVParser:
+    """
+    Feed it GetMedia chunks in order; feed() returns the selected Frames.
+
+    ### Args
+    - keyframes_only - hand only keyframes to the decoder
+    - every_nth - keep every Nth keyframe (or every Nth frame when keyframes_only is False)
+    - track - video track number to read
+
+    The latest KVS tags are kept on the parser: fragment_number, producer_timestamp,
+    server_timestamp and continuation_token, as well as codec_id and codec_private
+    (the avcC record the H.264 decoder needs).
+    """
+
+    def __init__(self, keyframes_only=True, every_nth=1, track=1):
+        self.keyframes_only = keyframes_only
+        self.every_nth = max(1, every_nth)
+        self.track = track
+        self.timecode_scale = 1000000 # ns per timecode tick, 1 ms unless the segment says otherwise
+        self.cluster_timecode = 0
+        self.codec_id = None
+        self.codec_private = None
+        self.fragment_number = None
+        self.producer_timestamp = None
+        self.server_timestamp = None
+        self.continuation_token = None
+        self.stats = {'bytes': 0, 'frames': 0, 'keyframes': 0, 'selected': 0, 'skipped_bytes': 0}
+        self._tag_name = None
+        self._pending = [] # unparsed pieces, joined only once enough bytes have arrived
+        self._pending_bytes = 0
+        self._need = 0     # bytes needed in _pending before parsing can make progress
+        self._skip = 0     # bytes of a skipped element still to be discarded
+        self._held = False # the block at the start of _pending was already selected
+
+    def feed(self, chunk):
+        view = memoryview(chunk)
+        self.stats['bytes'] += len(view)
+        if self._skip:
+            skipped = min(self._skip, len(view))
+            self._skip -= skipped
+            self.stats['skipped_bytes'] += skipped
+            view = view[skipped:]
+        if not view:
+            return []
+
+        self._pending.append(view)
+        self._pending_bytes += len(view)
+        if self._pending_bytes < self._need:
+            return [] # e.g. the rest of a large keyframe hasn't arrived yet
+
+        buffer = self._pending[0] if len(self._pending) == 1 else memoryview(b''.join(self._pending))
+        frames = []
+        pos = self._parse(buffer, frames)
+        rest = buffer[pos:]
+        self._pending = [rest] if rest else []
+        self._pending_bytes = len(rest)
+        return frames
+
+    def _select(self, keyframe):
+        self.stats['frames'] += 1
+        if keyframe:
+            self.stats['keyframes'] += 1
+        if self.keyframes_only:
+            return keyframe and (self.stats['keyframes'] - 1) % self.every_nth == 0
+        return (self.stats['frames'] - 1) % self.every_nth == 0
+
+    def _parse(self, buffer, frames):
+        end = len(buffer)
+        pos = 0
+        while pos < end:
+            element_id, id_length = _vint(buffer, pos, end, keep_marker=True)
+            size, size_length = _vint(buffer, pos + id_length, end, keep_marker=False) if id_length else (None, 0)
+            if size is None:
+                self._need = end - pos + 1 # header incomplete, wait for more
+                return pos
+            start = pos + id_length + size_length
+
+            if element_id in _MASTERS:
+                # Descend: children follow directly. Unknown sizes (live Segments/Clusters) are fine
+                if element_id == _SEGMENT:
+                    self.cluster_timecode = 0
+                pos = start
+                continue
+            if size in _UNKNOWN_SIZES and size_length:
+                raise ValueError(f"Element 0x{element_id:X} has an unknown size")
+            element_end = start + size
+
+            if element_id in (_SIMPLE_BLOCK, _BLOCK):
+                track, track_length = _vint(buffer, start, end, keep_marker=False)
+                header_end = start + track_length + 3
+                if track is None or header_end > end:
+                    self._need = max(header_end, end + 1) - pos
+                    return pos
+                relative = int.from_bytes(buffer[start + track_length:start + track_length + 2], 'big', signed=True)
+                # Only SimpleBlocks carry the keyframe flag; a Block inside a BlockGroup is treated as a delta frame
+                keyframe = element_id == _SIMPLE_BLOCK and bool(buffer[header_end - 1] & 0x80)
+                if track == self.track and (self._held or self._select(keyframe)):
+                    if element_end > end:
+                        self._held = True # don't count or re-select it when the rest arrives
+                        self._need = element_end - pos
+                        return pos
+                    self._held = False
+                    timecode = (self.cluster_timecode + relative) * self.timecode_scale // 1000000
+                    frames.append(Frame(track, timecode, keyframe, buffer[header_end:element_end], self.fragment_number))
+                    self.stats['selected'] += 1
+                    pos = element_end
+                    continue
+            elif element_id in _VALUES:
+                if element_end > end:
+                    self._need = element_end - pos
+                    return pos
+                self._value(element_id, buffer[start:element_end])
+                pos = element_end
+                continue
+
+            # Skip: EBML header, Void, Cues, unselected frames...
+            if element_end > end:
+                self._skip = element_end - end
+                self.stats['skipped_bytes'] += end - start
+                self._need = 0
+                return end
+            self.stats['skipped_bytes'] += size
+            pos = element_end
+        self._need = 0
+        return pos
+
+    def _value(self, element_id, payload):
+        if element_id == _TIMECODE:
+            self.cluster_timecode = int.from_bytes(payload, 'big')
+        elif element_id == _TIMECODE_SCALE:
+            self.timecode_scale = int.from_bytes(payload, 'big')
+        elif element_id == _CODEC_ID:
+            self.codec_id = bytes(payload).decode('ascii', 'replace')
+        elif element_id == _CODEC_PRIVATE:
+            self.codec_private = bytes(payload)
+        elif element_id == _TAG_NAME:
+            self._tag_name = bytes(payload).decode('ascii', 'replace')
+        elif element_id == _TAG_STRING:
+            value = bytes(payload).decode('ascii', 'replace')
+            if self._tag_name == 'AWS_KINESISVIDEO_FRAGMENT_NUMBER':
+                self.fragment_number = value
+            elif self._tag_name == 'AWS_KINESISVIDEO_PRODUCER_TIMESTAMP':
+                self.producer_timestamp = value
+            elif self._tag_name == 'AWS_KINESISVIDEO_SERVER_TIMESTAMP':
+                self.server_timestamp = value
+            elif self._tag_name == 'AWS_KINESISVIDEO_CONTINUATION_TOKEN':
+                self.continuation_token = value
+
+
+class FrameDecoder:
+    """
+    Decodes selected frames to RGB numpy arrays. H.264 goes through PyAV (optional
+    dependency); MJPEG through Pillow. Build it from the parser once codec_id is known.
+
+    With keyframes_only the H.264 decoder is drained after every frame: nothing else
+    references a keyframe we were given, so there is no reason to wait for reordering
+    """
+
+    def __init__(self, codec_id, codec_private=None, keyframes_only=True):
+        self.codec_id = codec_id
+        self.keyframes_only = keyframes_only
+        if codec_id == 'V_MPEG4/ISO/AVC':
+            import av
+            self._av = av
+            self._context = av.CodecContext.create('h264', 'r')
+            if codec_private:
+                self._context.extradata = codec_private
+        elif codec_id == 'V_MJPEG':
+            self._context = None
+        else:
+            raise ValueError(f"Unsupported codec {codec_id}")
+
+    def decode(self, frame):
+        """
+        Returns the decoded RGB array, or None while the decoder is still buffering
+        """
+        if self._context is None:
+            import io
+            import numpy as np
+            from PIL import Image
+            return np.asarray(Image.open(io.BytesIO(frame.data)).convert('RGB'))
+        pictures = self._context.decode(self._av.Packet(frame.data))
+        if not pictures and self.keyframes_only:
+            pictures = self._context.decode(None)
+            self._context.flush_buffers()
+        return pictures[-1].to_ndarray(format='rgb24') if pictures else None
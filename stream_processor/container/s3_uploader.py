@@ -0,0 +1,213 @@
+"""
+Concurrent S3 frame uploader
+
+Frames selected by the stream processor are uploaded to
+cameras/{cameraId}/frames/{timestamp}.jpg, which triggers frameEnqueue_TF.
+- A bounded pool of worker threads shares one S3 client whose connection pool matches
+  the worker count, so connections (and TLS sessions) are reused.
+- Each camera has its own bounded in-memory queue. When a camera produces faster than
+  S3 accepts, its oldest frame is dropped: the newest frame is the one worth analysing,
+  and one busy camera can't starve the others (workers take cameras round-robin).
+- Failed uploads are retried with full-jitter exponential backoff, but only while the
+  retry budget allows it: retries may add at most `retry_ratio` of the first attempts
+  (plus a small floor), so an S3 brown-out doesn't turn into a retry storm.
+Every frame is its own object: frameEnqueue_TF only picks up frame keys, so frames packed
+together would never reach Rekognition.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from frame_keys import build_frame_key
+from metrics import histogram, instrument_client
+
+UPLOAD_SECONDS = histogram('s3_upload_seconds', "Frame submitted to stored in S3, queueing and retries included")
+
+
+def default_client(workers):
+    import boto3
+    from botocore.config import Config
+    return instrument_client(boto3.session.Session().client('s3', config=Config(
+        max_pool_connections=workers,
+        tcp_keepalive=True,
+        connect_timeout=3,
+        read_timeout=15,
+        retries={'max_attempts': 1, 'mode': 'standard'} # retries are ours, and budgeted
+    )))
+
+
+class RetryBudget:
+    """
+    Token bucket for retries: every first attempt deposits `ratio` tokens, every retry
+    spends one. `min_per_second` tokens trickle in so a quiet uploader can still retry
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=50.0, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self._tokens = max_tokens
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = self.clock()
+        self._tokens = min(self.max_tokens, self._tokens + amount + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_attempt(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            self._refill(0.0)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class S3Uploader:
+    """
+    Uploads frames with a bounded worker pool.
+
+    ### Args
+    - bucket - destination bucket
+    - s3 - S3 client to share between workers (a pooled one is created if omitted)
+    - workers - upload threads (and pooled connections)
+    - max_queued_per_camera - frames kept per camera before the oldest is dropped
+    - max_attempts - attempts per upload, including the first
+    - base_delay, max_delay - full-jitter backoff bounds in seconds
+    - retry_budget - RetryBudget shared by all workers
+    """
+
+    def __init__(self, bucket, s3=None, workers=8, max_queued_per_camera=30, max_attempts=4,
+                 base_delay=0.1, max_delay=2.0, retry_budget=None):
+        self.bucket = bucket
+        self.s3 = s3 or default_client(workers)
+        self.max_queued_per_camera = max_queued_per_camera
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self.stats = {'submitted': 0, 'uploaded': 0, 'objects': 0, 'dropped': 0, 'failed': 0,
+                      'retries': 0, 'budget_exhausted': 0}
+        self.latencies = deque(maxlen=10000) # seconds from submit() to stored, newest last
+        self._queues = OrderedDict() # camera id -> deque of (timestamp, body, submitted at)
+        self._pending = 0 # frames queued or being uploaded
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f"s3-upload-{i}") for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, camera_id, body, timestamp=None):
+        """
+        Queues one JPEG. Returns False if the camera's queue was full and its oldest frame was dropped
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Uploader is closed")
+            queue = self._queues.get(camera_id)
+            if queue is None:
+                queue = self._queues[camera_id] = deque()
+            kept = True
+            if len(queue) >= self.max_queued_per_camera:
+                queue.popleft()
+                self._pending -= 1
+                self.stats['dropped'] += 1
+                kept = False
+            queue.append((timestamp, body, time.monotonic()))
+            self._pending += 1
+            self.stats['submitted'] += 1
+            self._condition.notify()
+        return kept
+
+    def _next_frame(self):
+        # Round-robin over cameras: take from the first camera with frames, then move it to the back
+        for camera_id, queue in self._queues.items():
+            if queue:
+                frame = queue.popleft()
+                self._queues.move_to_end(camera_id)
+                return camera_id, frame
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                camera_id, frame = self._next_frame()
+                while frame is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    camera_id, frame = self._next_frame()
+            timestamp, body, submitted = frame
+            try:
+                stored = self._upload(build_frame_key(camera_id, timestamp), body, 'image/jpeg')
+            except Exception as e:
+                print(f"Upload error for camera {camera_id}: {e}")
+                stored = False
+            finished = time.monotonic()
+            with self._condition:
+                if stored:
+                    self.stats['uploaded'] += 1
+                    self.stats['objects'] += 1
+                    self.latencies.append(finished - submitted)
+                    UPLOAD_SECONDS.observe(finished - submitted)
+                else:
+                    self.stats['failed'] += 1
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def _upload(self, key, body, content_type):
+        self.retry_budget.record_attempt()
+        for attempt in range(self.max_attempts):
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+                return True
+            except Exception as e:
+                if attempt + 1 == self.max_attempts:
+                    print(f"Giving up on {key} after {self.max_attempts} attempts: {e}")
+                    return False
+                if not self.retry_budget.try_spend():
+                    with self._condition:
+                        self.stats['budget_exhausted'] += 1
+                    print(f"Retry budget exhausted, dropping {key}: {e}")
+                    return False
+                with self._condition:
+                    self.stats['retries'] += 1
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+        return False
+
+    def flush(self, timeout=None):
+        """
+        Waits until everything queued so far is uploaded (or failed). Returns False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=30.0):
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def pending(self):
+        """
+        Frames queued or being uploaded
+        """
+        return self._pending
+
+    def latency_percentile(self, percentile):
+        with self._condition:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
@@ -0,0 +1,349 @@
+"""
+Lease-based stream assignment
+
+Every stream processor task runs a Scheduler that decides which KVS streams it reads.
+- Membership: each task heartbeats into one '#members' item of the StreamLeases table
+  (expiry time, capacity, streams held and, when a load_reporter is given, its CPU and
+  frame lag for the autoscaler). A task whose heartbeat is older than `lease_ttl` is dead.
+- Assignment: all tasks hash the live members onto the same consistent-hash ring (with
+  virtual nodes) and walk it with bounded loads, so every task computes the same owner
+  for every stream without talking to the others. When a task joins or leaves only the
+  streams next to its ring points move.
+- Leases: a stream belongs to whoever holds its StreamLeases item. Claims are conditional
+  writes (item absent, or held by a dead member at a known version), so two tasks can
+  never hold the same stream even while they briefly disagree about membership. A task
+  releases streams that hashed away from it and the new owner claims them on its next tick.
+- Fencing: a task that couldn't heartbeat for `lease_ttl` drops every stream itself,
+  because by then other tasks are allowed to take them over.
+
+CameraStreams keeps one row per (task, stream) for the rest of the system. FreeStreams holds,
+per task, the JSON list of streams that hash to it but don't fit in any task's capacity;
+the autoscaler uses that backlog.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+LEASES_TABLE = f"StreamLeases-{ENVIRONMENT}"
+CAMERA_STREAMS_TABLE = f"CameraStreams-{ENVIRONMENT}"
+FREE_STREAMS_TABLE = f"FreeStreams-{ENVIRONMENT}"
+
+MEMBERS_KEY = '#members' # KVS stream names can't contain '#', so this never collides
+BATCH_GET_LIMIT = 100    # BatchGetItem keys per request
+
+
+@lru_cache(maxsize=None)
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring of members with `vnodes` points each
+    """
+
+    def __init__(self, members, vnodes=64):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key):
+        if not self._points:
+            return None
+        return self._members[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+    def assign(self, keys, capacities):
+        """
+        Maps each key to its owner, walking clockwise past members that are already at
+        capacity (consistent hashing with bounded loads). Keys that fit nowhere map to None
+        """
+        load = dict.fromkeys(capacities, 0)
+        room = sum(capacities.values()) if self._points else 0
+        assignment = {}
+        for key in sorted(keys):
+            owner = None
+            if room > 0: # otherwise every member is full
+                index = bisect.bisect(self._points, _hash(key))
+                while True:
+                    candidate = self._members[index % len(self._points)]
+                    if load[candidate] < capacities[candidate]:
+                        owner = candidate
+                        load[candidate] += 1
+                        room -= 1
+                        break
+                    index += 1
+            assignment[key] = owner
+        return assignment
+
+
+def list_kvs_streams(kinesisvideo):
+    """
+    Names of all active KVS streams
+    """
+    names = []
+    kwargs = {'MaxResults': 10000}
+    while True:
+        response = kinesisvideo.list_streams(**kwargs)
+        names.extend(s['StreamName'] for s in response.get('StreamInfoList', []) if s.get('Status') == 'ACTIVE')
+        if not response.get('NextToken'):
+            return names
+        kwargs['NextToken'] = response['NextToken']
+
+
+def read_member_entries(dynamodb):
+    """
+    Every task's heartbeat entry from the '#members' item: {task: {field: float}}, where
+    fields are expiresAt, capacity, streams and any reported load (cpu, lagSeconds).
+    raw_expiresAt keeps the stored string for conditional writes
+    """
+    item = dynamodb.get_item(
+        TableName=LEASES_TABLE, Key={'streamName': {'S': MEMBERS_KEY}}, ConsistentRead=True
+    ).get('Item', {})
+    entries = {}
+    for member, entry in item.get('members', {}).get('M', {}).items():
+        fields = {name: float(value['N']) for name, value in entry['M'].items()}
+        fields['raw_expiresAt'] = entry['M']['expiresAt']['N']
+        entries[member] = fields
+    return entries
+
+
+class Scheduler:
+    """
+    Claims and releases stream leases for one task. Call tick() every `interval` seconds;
+    it returns the (added, removed) stream sets to start and stop.
+
+    ### Args
+    - instance_id - this task's id (e.g. the ECS task ARN)
+    - dynamodb - low-level DynamoDB client
+    - stream_source - callable returning every stream name that should be processed
+    - capacity - maximum streams this task reads
+    - lease_ttl - seconds without a heartbeat before a task's streams may be taken over
+    - vnodes - ring points per task
+    - load_reporter - optional callable returning {'cpu': fraction of the task's vCPUs, 'lagSeconds': ...}
+    - clock - time source, replaced in simulations
+    """
+
+    def __init__(self, instance_id, dynamodb, stream_source, capacity=50, lease_ttl=30.0, vnodes=64,
+                 load_reporter=None, clock=time.time):
+        self.instance_id = instance_id
+        self.dynamodb = dynamodb
+        self.stream_source = stream_source
+        self.capacity = capacity
+        self.lease_ttl = lease_ttl
+        self.vnodes = vnodes
+        self.load_reporter = load_reporter
+        self.clock = clock
+        self.held = set()
+        self.members = {}
+        self.stats = {'claims': 0, 'takeovers': 0, 'lost': 0, 'released': 0, 'conflicts': 0}
+        self._last_heartbeat = None
+        self._published_free = None
+        self._assignment_key = None
+        self._desired = set()
+        self._overflow = []
+        self._ensure_members_item()
+
+    def _ensure_members_item(self):
+        try:
+            self.dynamodb.put_item(
+                TableName=LEASES_TABLE,
+                Item={'streamName': {'S': MEMBERS_KEY}, 'members': {'M': {}}},
+                ConditionExpression='attribute_not_exists(streamName)'
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass # another task created it first
+
+    def heartbeat(self, now):
+        entry = {
+            'expiresAt': {'N': str(now + self.lease_ttl)},
+            'capacity': {'N': str(self.capacity)},
+            'streams': {'N': str(len(self.held))}
+        }
+        if self.load_reporter:
+            for name, value in self.load_reporter().items():
+                entry[name] = {'N': f"{value:.4f}"}
+        try:
+            self.dynamodb.update_item(
+                TableName=LEASES_TABLE,
+                Key={'streamName': {'S': MEMBERS_KEY}},
+                UpdateExpression='SET #members.#me = :entry',
+                ExpressionAttributeNames={'#members': 'members', '#me': self.instance_id},
+                ExpressionAttributeValues={':entry': {'M': entry}}
+            )
+            self._last_heartbeat = now
+            return True
+        except Exception as e:
+            print(f"Heartbeat failed: {e}")
+            return False
+
+    def _read_members(self, now):
+        members = {}
+        for member, entry in read_member_entries(self.dynamodb).items():
+            if entry['expiresAt'] > now:
+                members[member] = int(entry['capacity'])
+            elif entry['expiresAt'] < now - self.lease_ttl:
+                self._prune_member(member, entry['raw_expiresAt'])
+        return members
+
+    def _prune_member(self, member, expires_at):
+        # Long-dead entries are removed by whichever task notices; the condition keeps a
+        # task that just came back from being removed
+        try:
+            self.dynamodb.update_item(
+                TableName=LEASES_TABLE,
+                Key={'streamName': {'S': MEMBERS_KEY}},
+                UpdateExpression='REMOVE #members.#member',
+                ConditionExpression='#members.#member.expiresAt = :seen',
+                ExpressionAttributeNames={'#members': 'members', '#member': member},
+                ExpressionAttributeValues={':seen': {'N': expires_at}}
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass
+
+    def _desired_streams(self, streams):
+        # Recomputed only when membership, capacities or the stream list change
+        key = (tuple(sorted(self.members.items())), frozenset(streams))
+        if key != self._assignment_key:
+            ring = HashRing(self.members, self.vnodes)
+            assignment = ring.assign(streams, self.members)
+            self._desired = {s for s, owner in assignment.items() if owner == self.instance_id}
+            # Streams nobody has room for are reported by their natural owner
+            self._overflow = sorted(s for s, owner in assignment.items()
+                                    if owner is None and ring.owner(s) == self.instance_id)
+            self._assignment_key = key
+        return self._desired
+
+    def _get_leases(self, streams):
+        leases = {}
+        streams = sorted(streams)
+        for offset in range(0, len(streams), BATCH_GET_LIMIT):
+            request = {LEASES_TABLE: {
+                'Keys': [{'streamName': {'S': s}} for s in streams[offset:offset + BATCH_GET_LIMIT]],
+                'ConsistentRead': True
+            }}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(LEASES_TABLE, []):
+                    leases[item['streamName']['S']] = item
+                request = response.get('UnprocessedKeys') or None
+        return leases
+
+    def _claim(self, stream, lease, now):
+        item = {
+            'streamName': {'S': stream},
+            'owner': {'S': self.instance_id},
+            'version': {'N': str(int(lease['version']['N']) + 1 if lease else 1)},
+            'assignedAt': {'N': str(int(now))}
+        }
+        if lease:
+            # Take over from a dead owner, unless someone else already did
+            condition = {
+                'ConditionExpression': '#owner = :previous AND #version = :version',
+                'ExpressionAttributeNames': {'#owner': 'owner', '#version': 'version'},
+                'ExpressionAttributeValues': {':previous': lease['owner'], ':version': lease['version']}
+            }
+        else:
+            condition = {'ConditionExpression': 'attribute_not_exists(streamName)'}
+        try:
+            self.dynamodb.put_item(TableName=LEASES_TABLE, Item=item, **condition)
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            self.stats['conflicts'] += 1
+            return False
+
+        if lease:
+            self.stats['takeovers'] += 1
+            self.dynamodb.delete_item(TableName=CAMERA_STREAMS_TABLE, Key={
+                'instanceId': lease['owner'], 'streamName': {'S': stream}
+            })
+        self.stats['claims'] += 1
+        self.dynamodb.put_item(TableName=CAMERA_STREAMS_TABLE, Item={
+            'instanceId': {'S': self.instance_id}, 'streamName': {'S': stream}, 'assignedAt': {'N': str(int(now))}
+        })
+        return True
+
+    def _release(self, stream):
+        try:
+            self.dynamodb.delete_item(
+                TableName=LEASES_TABLE,
+                Key={'streamName': {'S': stream}},
+                ConditionExpression='#owner = :me',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':me': {'S': self.instance_id}}
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass # already taken over
+        self.dynamodb.delete_item(TableName=CAMERA_STREAMS_TABLE, Key={
+            'instanceId': {'S': self.instance_id}, 'streamName': {'S': stream}
+        })
+        self.stats['released'] += 1
+
+    def _publish_free(self, now):
+        free = json.dumps(self._overflow)
+        if free == self._published_free:
+            return
+        if self._published_free is not None:
+            self.dynamodb.delete_item(TableName=FREE_STREAMS_TABLE, Key={
+                'instanceId': {'S': self.instance_id}, 'freeStreams': {'S': self._published_free}
+            })
+        if self._overflow:
+            self.dynamodb.put_item(TableName=FREE_STREAMS_TABLE, Item={
+                'instanceId': {'S': self.instance_id}, 'freeStreams': {'S': free}, 'updatedAt': {'N': str(int(now))}
+            })
+        self._published_free = free if self._overflow else None
+
+    def tick(self):
+        """
+        One scheduling round. Returns (added, removed): streams to start and stop reading
+        """
+        now = self.clock()
+        before = set(self.held)
+        if not self.heartbeat(now):
+            if self._last_heartbeat is None or now - self._last_heartbeat >= self.lease_ttl:
+                self.held.clear() # fenced: others may already own our streams
+            return self.held - before, before - self.held
+
+        self.members = self._read_members(now)
+        self.members[self.instance_id] = self.capacity # our own heartbeat just landed
+        desired = self._desired_streams(set(self.stream_source()))
+
+        for stream in self.held - desired:
+            self._release(stream)
+            self.held.discard(stream)
+
+        leases = self._get_leases(desired)
+        for stream in desired:
+            lease = leases.get(stream)
+            owner = lease['owner']['S'] if lease else None
+            if owner == self.instance_id:
+                self.held.add(stream)
+            elif stream in self.held:
+                self.held.discard(stream) # taken over while we weren't looking
+                self.stats['lost'] += 1
+            elif owner is None or owner not in self.members:
+                if self._claim(stream, lease, now):
+                    self.held.add(stream)
+            # else: the previous owner is alive and releases it on its next tick
+
+        self._publish_free(now)
+        return self.held - before, before - self.held
+
+    def close(self):
+        """
+        Graceful shutdown: release every stream and leave the ring so others take over at once
+        """
+        for stream in list(self.held):
+            self._release(stream)
+        self.held.clear()
+        self.dynamodb.update_item(
+            TableName=LEASES_TABLE,
+            Key={'streamName': {'S': MEMBERS_KEY}},
+            UpdateExpression='REMOVE #members.#me',
+            ExpressionAttributeNames={'#members': 'members', '#me': self.instance_id}
+        )
+        self._overflow = []
+        self._publish_free(self.clock())
@@ -44,4 +44,27 @@ resource "aws_dynamodb_table" "free_streams" {
     tags = {
         Name = "FreeStreams"
     }
-}
\ No newline at end of file
+}
+
+// Stream leases used by the container's scheduler. One item per leased stream, plus a
+// single "#members" item holding every task's heartbeat (expiresAt) and capacity
+resource "aws_dynamodb_table" "stream_leases" {
+    name         = "StreamLeases-${var.environment}"
+    billing_mode = "PAY_PER_REQUEST"
+    hash_key     = "streamName"
+
+    attribute {
+        name = "streamName" // Name of the leased KVS stream, or "#members"
+        type = "S"
+    }
+
+    // Other attributes not part of hash_key:
+    // owner (string): Task holding the lease
+    // version (number): Incremented on every claim, guards takeovers
+    // assignedAt (number): Timestamp the lease was claimed
+    // members (map): On "#members" only, task id -> { expiresAt, capacity }
+
+    tags = {
+        Name = "StreamLeases"
+    }
+}
@@ -37,6 +37,10 @@ resource "aws_ecs_task_definition" "stream_processor" {
             {
                 containerPort = 80
                 hostPort      = 80
+            },
+            {
+                containerPort = 5000 // Prometheus /metrics
+                hostPort      = 5000
             }
         ],
         environment = [
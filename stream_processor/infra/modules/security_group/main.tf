@@ -12,6 +12,15 @@ resource "aws_security_group" "stream_processor" {
     cidr_blocks = ["0.0.0.0/0"]
   }
 
+  // Ingress: /metrics only from within this security group (e.g. a collector sidecar or scraper task)
+  ingress {
+    description = "Prometheus metrics"
+    from_port   = 5000
+    to_port     = 5000
+    protocol    = "tcp"
+    self        = true
+  }
+
   // Egress: allow all outbound
   egress {
     description = "Allow all outbound traffic"
@@ -1,6 +1,5 @@
 import cv2
 import requests
-import base64
 import time
 
 # Capture an image with preview
@@ -36,22 +35,25 @@ def capture_image():
     cv2.destroyAllWindows()
     return captured_frame
 
-def send_to_api(image, api_url):
+def send_to_api(image, api_url, camera_id=None):
     # Encode image as JPEG
     ret, buffer = cv2.imencode('.jpg', image)
     if not ret: # Check to ensure the image encoded properly
         print("Error encoding image.")
         return None
-    # Encode bytes to Base64 for transport
-    image_base64 = base64.b64encode(buffer).decode('utf-8')
 
-    # Attempt to upload the image to the AWS cloud, WAS THIS payload = {'image': image_base64}
-    payload = {
-        'image': image_base64,
-        'imageId': str(int(time.time()))
-        }
+    # Attempt to upload the image to the AWS cloud as raw JPEG bytes (binary media type),
+    # WAS THIS payload = {'image': base64.b64encode(buffer)}, which added ~33% and extra copies
+    params = {'imageId': str(int(time.time()))}
+    if camera_id:
+        params['cameraId'] = camera_id
     try:
-        response = requests.post(api_url, json=payload)
+        response = requests.post(
+            api_url,
+            data=buffer.tobytes(),
+            params=params,
+            headers={'Content-Type': 'image/jpeg'}
+        )
         return response.json()
     except Exception as e:
         print("Error sending request:", e)
@@ -69,14 +69,79 @@ resource "aws_iam_role_policy_attachment" "attach_sqs_enqueue_policy" {
   policy_arn = aws_iam_policy.sqs_enqueue_policy.arn
 }
 
+# Helper modules from lambdas/ that each handler imports. Terraform zips the handler together
+# with its helpers into build/, so a deploy always ships the current code (see DEV28.README)
+locals {
+  lambda_helpers = {
+    frameEnqueue_TF                = ["aws_clients.py", "metrics.py", "frame_keys.py"]
+    connectClientToRekognition_TF  = ["aws_clients.py", "metrics.py", "ppe_summary.py", "frame_cache.py", "frame_keys.py", "results_index.py", "result_layout.py"]
+    getLatestRekognitionResult_TF  = ["aws_clients.py", "metrics.py", "results_index.py", "result_layout.py"]
+    getAllRekognitionResult_TF     = ["aws_clients.py", "metrics.py", "results_index.py", "result_layout.py"]
+    compactRekognitionResults_TF   = ["aws_clients.py", "metrics.py", "results_index.py", "result_layout.py"]
+  }
+}
+
+data "archive_file" "lambda" {
+  for_each    = local.lambda_helpers
+  type        = "zip"
+  output_path = "${path.module}/build/${each.key}.zip"
+
+  dynamic "source" {
+    for_each = concat(["${each.key}.py"], each.value)
+    content {
+      content  = file("${path.module}/../lambdas/${source.value}")
+      filename = source.value
+    }
+  }
+}
+
+# Results, latest-result pointers and rollups in the bucket: written by connectClientToRekognition_TF,
+# read by the getters, and rolled up (then deleted) by compactRekognitionResults_TF
+resource "aws_iam_policy" "rekognition_results_policy" {
+  name = "RekognitionResultsPolicy"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect   = "Allow",
+        Action   = ["s3:ListBucket"],
+        Resource = aws_s3_bucket.my_bucket.arn
+      },
+      {
+        Effect = "Allow",
+        Action = ["s3:GetObject", "s3:PutObject"],
+        Resource = [
+          "${aws_s3_bucket.my_bucket.arn}/cameras/*",
+          "${aws_s3_bucket.my_bucket.arn}/rekognition_results/*",
+          "${aws_s3_bucket.my_bucket.arn}/rekognition_full/*",
+          "${aws_s3_bucket.my_bucket.arn}/rekognition_index/*",
+          "${aws_s3_bucket.my_bucket.arn}/rekognition_rollups/*"
+        ]
+      },
+      {
+        # Compaction deletes per-frame results once their hour is rolled up
+        Effect   = "Allow",
+        Action   = ["s3:DeleteObject"],
+        Resource = "${aws_s3_bucket.my_bucket.arn}/rekognition_results/*"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "attach_rekognition_results_policy" {
+  role       = data.aws_iam_role.lambda_exec_role.name
+  policy_arn = aws_iam_policy.rekognition_results_policy.arn
+}
+
 # deploys zipped python code as a Lambda function
 # The Lambda function will read from an S3 bucket and return the latest Rekognition result
 resource "aws_lambda_function" "get_latest_rekognition_result" {
   function_name = "getLatestRekognitionResult_TF"  # Lam function name in AWS console
   runtime       = "python3.9"      # Runtime used by your Python code
   handler       = "getLatestRekognitionResult_TF.lambda_handler" 
-  filename         = "${path.module}/getLatestRekognitionResult_TF.zip"
-  source_code_hash = filebase64sha256("${path.module}/getLatestRekognitionResult_TF.zip")
+  filename         = data.archive_file.lambda["getLatestRekognitionResult_TF"].output_path
+  source_code_hash = data.archive_file.lambda["getLatestRekognitionResult_TF"].output_base64sha256
   role = data.aws_iam_role.lambda_exec_role.arn  # Link the IAM role to this Lambda function
   environment {
     variables = {
@@ -89,8 +154,8 @@ resource "aws_lambda_function" "get_all_rekognition_result" {
   function_name = "getAllRekognitionResult_TF"
   runtime       = "python3.9"
   handler       = "getAllRekognitionResult_TF.lambda_handler"
-  filename         = "${path.module}/getAllRekognitionResult_TF.zip"
-  source_code_hash = filebase64sha256("${path.module}/getAllRekognitionResult_TF.zip")
+  filename         = data.archive_file.lambda["getAllRekognitionResult_TF"].output_path
+  source_code_hash = data.archive_file.lambda["getAllRekognitionResult_TF"].output_base64sha256
   role             = data.aws_iam_role.lambda_exec_role.arn
   environment {
     variables = {
@@ -103,12 +168,16 @@ resource "aws_lambda_function" "connect_client_to_rekognition" {
   function_name = "connectClientToRekognition_TF"
   runtime       = "python3.9"
   handler       = "connectClientToRekognition_TF.lambda_handler"
-  filename         = "${path.module}/connectClientToRekognition_TF.zip"
-  source_code_hash = filebase64sha256("${path.module}/connectClientToRekognition_TF.zip")
+  filename         = data.archive_file.lambda["connectClientToRekognition_TF"].output_path
+  source_code_hash = data.archive_file.lambda["connectClientToRekognition_TF"].output_base64sha256
   role             = data.aws_iam_role.lambda_exec_role.arn
   environment {
     variables = {
-      BUCKET_NAME = "bucket-zmc-0001"
+      BUCKET_NAME         = "bucket-zmc-0001"
+      STORE_FULL_RESPONSE = "true"   # keep the full Rekognition response as a gzip sidecar under rekognition_full/
+      PPE_TAGS            = ""       # default rekognition tags when a request sends none (empty = all equipment types)
+      DEDUP_MAX_DISTANCE  = "4"      # reuse results for frames within 4 dHash bits (-1 disables; needs Pillow + NumPy layer)
+      DEDUP_TTL_SECONDS   = "30"
     }
   }
 }
@@ -117,19 +186,60 @@ resource "aws_lambda_function" "frame_enqueue_lambda" {
   function_name = "SP-enqueue-frame-on-upload_TF"
   runtime       = "python3.12"
   handler       = "frameEnqueue_TF.lambda_handler"  # filename.function_name
-  filename         = "${path.module}/frameEnqueue_TF.zip"
-  source_code_hash = filebase64sha256("${path.module}/frameEnqueue_TF.zip")
+  filename         = data.archive_file.lambda["frameEnqueue_TF"].output_path
+  source_code_hash = data.archive_file.lambda["frameEnqueue_TF"].output_base64sha256
   role             = data.aws_iam_role.lambda_exec_role.arn
   timeout          = 5
 
   environment {
     variables = {
-      FRAME_QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/528757789458/NewFrames.fifo"
-      ENV             = "dev"
+      FRAME_QUEUE_URL     = "https://sqs.us-east-1.amazonaws.com/528757789458/NewFrames.fifo"
+      FRAME_GROUP_BUCKETS = "0"   # 0 = one FIFO message group per camera, N = hash cameras into N groups
+      ENV                 = "dev"
+    }
+  }
+}
+
+# Hourly rollup of per-frame results into rekognition_rollups/ (see lambdas/result_layout.py).
+# S3 access, including s3:DeleteObject on rekognition_results/, comes from rekognition_results_policy
+resource "aws_lambda_function" "compact_rekognition_results" {
+  function_name = "compactRekognitionResults_TF"
+  runtime       = "python3.9"
+  handler       = "compactRekognitionResults_TF.lambda_handler"
+  filename         = data.archive_file.lambda["compactRekognitionResults_TF"].output_path
+  source_code_hash = data.archive_file.lambda["compactRekognitionResults_TF"].output_base64sha256
+  role             = data.aws_iam_role.lambda_exec_role.arn
+  timeout          = 300
+  memory_size      = 512
+  reserved_concurrent_executions = 1   # runs must not overlap
+
+  environment {
+    variables = {
+      BUCKET_NAME           = "bucket-zmc-0001"
+      COMPACT_AFTER_MINUTES = "30"      # an hour is rolled up once it ended this long ago
+      MAX_OBJECTS_PER_RUN   = "50000"   # the rest waits for the next run
     }
   }
 }
 
+resource "aws_cloudwatch_event_rule" "compact_results_hourly" {
+  name                = "compact-rekognition-results-hourly"
+  schedule_expression = "cron(40 * * * ? *)"   # 40 past: the previous hour is COMPACT_AFTER_MINUTES old
+}
+
+resource "aws_cloudwatch_event_target" "compact_results" {
+  rule = aws_cloudwatch_event_rule.compact_results_hourly.name
+  arn  = aws_lambda_function.compact_rekognition_results.arn
+}
+
+resource "aws_lambda_permission" "allow_events_compact" {
+  statement_id  = "AllowEventBridgeInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.compact_rekognition_results.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.compact_results_hourly.arn
+}
+
 # Lambda permission to allow S3 to trigger the frame_enqueue_lambda
 resource "aws_lambda_permission" "allow_s3_invoke" {
   statement_id  = "AllowS3Invoke"
@@ -150,6 +260,21 @@ resource "aws_s3_bucket_notification" "bucket_notification" {
     filter_suffix       = ".jpg"
   }
 
+  # frameEnqueue_TF also parses .jpeg and .png frames (see lambdas/frame_keys.py)
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.frame_enqueue_lambda.arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "cameras/"
+    filter_suffix       = ".jpeg"
+  }
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.frame_enqueue_lambda.arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "cameras/"
+    filter_suffix       = ".png"
+  }
+
   depends_on = [aws_lambda_permission.allow_s3_invoke]
 }
 
@@ -163,6 +288,9 @@ resource "aws_s3_bucket_notification" "bucket_notification" {
 resource "aws_api_gateway_rest_api" "rekognition_api" {
   name        = "rekognition-api"
   description = "API Gateway for triggering Rekognition Lambda function"
+
+  # Raw JPEG/PNG uploads reach connectClientToRekognition_TF without a JSON/base64 wrapper
+  binary_media_types = ["image/jpeg", "image/png"]
 }
 
 resource "aws_api_gateway_resource" "rekognition_resource" {